@@ -1,32 +1,126 @@
 # app.py (Versão 5.5 com Depurador Melhorado)
 
+import os
+import time
+
 import streamlit as st
 import pandas as pd
-from datetime import datetime
 
 # Funções e classes refatoradas
-from juntar_bases import juntar_bases
-from config import AppConfig, BancoConfig
+from juntar_bases import juntar_bases, convenio_da_base
+from config import AppConfig, BancoConfig, data_limite_por_idade
 from constants import *
-from strategies import NovoStrategy, BeneficioStrategy, CartaoStrategy, BeneficioECartaoStrategy
-from filter_handler import FiltroHandler
-from db_utils import connect_to_mongodb, carregar_regras_da_bd
+from strategies import STRATEGY_MAPEAMENTO
+from exportacao import nome_download
+from previa_amostral import AmostraEstratificada, amostrar, colunas_de_estrato, estimar_campanha
+from fila_jobs import FilaJobs, iniciar_trabalhadores, NA_FILA, PROCESSANDO, ERRO
+from busca_textual import contagem_por_valor
+from db_utils import fonte_de_regras, carregar_regras_da_bd, chave_produto
 
-@st.cache_data
-def carregar_e_juntar_arquivos_cache(lista_de_arquivos):
-    """Função "invólucro" para cachear o resultado da junção de arquivos."""
-    return juntar_bases(lista_de_arquivos)
+@st.cache_resource(max_entries=4)
+def _carregar_bases(ids_arquivos: tuple, _arquivos):
+    # O underscore em _arquivos evita que o Streamlit faça hash do conteúdo a cada rerun;
+    # a chave é só o id de cada upload. O conteúdo é validado pelo cache em disco.
+    return juntar_bases(_arquivos, tamanho_bloco=TAMANHO_BLOCO_LEITURA, usar_cache=True, notificar=_notificar_na_tela)
+
+def _notificar_na_tela(nivel: str, mensagem: str):
+    """Mostra na tela os erros ('error') e avisos ('warning') da leitura das bases."""
+    getattr(st, nivel)(mensagem)
+
+def _ler_arquivo_exportado(caminho: str) -> bytes:
+    """Conteúdo do arquivo exportado, lido do disco só quando o download é pedido."""
+    with open(caminho, 'rb') as f:
+        return f.read()
+
+@st.cache_resource
+def _fila_de_jobs() -> FilaJobs:
+    """Fila de processamentos do servidor, com os trabalhadores iniciados uma única vez."""
+    fila = FilaJobs()
+    iniciar_trabalhadores(fila, PROCESSOS_FILA_JOBS)
+    return fila
+
+def _relatorio_etapas(etapas: list) -> pd.DataFrame:
+    relatorio = pd.DataFrame(etapas)
+    if not relatorio.empty:
+        relatorio['linhas_removidas'] = relatorio['linhas_entrada'] - relatorio['linhas_saida']
+    return relatorio
 
-# Mapeamento de estratégias para o tipo de campanha
-STRATEGY_MAPEAMENTO = {
-    'Novo': NovoStrategy,
-    'Benefício': BeneficioStrategy,
-    'Cartão': CartaoStrategy,
-    'Benefício & Cartão': BeneficioECartaoStrategy,
-}
+@st.fragment(run_every=INTERVALO_CONSULTA_FILA_SEGUNDOS)
+def _acompanhar_job(id_job: str):
+    """Andamento do job, atualizado sozinho; quando ele termina, a página inteira é refeita."""
+    job = _fila_de_jobs().status(id_job)
+    if job is None or job['estado'] not in (NA_FILA, PROCESSANDO):
+        st.rerun()
+    if job['estado'] == NA_FILA:
+        st.info(f"Processamento na fila ({job['posicao']} na frente)...")
+    else:
+        segundos = time.time() - job['iniciado_em']
+        st.info(f"Processando... A mágica está acontecendo! ✨ ({segundos:.0f}s)")
+    if job['etapas']:
+        st.caption(f"Última etapa concluída: {job['etapas'][-1]['etapa']}")
+        st.dataframe(_relatorio_etapas(job['etapas']))
 
+def _mostrar_resultado(job: dict):
+    st.header("Resultados")
+    linhas = job['linhas']
+    st.success(f"Filtro concluído! {linhas} linhas encontradas.")
+    if linhas > LINHAS_PREVIA_RESULTADO:
+        st.caption(f"Mostrando as primeiras {LINHAS_PREVIA_RESULTADO} linhas; o arquivo baixado tem todas.")
+    caminho = job['arquivo']
+    if os.path.exists(caminho) and os.path.exists(job['previa']):
+        st.dataframe(pd.read_parquet(job['previa']))
+        st.download_button(
+            label="📥 Baixar Arquivo Filtrado", data=lambda: _ler_arquivo_exportado(caminho),
+            file_name=nome_download(job['nome'], job['formato']), mime=FORMATOS_EXPORTACAO[job['formato']][1]
+        )
+    else:
+        st.warning("O arquivo exportado expirou. Processe os filtros novamente para gerar outro.")
+    with st.expander("⏱️ Funil e tempo por etapa", expanded=False):
+        st.caption(f"Tempo do filtro: {job['segundos_filtro'] or 0:.2f}s "
+                   "(as etapas marcadas como cache vieram de uma execução anterior)")
+        st.dataframe(_relatorio_etapas(job['etapas']))
+
+@st.cache_resource(max_entries=4)
+def _indice_de_valores(chave_base: str, _base: pd.DataFrame) -> dict:
+    """
+    Valores distintos (em ordem, com o número de linhas) das colunas usadas nos widgets,
+    calculados uma vez por base: os reruns só consultam os dicionários.
+    """
+    return {coluna: contagem_por_valor(_base[coluna]) for coluna in COLUNAS_INDICE_VALORES if coluna in _base}
 
-def render_bank_config(index: int, campanha: str, base: pd.DataFrame) -> BancoConfig:
+def _com_contagem(contagens: dict):
+    """format_func dos widgets: o valor seguido do número de linhas da base que o têm."""
+    return lambda valor: f"{valor} ({contagens.get(valor, 0):,})".replace(',', '.')
+
+@st.cache_resource(max_entries=4)
+def _amostra_da_base(chave_base: str, colunas_estrato: tuple, _base: pd.DataFrame) -> AmostraEstratificada:
+    """Amostra estratificada da base, sorteada uma vez por base e colunas das condições dos bancos."""
+    return amostrar(_base, list(colunas_estrato))
+
+def _mostrar_previa(base: pd.DataFrame, chave_base: str, app_config: AppConfig, motor: str):
+    """Estimativas da campanha para a base inteira, calculadas sobre a amostra (ver previa_amostral)."""
+    amostra = _amostra_da_base(chave_base, tuple(colunas_de_estrato(app_config)), base)
+    try:
+        estimativas = estimar_campanha(amostra, app_config, STRATEGY_MAPEAMENTO[app_config.campanha], motor=motor)
+    except Exception as e:
+        st.error(f"Não foi possível calcular a prévia: {e}")
+        return
+    st.caption(f"Estimativas para a base inteira a partir de {len(amostra.df)} linhas "
+               f"({len(amostra.estrato)} grupos de CPF e matrícula), sem o limite de leads. "
+               "O total fica entre estimativa ± margem em cerca de 95% dos sorteios.")
+    st.dataframe(estimativas.round(2), hide_index=True)
+
+def carregar_e_juntar_arquivos_cache(lista_de_arquivos):
+    """
+    Função "invólucro" para cachear o resultado da junção de arquivos.
+    Dentro do processo a base fica em memória por upload (sem cópia nem pickle a cada
+    rerun); entre processos e deploys, o cache em disco evita reler o CSV.
+    """
+    ids_arquivos = tuple(arquivo.file_id for arquivo in lista_de_arquivos)
+    return _carregar_bases(ids_arquivos, lista_de_arquivos)
+
+
+def render_bank_config(index: int, campanha: str, indice: dict) -> BancoConfig:
     """Renderiza os widgets do Streamlit para um banco e retorna um objeto BancoConfig."""
     with st.expander(f"Configurações do Banco {index + 1}"):
         
@@ -55,8 +149,9 @@ def render_bank_config(index: int, campanha: str, base: pd.DataFrame) -> BancoCo
         coluna_condicional = st.selectbox('Aplicar configuração para:', options=COLUNAS_CONDICAO, key=f"coluna_{index}")
         valor_condicional = None
         if coluna_condicional != 'Aplicar a toda a base':
-            valores_disponiveis = base[coluna_condicional].dropna().unique()
-            valor_condicional = st.selectbox(f"Onde a coluna '{coluna_condicional}' for:", options=valores_disponiveis, key=f"valor_{index}")
+            contagens = indice.get(coluna_condicional, {})
+            valor_condicional = st.selectbox(f"Onde a coluna '{coluna_condicional}' for:", options=list(contagens),
+                                             format_func=_com_contagem(contagens), key=f"valor_{index}")
 
         return BancoConfig(
             banco=banco, coeficiente=coeficiente, comissao=comissao, parcelas=parcelas,
@@ -70,7 +165,7 @@ def main():
     st.title("🚀 Filtro de Campanhas - Konsi V5.5")
     st.sidebar.header("⚙️ Painel de Controle")
 
-    regras_collection = connect_to_mongodb()
+    fonte_regras = fonte_de_regras()
 
     arquivos = st.sidebar.file_uploader('Arraste os arquivos CSV de higienização', accept_multiple_files=True, type=['csv'])
 
@@ -83,7 +178,9 @@ def main():
     st.write("Prévia dos dados carregados:")
     st.dataframe(base.head())
 
-    convenio_atual = base.loc[0, COL_CONVENIO].strip().lower()
+    convenio_atual = convenio_da_base(base)
+    chave_base = base.attrs.get(ATTR_CHAVE_BASE) or '|'.join(a.file_id for a in arquivos)
+    indice = _indice_de_valores(chave_base, base)
 
     with st.sidebar.expander("1. Configurações Gerais", expanded=True):
         campanha = st.selectbox("Tipo da Campanha:", list(STRATEGY_MAPEAMENTO.keys()))
@@ -92,41 +189,47 @@ def main():
         idade_max = st.number_input("Idade máxima", 0, 120, 72)
         equipes = st.selectbox("Equipe da Campanha:", ['outbound', 'csapp', 'csativacao', 'cscdx', 'csport', 'outbound_virada'])
         convai = st.slider("Porcentagem para IA (%)", 0.0, 100.0, 0.0, 1.0)
+        limite_campanha = st.number_input("Limite de leads (0 = sem limite):", min_value=0, value=0, step=1000)
+        dias_sem_reenvio = st.number_input("Excluir CPFs enviados nos últimos N dias (0 = não exclui):", min_value=0, value=0, step=1)
+        registrar_envio = st.checkbox("Registrar os leads gerados como enviados", value=False)
+        motor = st.selectbox("Motor dos filtros:", MOTORES_FILTRO, index=MOTORES_FILTRO.index(MOTOR_FILTRO_PADRAO))
 
-    regras_da_campanha = carregar_regras_da_bd(regras_collection, convenio_atual, campanha)
+    regras_da_campanha = carregar_regras_da_bd(fonte_regras, convenio_atual, campanha)
 
     with st.sidebar.expander("2. Filtros de Exclusão", expanded=True):
         
-        opcoes_lotacao = base[COL_LOTACAO].dropna().unique()
+        opcoes_lotacao = indice.get(COL_LOTACAO, {})
         lotacoes_salvas = regras_da_campanha.get('lotacoes', [])
         lotacoes_default_validas = [l for l in lotacoes_salvas if l in opcoes_lotacao]
         lotacoes_selecionadas = st.multiselect(
-            "Selecionar lotações para excluir:", options=opcoes_lotacao,
+            "Selecionar lotações para excluir:", options=list(opcoes_lotacao), format_func=_com_contagem(opcoes_lotacao),
             default=lotacoes_default_validas, key=f"ms_lotacoes_{campanha}"
         )
         lotacoes_por_chave_str = st.text_area("Digitar palavras-chave de lotação:", key=f"ta_lotacoes_{campanha}")
         
-        opcoes_vinculo = base[COL_VINCULO].dropna().unique()
+        opcoes_vinculo = indice.get(COL_VINCULO, {})
         vinculos_salvos = regras_da_campanha.get('vinculos', [])
         vinculos_default_validos = [v for v in vinculos_salvos if v in opcoes_vinculo]
         vinculos_selecionados = st.multiselect(
-            "Selecionar vínculos para excluir:", options=opcoes_vinculo,
+            "Selecionar vínculos para excluir:", options=list(opcoes_vinculo), format_func=_com_contagem(opcoes_vinculo),
             default=vinculos_default_validos, key=f"ms_vinculos_{campanha}"
         )
         vinculos_por_chave_str = st.text_area("Digitar palavras-chave de vínculo:", key=f"ta_vinculos_{campanha}")
         
-        opcoes_secretaria = base[COL_SECRETARIA].dropna().unique()
+        opcoes_secretaria = indice.get(COL_SECRETARIA, {})
         secretarias_salvas = regras_da_campanha.get('secretarias', [])
         secretarias_default_validas = [s for s in secretarias_salvas if s in opcoes_secretaria]
         secretarias_selecionadas = st.multiselect(
-            "Selecionar secretarias para excluir:", options=opcoes_secretaria,
+            "Selecionar secretarias para excluir:", options=list(opcoes_secretaria), format_func=_com_contagem(opcoes_secretaria),
             default=secretarias_default_validas, key=f"ms_secretarias_{campanha}"
         )
         secretarias_por_chave_str = st.text_area("Digitar palavras-chave de secretaria:", key=f"ta_secretarias_{campanha}")
 
     # <<< DEPURADOR MELHORADO >>>
     with st.sidebar.expander("🔍 Depurador de Regras", expanded=False):
-        campanha_key = campanha.lower().replace(' & ', '_').replace(' ', '_')
+        campanha_key = chave_produto(campanha)
+        origem = {'mongodb': 'MongoDB', 'snapshot': 'snapshot local'}.get(fonte_regras.origem, 'nenhuma')
+        st.caption(f"Origem das regras: {origem}")
         st.write("Valores usados para a busca na BD:")
         st.code(f"Convenio: '{convenio_atual}'\nProduto: '{campanha_key}'", language="text")
         st.write("---")
@@ -138,51 +241,53 @@ def main():
     
     bancos_config_list = []
     for i in range(quant_bancos):
-        banco_cfg = render_bank_config(i, campanha, base)
+        banco_cfg = render_bank_config(i, campanha, indice)
         bancos_config_list.append(banco_cfg)
         
+    selecao_lotacao_final = list(set(lotacoes_selecionadas + [k.strip() for k in lotacoes_por_chave_str.strip().split('\n') if k.strip()]))
+    selecao_vinculos_final = list(set(vinculos_selecionados + [k.strip() for k in vinculos_por_chave_str.strip().split('\n') if k.strip()]))
+    selecao_secretaria_final = list(set(secretarias_selecionadas + [k.strip() for k in secretarias_por_chave_str.strip().split('\n') if k.strip()]))
+    app_config = AppConfig(
+        campanha=campanha, convenio=convenio_atual, comissao_minima=comissao_minima,
+        margem_emprestimo_limite=margem_emprestimo_limite, data_limite=data_limite_por_idade(idade_max),
+        selecao_lotacao=selecao_lotacao_final,
+        selecao_vinculos=selecao_vinculos_final,
+        selecao_secretaria=selecao_secretaria_final,
+        equipes=equipes, convai=convai, bancos_config=bancos_config_list,
+        limite_campanha=int(limite_campanha) or None,
+        dias_sem_reenvio=int(dias_sem_reenvio) or None, registrar_envio=registrar_envio
+    )
+
+    with st.expander("🔎 Prévia por amostra", expanded=False):
+        if st.toggle("Atualizar a prévia a cada mudança dos parâmetros", key="previa_ativa"):
+            _mostrar_previa(base, chave_base, app_config, motor)
+
     st.write("---") 
     
+    formato_exportacao = st.selectbox("Formato do arquivo de saída:", list(FORMATOS_EXPORTACAO))
+
     if st.button("⚡️ APLICAR FILTROS E PROCESSAR ⚡️", type="primary"):
-        selecao_lotacao_final = list(set(lotacoes_selecionadas + [k.strip() for k in lotacoes_por_chave_str.strip().split('\n') if k.strip()]))
-        selecao_vinculos_final = list(set(vinculos_selecionados + [k.strip() for k in vinculos_por_chave_str.strip().split('\n') if k.strip()]))
-        selecao_secretaria_final = list(set(secretarias_selecionadas + [k.strip() for k in secretarias_por_chave_str.strip().split('\n') if k.strip()]))
-
-        with st.spinner("Processando... A mágica está acontecendo! ✨"):
-            try:
-                data_limite = (datetime.today() - pd.DateOffset(years=idade_max)).date()
-                app_config = AppConfig(
-                    campanha=campanha, convenio=convenio_atual, comissao_minima=comissao_minima,
-                    margem_emprestimo_limite=margem_emprestimo_limite, data_limite=data_limite,
-                    selecao_lotacao=selecao_lotacao_final,
-                    selecao_vinculos=selecao_vinculos_final,
-                    selecao_secretaria=selecao_secretaria_final,
-                    equipes=equipes, convai=convai, bancos_config=bancos_config_list
-                )
-                
-                strategy_class = STRATEGY_MAPEAMENTO[app_config.campanha]
-                handler = FiltroHandler(df=base, config=app_config, strategy_class=strategy_class)
-                base_filtrada = handler.processar()
-                
-                st.session_state['df_filtrado'] = base_filtrada
-                st.session_state['nome_arquivo'] = f"{app_config.convenio}-{app_config.campanha}.csv"
-                st.session_state['show_results'] = True
-            except Exception as e:
-                st.error(f"Ocorreu um erro durante o processamento: {e}")
-                st.session_state['show_results'] = False
-
-    if st.session_state.get('show_results', False):
-        st.header("Resultados")
-        df_resultado = st.session_state['df_filtrado']
-        st.success(f"Filtro concluído! {len(df_resultado)} linhas encontradas.")
-        st.dataframe(df_resultado)
-        csv = df_resultado.to_csv(index=False, sep=';', encoding='utf-8-sig')
-        st.download_button(
-            label="📥 Baixar CSV Filtrado", data=csv,
-            file_name=st.session_state['nome_arquivo'], mime='text/csv'
-        )
+        try:
+            nome = f"{app_config.convenio}-{app_config.campanha}"
+            # O filtro roda num trabalhador da fila; a sessão guarda só o id do job, também
+            # na URL, para o acompanhamento sobreviver a reruns e recarregamentos da página
+            id_job = _fila_de_jobs().enviar(base, app_config, formato_exportacao, nome, motor=motor)
+            st.session_state['id_job'] = id_job
+            st.query_params['job'] = id_job
+        except Exception as e:
+            st.error(f"Ocorreu um erro ao enviar o processamento: {e}")
+
+    id_job = st.session_state.get('id_job') or st.query_params.get('job')
+    if id_job:
+        job = _fila_de_jobs().status(id_job)
+        if job is None:
+            st.warning("Processamento não encontrado. Aplique os filtros novamente.")
+        elif job['estado'] in (NA_FILA, PROCESSANDO):
+            _acompanhar_job(id_job)
+        elif job['estado'] == ERRO:
+            st.error(f"Ocorreu um erro durante o processamento: {job['erro']}")
+        else:
+            _mostrar_resultado(job)
 
 if __name__ == "__main__":
-    if 'show_results' not in st.session_state:
-        st.session_state['show_results'] = False
     main()
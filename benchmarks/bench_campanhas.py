@@ -0,0 +1,54 @@
+# benchmarks/bench_campanhas.py
+"""
+Compara rodar as quatro campanhas uma após a outra (um FiltroHandler por campanha)
+com a execução conjunta de processar_campanhas, que pré-filtra a base uma só vez e
+roda as estratégias em threads. Confere também que as saídas são idênticas.
+
+Uso:
+    python benchmarks/bench_campanhas.py --linhas 1000000 --convenio govsp
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_paralelo import configuracao, ESTRATEGIAS
+from constants import TAMANHO_BLOCO_LEITURA
+from filter_handler import FiltroHandler, processar_campanhas
+from gerar_base_sintetica import gerar_csv
+from juntar_bases import juntar_bases
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--linhas", type=int, default=1_000_000)
+    parser.add_argument("--convenio", default='govsp')
+    parser.add_argument("--threads", type=int, default=None, help="Padrão: uma por campanha")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        base = juntar_bases([gerar_csv(os.path.join(tmp, 'base.csv'), args.linhas, args.convenio)],
+                            tamanho_bloco=TAMANHO_BLOCO_LEITURA)
+    configs = [configuracao(campanha, args.convenio) for campanha in ESTRATEGIAS]
+    estrategias = [ESTRATEGIAS[config.campanha] for config in configs]
+
+    inicio = time.perf_counter()
+    sequenciais = [FiltroHandler(base, config, estrategia).processar() for config, estrategia in zip(configs, estrategias)]
+    tempo_sequencial = time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    conjuntas = processar_campanhas(base, configs, estrategias, max_threads=args.threads)
+    tempo_conjunto = time.perf_counter() - inicio
+
+    identicas = all(a.to_csv(index=False, sep=';') == b.to_csv(index=False, sep=';') for a, b in zip(sequenciais, conjuntas))
+    print(f"sequencial: {tempo_sequencial:.2f}s | conjunta: {tempo_conjunto:.2f}s "
+          f"({tempo_sequencial / tempo_conjunto:.2f}x) | saídas idênticas: {identicas}")
+
+
+if __name__ == "__main__":
+    main()
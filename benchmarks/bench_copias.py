@@ -0,0 +1,170 @@
+# benchmarks/bench_copias.py
+"""
+Mede quantas cópias da base o FiltroHandler faz durante `processar()`, em múltiplos
+do tamanho da base:
+
+- pico de RSS do processo (zerado via /proc/self/clear_refs logo antes);
+- pico de memória alocada, somando o tracemalloc (objetos Python e numpy) e um pool
+  de memória Arrow próprio (as strings Arrow não passam pelo tracemalloc);
+- número de cópias/seleções de linhas de DataFrame e volume total materializado
+  pelos gerenciadores de blocos do pandas.
+
+Cada campanha roda num processo novo, com a base carregada antes da medição. O
+processamento roda duas vezes: uma para o tempo e o RSS, outra com o tracemalloc.
+
+Uso:
+    python benchmarks/bench_copias.py --linhas 5000000 --campanha Novo
+"""
+import argparse
+import gc
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+CAMPANHAS = ['Novo', 'Benefício', 'Cartão', 'Benefício & Cartão']
+
+
+def _ler_status_mb(campo: str) -> float:
+    with open('/proc/self/status') as f:
+        for linha in f:
+            if linha.startswith(campo):
+                return int(linha.split()[1]) / 1024
+    return float('nan')
+
+
+def _zerar_pico_rss():
+    # Escrever 5 em clear_refs reinicia o VmHWM (pico de RSS) do processo
+    with open('/proc/self/clear_refs', 'w') as f:
+        f.write('5')
+
+
+class ContadorCopias:
+    """
+    Conta as cópias e seleções de linhas feitas pelos gerenciadores de blocos do pandas,
+    por onde passam `copy()`, `take`, máscaras booleanas, `sort_values` e afins.
+    Separa as de DataFrame (várias colunas de uma vez) das de coluna isolada.
+    """
+    def __init__(self):
+        from pandas.core.internals.managers import BaseBlockManager
+        self._classe = BaseBlockManager
+        self._originais = {}
+        self.copias_dataframe = 0
+        self.bytes_materializados = 0
+
+    def _registrar(self, mgr):
+        if mgr.ndim == 2 and len(mgr.items) > 1:
+            self.copias_dataframe += 1
+        self.bytes_materializados += sum(bloco.values.nbytes for bloco in mgr.blocks)
+
+    def __enter__(self):
+        contador = self
+        copy_original = self._classe.copy
+        reindex_original = self._classe.reindex_indexer
+
+        def copy(mgr, deep=True):
+            novo = copy_original(mgr, deep=deep)
+            if deep:
+                contador._registrar(novo)
+            return novo
+
+        def reindex_indexer(mgr, new_axis, indexer, axis, *args, **kwargs):
+            novo = reindex_original(mgr, new_axis, indexer, axis, *args, **kwargs)
+            # Só conta a reindexação das linhas (no gerenciador, o eixo das linhas é o último)
+            if novo is not mgr and axis == mgr.ndim - 1:
+                contador._registrar(novo)
+            return novo
+
+        self._originais = {'copy': copy_original, 'reindex_indexer': reindex_original}
+        self._classe.copy = copy
+        self._classe.reindex_indexer = reindex_indexer
+        return self
+
+    def __exit__(self, *exc):
+        for nome, funcao in self._originais.items():
+            setattr(self._classe, nome, funcao)
+
+
+def _pico_alocado_mb(processar) -> float:
+    import pyarrow as pa
+
+    pool_original = pa.default_memory_pool()
+    pool = pa.proxy_memory_pool(pool_original)
+    pa.set_memory_pool(pool)
+    tracemalloc.start()
+    try:
+        processar()
+        pico_python = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+        pa.set_memory_pool(pool_original)
+    # Os dois picos podem não ser simultâneos: a soma é um limite superior
+    return (pico_python + pool.max_memory()) / 2**20
+
+
+def _executar(campanha, caminho):
+    from bench_paralelo import configuracao, ESTRATEGIAS
+    from constants import TAMANHO_BLOCO_LEITURA
+    from filter_handler import FiltroHandler
+    from juntar_bases import juntar_bases
+
+    base = juntar_bases([caminho], tamanho_bloco=TAMANHO_BLOCO_LEITURA)
+    base_mb = float(base.memory_usage(deep=True).sum()) / 2**20
+    config = configuracao(campanha, 'govsp')
+    gc.collect()
+    _zerar_pico_rss()
+    rss_inicial = _ler_status_mb('VmRSS:')
+
+    def processar():
+        return FiltroHandler(base, config, ESTRATEGIAS[campanha]).processar()
+
+    inicio = time.perf_counter()
+    with ContadorCopias() as contador:
+        resultado = processar()
+    duracao = time.perf_counter() - inicio
+    pico_mb = _ler_status_mb('VmHWM:') - rss_inicial
+    linhas_saida = len(resultado)
+    del resultado
+    gc.collect()
+    alocado_mb = _pico_alocado_mb(processar)
+
+    return {
+        'campanha': campanha,
+        'linhas_saida': linhas_saida,
+        'segundos': round(duracao, 2),
+        'base_mb': round(base_mb, 1),
+        'pico_rss_mb': round(pico_mb, 1),
+        'pico_rss_em_bases': round(pico_mb / base_mb, 2),
+        'pico_alocado_mb': round(alocado_mb, 1),
+        'pico_alocado_em_bases': round(alocado_mb / base_mb, 2),
+        'copias_dataframe': contador.copias_dataframe,
+        'materializado_em_bases': round(contador.bytes_materializados / 2**20 / base_mb, 2),
+    }
+
+
+def main():
+    from gerar_base_sintetica import gerar_csv
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--linhas", type=int, default=1_000_000)
+    parser.add_argument("--campanha", choices=CAMPANHAS, action='append',
+                        help="Pode ser repetido; padrão: todas")
+    args = parser.parse_args()
+
+    ctx = mp.get_context('spawn')
+    with tempfile.TemporaryDirectory() as tmp:
+        caminho = gerar_csv(os.path.join(tmp, 'base.csv'), args.linhas, 'govsp')
+        for campanha in args.campanha or CAMPANHAS:
+            with ProcessPoolExecutor(max_workers=1, mp_context=ctx) as executor:
+                print(executor.submit(_executar, campanha, caminho).result())
+
+
+if __name__ == "__main__":
+    main()
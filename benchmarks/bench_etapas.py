@@ -0,0 +1,64 @@
+# benchmarks/bench_etapas.py
+"""
+Mede o ganho do cache de etapas do FiltroHandler ao iterar sobre os bancos: a primeira
+execução roda o pipeline inteiro; nas seguintes, só o coeficiente do primeiro banco
+muda, e os passos 1 e 2 vêm do cache. Confere também que cada saída é idêntica à de
+uma execução sem cache.
+
+Uso:
+    python benchmarks/bench_etapas.py --linhas 1000000 --campanha Novo --repeticoes 3
+"""
+import argparse
+import dataclasses
+import os
+import sys
+import tempfile
+import time
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_paralelo import configuracao, ESTRATEGIAS
+from constants import TAMANHO_BLOCO_LEITURA
+from filter_handler import FiltroHandler, limpar_cache_etapas
+from gerar_base_sintetica import gerar_csv
+from juntar_bases import juntar_bases, marcar_carga
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--linhas", type=int, default=1_000_000)
+    parser.add_argument("--campanha", default='Novo', choices=list(ESTRATEGIAS))
+    parser.add_argument("--convenio", default='govsp')
+    parser.add_argument("--repeticoes", type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        base = juntar_bases([gerar_csv(os.path.join(tmp, 'base.csv'), args.linhas, args.convenio)],
+                            tamanho_bloco=TAMANHO_BLOCO_LEITURA)
+    # Com o cache em disco, juntar_bases já marca a carga; aqui ela é marcada à mão
+    marcar_carga(base)
+    config = configuracao(args.campanha, args.convenio)
+    estrategia = ESTRATEGIAS[args.campanha]
+    limpar_cache_etapas()
+
+    for i in range(args.repeticoes + 1):
+        primeiro = dataclasses.replace(config.bancos_config[0], coeficiente=config.bancos_config[0].coeficiente + i)
+        config_i = dataclasses.replace(config, bancos_config=[primeiro] + config.bancos_config[1:])
+
+        inicio = time.perf_counter()
+        saida = FiltroHandler(base, config_i, estrategia).processar()
+        tempo_cache = time.perf_counter() - inicio
+
+        inicio = time.perf_counter()
+        referencia = FiltroHandler(base, config_i, estrategia, memorizar=False).processar()
+        tempo_completo = time.perf_counter() - inicio
+
+        identica = saida.to_csv(index=False, sep=';') == referencia.to_csv(index=False, sep=';')
+        rotulo = 'primeira execução' if i == 0 else f'coeficiente +{i}'
+        print(f"{rotulo}: {tempo_cache:.2f}s com cache | {tempo_completo:.2f}s sem cache | saída idêntica: {identica}")
+
+
+if __name__ == "__main__":
+    main()
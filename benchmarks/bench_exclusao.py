@@ -0,0 +1,83 @@
+# benchmarks/bench_exclusao.py
+"""
+Compara os filtros de exclusão por palavra-chave (lotação, vínculo, secretaria):
+regex `str.contains(case=False)` por coluna, como era feito, contra a máscara única
+de busca_textual.mascara_exclusao, variando o número de palavras-chave e de linhas.
+
+Uso:
+    python benchmarks/bench_exclusao.py --linhas 100000 1000000 --palavras 10 100 500
+"""
+import argparse
+import os
+import re
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from busca_textual import mascara_exclusao
+from constants import COL_LOTACAO, COL_VINCULO, COL_SECRETARIA
+
+
+def _base(linhas: int, rng) -> pd.DataFrame:
+    lotacoes = np.array([f'LOTACAO {i:04d} - UNIDADE REGIONAL {i % 37}' for i in range(2_000)])
+    vinculos = np.array([f'VINCULO {i:02d}' for i in range(30)])
+    secretarias = np.array([f'SECRETARIA DE ESTADO {i:03d}' for i in range(300)])
+    return pd.DataFrame({
+        COL_LOTACAO: rng.choice(lotacoes, linhas),
+        COL_VINCULO: rng.choice(vinculos, linhas),
+        COL_SECRETARIA: rng.choice(secretarias, linhas),
+    })
+
+
+def _palavras(n: int, rng) -> dict:
+    return {
+        COL_LOTACAO: [f'lotacao {i:04d}' for i in rng.integers(0, 20_000, n)],
+        COL_VINCULO: [f'vinculo {i:02d}' for i in rng.integers(0, 300, max(n // 10, 1))],
+        COL_SECRETARIA: [f'estado {i:03d}' for i in rng.integers(0, 3_000, max(n // 2, 1))],
+    }
+
+
+def _regex(df: pd.DataFrame, palavras: dict) -> np.ndarray:
+    excluir = np.zeros(len(df), dtype=bool)
+    for coluna, chaves in palavras.items():
+        padrao = '|'.join(re.escape(k) for k in chaves if k)
+        excluir |= df[coluna].str.contains(padrao, case=False, na=False).to_numpy(dtype=bool)
+    return excluir
+
+
+def _cronometrar(funcao, *args, repeticoes: int = 3):
+    melhor, resultado = float('inf'), None
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        resultado = funcao(*args)
+        melhor = min(melhor, time.perf_counter() - inicio)
+    return melhor, resultado
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--linhas", type=int, nargs='+', default=[100_000, 1_000_000])
+    parser.add_argument("--palavras", type=int, nargs='+', default=[10, 100, 500])
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    print(f"{'linhas':>10} {'palavras':>9} {'regex objeto':>13} {'regex categ.':>13} {'motor objeto':>13} {'motor categ.':>13}")
+    for linhas in args.linhas:
+        df_objeto = _base(linhas, rng)
+        df_categoria = df_objeto.astype('category')
+        for n in args.palavras:
+            palavras = _palavras(n, rng)
+            t_regex, esperado = _cronometrar(_regex, df_objeto, palavras)
+            t_regex_cat, _ = _cronometrar(_regex, df_categoria, palavras)
+            t_motor, obtido = _cronometrar(mascara_exclusao, df_objeto, palavras)
+            t_motor_cat, obtido_cat = _cronometrar(mascara_exclusao, df_categoria, palavras)
+            assert (esperado == obtido).all() and (esperado == obtido_cat).all()
+            print(f"{linhas:>10} {n:>9} {t_regex:>12.3f}s {t_regex_cat:>12.3f}s {t_motor:>12.3f}s {t_motor_cat:>12.3f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+# benchmarks/bench_ingestao.py
+"""
+Compara o pico de memória (RSS) e o tempo da leitura de juntar_bases com o
+arquivo inteiro de uma vez e com a leitura em blocos.
+
+Cada modo roda num processo novo, para que o pico de RSS medido seja só dele.
+
+Uso:
+    python benchmarks/bench_ingestao.py --linhas 1000000 --arquivos 2
+"""
+import argparse
+import multiprocessing as mp
+import os
+import sys
+import tempfile
+import time
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+
+def _ler_status_mb(campo: str) -> float:
+    with open('/proc/self/status') as f:
+        for linha in f:
+            if linha.startswith(campo):
+                return int(linha.split()[1]) / 1024
+    return float('nan')
+
+
+def _rss_pico_mb() -> float:
+    # VmHWM é o pico de RSS do processo atual (ru_maxrss herdaria o pico do processo pai)
+    return _ler_status_mb('VmHWM:')
+
+
+def _rss_atual_mb() -> float:
+    return _ler_status_mb('VmRSS:')
+
+
+def _executar(modo, caminhos, tamanho_bloco, fila):
+    import pandas as pd
+    from juntar_bases import juntar_bases
+
+    rss_inicial = _rss_atual_mb()
+    inicio = time.perf_counter()
+    if modo == 'inteiro':
+        df = juntar_bases(caminhos)
+    else:
+        df = juntar_bases(caminhos, tamanho_bloco=tamanho_bloco)
+    duracao = time.perf_counter() - inicio
+    fila.put({
+        'modo': modo,
+        'linhas': len(df),
+        'colunas': df.shape[1],
+        'segundos': round(duracao, 2),
+        'rss_pico_mb': round(_rss_pico_mb(), 1),
+        'rss_pico_delta_mb': round(_rss_pico_mb() - rss_inicial, 1),
+        'rss_final_delta_mb': round(_rss_atual_mb() - rss_inicial, 1),
+        'df_mb': round(float(df.memory_usage(deep=True).sum()) / 2**20, 1),
+    })
+
+
+def main():
+    from gerar_base_sintetica import gerar_csv
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--linhas", type=int, default=500_000, help="Linhas por arquivo")
+    parser.add_argument("--arquivos", type=int, default=2)
+    parser.add_argument("--tamanho-bloco", type=int, default=250_000)
+    args = parser.parse_args()
+
+    ctx = mp.get_context('spawn')
+    with tempfile.TemporaryDirectory() as tmp:
+        caminhos = [
+            gerar_csv(os.path.join(tmp, f"base_{i}.csv"), args.linhas, seed=i)
+            for i in range(args.arquivos)
+        ]
+        tamanho_mb = sum(os.path.getsize(c) for c in caminhos) / 2**20
+        print(f"Entrada: {args.arquivos} arquivo(s), {tamanho_mb:.1f} MB em CSV")
+
+        for modo in ('inteiro', 'blocos'):
+            fila = ctx.Queue()
+            proc = ctx.Process(target=_executar, args=(modo, caminhos, args.tamanho_bloco, fila))
+            proc.start()
+            resultado = fila.get()
+            proc.join()
+            print(resultado)
+
+
+if __name__ == "__main__":
+    main()
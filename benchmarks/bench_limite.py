@@ -0,0 +1,59 @@
+# benchmarks/bench_limite.py
+"""
+Mede o ganho de `limite_campanha`: para cada estratégia, roda FiltroHandler.processar
+sem limite e com cada limite pedido, e confere que a saída limitada tem os mesmos CPFs
+que as N primeiras linhas da saída sem limite (só empates no valor de corte podem
+trocar alguma linha, e aparecem na coluna "fora").
+
+Uso:
+    python benchmarks/bench_limite.py --linhas 1000000 --limites 1000 100000
+"""
+import argparse
+import dataclasses
+import os
+import sys
+import tempfile
+import time
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_paralelo import configuracao, ESTRATEGIAS
+from constants import TAMANHO_BLOCO_LEITURA, COL_CPF
+from filter_handler import FiltroHandler
+from gerar_base_sintetica import gerar_csv
+from juntar_bases import juntar_bases
+
+
+def _processar(base, config, estrategia):
+    inicio = time.perf_counter()
+    saida = FiltroHandler(base, config, estrategia, memorizar=False).processar()
+    return saida, time.perf_counter() - inicio
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--linhas", type=int, default=1_000_000)
+    parser.add_argument("--limites", type=int, nargs='+', default=[1_000, 100_000])
+    parser.add_argument("--convenio", default='govsp')
+    parser.add_argument("--taxa-cpf-duplicado", type=float, default=0.05)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        caminho = gerar_csv(os.path.join(tmp, 'base.csv'), args.linhas, args.convenio,
+                            taxa_cpf_duplicado=args.taxa_cpf_duplicado)
+        base = juntar_bases([caminho], tamanho_bloco=TAMANHO_BLOCO_LEITURA)
+
+    for campanha, estrategia in ESTRATEGIAS.items():
+        config = configuracao(campanha, args.convenio)
+        completa, segundos = _processar(base, config, estrategia)
+        print(f"{campanha}: sem limite {len(completa)} linhas em {segundos:.3f}s")
+        for limite in args.limites:
+            limitada, segundos = _processar(base, dataclasses.replace(config, limite_campanha=limite), estrategia)
+            fora = len(set(limitada[COL_CPF]) - set(completa[COL_CPF].head(limite)))
+            print(f"  limite {limite}: {len(limitada)} linhas em {segundos:.3f}s | fora: {fora}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+# benchmarks/bench_normalizacao.py
+"""
+Micro-benchmark de cada normalizador de normalizacao.py contra o tratamento linha a
+linha que ele substitui, sobre colunas sintéticas `string[pyarrow]` com N linhas.
+Confere também que os resultados são iguais.
+
+Uso:
+    python benchmarks/bench_normalizacao.py --linhas 1000000 --repeticoes 3
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from gerar_base_sintetica import NOMES, SOBRENOMES
+from normalizacao import normalizar_nomes, normalizar_cpfs, converter_datas, nascidos_a_partir_de
+
+
+def _colunas(linhas: int, semente: int = 0) -> dict:
+    rng = np.random.default_rng(semente)
+    nomes = pd.Series(rng.choice(NOMES, linhas)) + ' ' + pd.Series(rng.choice(SOBRENOMES, linhas))
+    cpfs = pd.Series(rng.integers(0, 99_999_999_999, linhas)).astype(str).str.zfill(11)
+    cpfs = cpfs.str[:3] + '.' + cpfs.str[3:6] + '.' + cpfs.str[6:9] + '-' + cpfs.str[9:]
+    datas = (pd.Timestamp('1940-01-01') + pd.to_timedelta(rng.integers(0, 60 * 365, linhas), unit='D')).strftime('%d/%m/%Y')
+    texto = pd.StringDtype('pyarrow')
+    return {
+        'nomes': nomes.astype(texto),
+        'cpfs': cpfs.astype(texto),
+        'datas': pd.Series(datas).astype(texto),
+    }
+
+
+def _medir(funcao, repeticoes: int):
+    melhor, resultado = float('inf'), None
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        resultado = funcao()
+        melhor = min(melhor, time.perf_counter() - inicio)
+    return melhor, resultado
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--linhas", type=int, default=1_000_000)
+    parser.add_argument("--repeticoes", type=int, default=3)
+    args = parser.parse_args()
+
+    colunas = _colunas(args.linhas)
+    limite = pd.Timestamp('1953-01-01')
+    datas_convertidas = converter_datas(colunas['datas'])
+    casos = {
+        'nomes': (
+            lambda: colunas['nomes'].apply(lambda x: x.title() if isinstance(x, str) else x),
+            lambda: normalizar_nomes(colunas['nomes']),
+        ),
+        'cpfs': (
+            lambda: colunas['cpfs'].str.replace(r"[.-]", "", regex=True),
+            lambda: normalizar_cpfs(colunas['cpfs']),
+        ),
+        'datas': (
+            lambda: pd.to_datetime(colunas['datas'], dayfirst=True, errors='coerce').to_numpy(dtype='datetime64[ns]'),
+            lambda: converter_datas(colunas['datas']),
+        ),
+        'idade': (
+            lambda: (pd.Series(datas_convertidas).dt.date >= limite.date()).to_numpy(),
+            lambda: nascidos_a_partir_de(datas_convertidas, limite),
+        ),
+    }
+    for nome, (antigo, novo) in casos.items():
+        tempo_antigo, esperado = _medir(antigo, args.repeticoes)
+        tempo_novo, obtido = _medir(novo, args.repeticoes)
+        iguais = np.array_equal(np.asarray(esperado, dtype=object), np.asarray(obtido, dtype=object))
+        print(f"{nome}: {tempo_antigo:.3f}s -> {tempo_novo:.3f}s ({tempo_antigo / tempo_novo:.1f}x) | iguais: {iguais}")
+
+
+if __name__ == "__main__":
+    main()
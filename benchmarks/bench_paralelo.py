@@ -0,0 +1,81 @@
+# benchmarks/bench_paralelo.py
+"""
+Mede a escalabilidade de FiltroHandler.processar com a execução particionada,
+de 1 até N processos, e confere que a saída é idêntica à da execução serial.
+
+Uso:
+    python benchmarks/bench_paralelo.py --linhas 2000000 --max-processos 8 --campanha Novo
+"""
+import argparse
+import datetime
+import os
+import sys
+import tempfile
+import time
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import filter_handler
+from config import AppConfig, BancoConfig
+from filter_handler import FiltroHandler
+from gerar_base_sintetica import gerar_csv
+from juntar_bases import juntar_bases
+from strategies import NovoStrategy, BeneficioStrategy, CartaoStrategy, BeneficioECartaoStrategy
+from constants import TAMANHO_BLOCO_LEITURA
+
+ESTRATEGIAS = {
+    'Novo': NovoStrategy,
+    'Benefício': BeneficioStrategy,
+    'Cartão': CartaoStrategy,
+    'Benefício & Cartão': BeneficioECartaoStrategy,
+}
+
+
+def configuracao(campanha: str, convenio: str) -> AppConfig:
+    bancos = [
+        BancoConfig(banco='318', coeficiente=20.5, comissao=10.0, parcelas=96,
+                    coluna_condicional='Vinculo_Servidor', valor_condicional='EFETIVO',
+                    coeficiente_parcela=0.045, cartao_escolhido='Benefício'),
+        BancoConfig(banco='33', coeficiente=18.0, comissao=7.5, parcelas=84,
+                    coluna_condicional='Aplicar a toda a base', valor_condicional=None,
+                    margem_seguranca=0.95, cartao_escolhido='Consignado'),
+    ]
+    return AppConfig(
+        campanha=campanha, convenio=convenio, comissao_minima=10.0, margem_emprestimo_limite=0.0,
+        data_limite=datetime.date(1953, 1, 1), selecao_lotacao=['LOTACAO 00'], selecao_vinculos=['TEMPORARIO'],
+        selecao_secretaria=[], equipes='outbound', convai=10.0, bancos_config=bancos,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--linhas", type=int, default=1_000_000)
+    parser.add_argument("--max-processos", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--campanha", default='Novo', choices=list(ESTRATEGIAS))
+    parser.add_argument("--convenio", default='govsp')
+    args = parser.parse_args()
+
+    # O benchmark mede o paralelismo em qualquer tamanho de base
+    filter_handler.LINHAS_MINIMAS_PARALELISMO = 0
+
+    with tempfile.TemporaryDirectory() as tmp:
+        base = juntar_bases([gerar_csv(os.path.join(tmp, 'base.csv'), args.linhas, args.convenio)],
+                            tamanho_bloco=TAMANHO_BLOCO_LEITURA)
+    config = configuracao(args.campanha, args.convenio)
+
+    referencia, tempo_serial = None, None
+    print(f"{'processos':>9} {'segundos':>9} {'speedup':>8} {'linhas saída':>13} {'idêntica':>9}")
+    for processos in range(1, args.max_processos + 1):
+        inicio = time.perf_counter()
+        resultado = FiltroHandler(base, config, ESTRATEGIAS[args.campanha], num_processos=processos).processar()
+        duracao = time.perf_counter() - inicio
+        csv = resultado.to_csv(index=False, sep=';')
+        if referencia is None:
+            referencia, tempo_serial = csv, duracao
+        print(f"{processos:>9} {duracao:>9.2f} {tempo_serial / duracao:>7.2f}x {len(resultado):>13} {str(csv == referencia):>9}")
+
+
+if __name__ == "__main__":
+    main()
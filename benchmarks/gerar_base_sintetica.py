@@ -0,0 +1,137 @@
+# benchmarks/gerar_base_sintetica.py
+"""
+Gera arquivos CSV sintéticos no mesmo formato das bases de higienização,
+para uso nos benchmarks.
+
+A cardinalidade de lotação, vínculo e secretaria e a taxa de CPFs repetidos são
+configuráveis. Bases grandes (até dezenas de milhões de linhas) são geradas e gravadas
+em blocos, sem montar o arquivo inteiro em memória.
+
+Uso:
+    python benchmarks/gerar_base_sintetica.py base.csv --linhas 5000000 --taxa-cpf-duplicado 0.05
+"""
+import argparse
+import numpy as np
+import pandas as pd
+
+# Ordem das colunas como chegam nos arquivos de higienização. As 26 primeiras
+# são as usadas pelo FiltroHandler; as demais só ocupam espaço na leitura.
+COLUNAS_ARQUIVO = [
+    'Origem_Dado', 'Nome_Cliente', 'Matricula', 'CPF', 'Data_Nascimento',
+    'MG_Emprestimo_Total', 'MG_Emprestimo_Disponivel',
+    'MG_Beneficio_Saque_Total', 'MG_Beneficio_Saque_Disponivel',
+    'MG_Beneficio_Compra_Total', 'MG_Beneficio_Compra_Disponivel',
+    'MG_Cartao_Total', 'MG_Cartao_Disponivel', 'MG_Compulsoria_Disponivel',
+    'Convenio', 'Vinculo_Servidor', 'Lotacao', 'Secretaria',
+    'FONE1', 'FONE2', 'FONE3', 'FONE4',
+    'UF', 'Municipio', 'Sexo', 'Situacao',
+    'Email', 'Endereco', 'Bairro', 'CEP', 'Observacao',
+]
+
+NOMES = ['MARIA', 'JOSE', 'ANA', 'JOAO', 'ANTONIO', 'FRANCISCA', 'CARLOS', 'PAULO', 'LUCAS', 'JULIANA']
+SOBRENOMES = ['SILVA', 'SANTOS', 'OLIVEIRA', 'SOUZA', 'RODRIGUES', 'FERREIRA', 'ALVES', 'PEREIRA', 'LIMA', 'GOMES']
+VINCULOS = ['EFETIVO', 'COMISSIONADO', 'CONTRATADO', 'APOSENTADO', 'PENSIONISTA', 'TEMPORARIO']
+
+LINHAS_POR_BLOCO_GERACAO = 1_000_000
+
+
+def gerar_base(linhas: int, convenio: str = 'govsp', seed: int = 42, lotacoes: int = 200, secretarias: int = 40,
+               vinculos: int = len(VINCULOS), taxa_cpf_duplicado: float = 0.0, faixa_matriculas: int = None) -> pd.DataFrame:
+    """
+    Gera um DataFrame sintético com `linhas` registros de um convênio.
+
+    `lotacoes`, `secretarias` e `vinculos` são as quantidades de valores distintos de cada
+    coluna (os vínculos além dos de VINCULOS ganham nomes numerados). Uma fração
+    `taxa_cpf_duplicado` das linhas repete o CPF de outra linha. As matrículas são
+    sorteadas entre `faixa_matriculas` valores (padrão: `linhas`).
+    """
+    rng = np.random.default_rng(seed)
+
+    def margem(escala):
+        return np.round(rng.gamma(2.0, escala, linhas), 2)
+
+    nomes = (pd.Series(rng.choice(NOMES, linhas)) + ' ' + pd.Series(rng.choice(SOBRENOMES, linhas))).to_numpy()
+    cpfs = rng.integers(0, 99_999_999_999, linhas)
+    cpfs_txt = pd.Series(cpfs).astype(str).str.zfill(11)
+    cpfs_fmt = (cpfs_txt.str[:3] + '.' + cpfs_txt.str[3:6] + '.' + cpfs_txt.str[6:9] + '-' + cpfs_txt.str[9:]).to_numpy()
+    matriculas = rng.integers(100_000, 100_000 + max(faixa_matriculas or linhas, 1), linhas).astype(str)
+    nascimento = pd.to_datetime('1940-01-01') + pd.to_timedelta(rng.integers(0, 60 * 365, linhas), unit='D')
+
+    emp_total = margem(400)
+    ben_total = margem(150)
+    car_total = margem(150)
+    # Parte da base já usou margem de benefício/cartão (disponível < total)
+    ben_disp = np.where(rng.random(linhas) < 0.3, np.round(ben_total * rng.random(linhas), 2), ben_total)
+    car_disp = np.where(rng.random(linhas) < 0.3, np.round(car_total * rng.random(linhas), 2), car_total)
+    # Uma pequena fração tem margem de empréstimo negativa
+    emp_disp = np.round(emp_total * rng.random(linhas), 2) * np.where(rng.random(linhas) < 0.02, -1, 1)
+
+    lotacoes = np.array([f'LOTACAO {i:03d}' for i in range(lotacoes)] + ['ALESP'])
+    secretarias = np.array([f'SECRETARIA {i:02d}' for i in range(secretarias)])
+    vinculos = np.array((VINCULOS + [f'VINCULO {i:03d}' for i in range(len(VINCULOS), vinculos)])[:vinculos])
+    if taxa_cpf_duplicado > 0:
+        repetidos = np.flatnonzero(rng.random(linhas) < taxa_cpf_duplicado)
+        cpfs_fmt[repetidos] = cpfs_fmt[rng.integers(0, linhas, len(repetidos))]
+
+    dados = {
+        'Origem_Dado': rng.choice(['HIGIENIZACAO', 'PORTAL'], linhas),
+        'Nome_Cliente': nomes,
+        'Matricula': matriculas,
+        'CPF': cpfs_fmt,
+        'Data_Nascimento': nascimento.strftime('%d/%m/%Y'),
+        'MG_Emprestimo_Total': emp_total,
+        'MG_Emprestimo_Disponivel': emp_disp,
+        'MG_Beneficio_Saque_Total': ben_total,
+        'MG_Beneficio_Saque_Disponivel': ben_disp,
+        'MG_Beneficio_Compra_Total': margem(100),
+        'MG_Beneficio_Compra_Disponivel': margem(100),
+        'MG_Cartao_Total': car_total,
+        'MG_Cartao_Disponivel': car_disp,
+        'MG_Compulsoria_Disponivel': np.round(rng.normal(200, 150, linhas), 2),
+        'Convenio': np.full(linhas, convenio),
+        'Vinculo_Servidor': rng.choice(vinculos, linhas),
+        'Lotacao': rng.choice(lotacoes, linhas),
+        'Secretaria': rng.choice(secretarias, linhas),
+    }
+    for i in range(1, 5):
+        dados[f'FONE{i}'] = rng.integers(11_900_000_000, 99_999_999_999, linhas).astype(str)
+    dados['UF'] = rng.choice(['SP', 'MT', 'RJ', 'PI'], linhas)
+    dados['Municipio'] = rng.choice(['CAPITAL', 'INTERIOR'], linhas)
+    dados['Sexo'] = rng.choice(['F', 'M'], linhas)
+    dados['Situacao'] = rng.choice(['ATIVO', 'INATIVO'], linhas)
+    dados['Email'] = np.char.add(matriculas, '@exemplo.com.br')
+    dados['Endereco'] = np.char.add('RUA DAS FLORES ', matriculas)
+    dados['Bairro'] = rng.choice(['CENTRO', 'JARDIM', 'VILA NOVA'], linhas)
+    dados['CEP'] = rng.integers(10_000_000, 99_999_999, linhas).astype(str)
+    dados['Observacao'] = np.full(linhas, 'SEM OBSERVACOES REGISTRADAS PARA ESTE SERVIDOR')
+
+    return pd.DataFrame(dados, columns=COLUNAS_ARQUIVO)
+
+
+def gerar_csv(caminho: str, linhas: int, convenio: str = 'govsp', seed: int = 42,
+              linhas_por_bloco: int = LINHAS_POR_BLOCO_GERACAO, **opcoes) -> str:
+    """
+    Gera a base sintética e grava em CSV no formato de entrada do app. Acima de
+    `linhas_por_bloco`, cada bloco é gerado com a semente seed+i e anexado ao arquivo
+    (os CPFs repetidos ficam dentro de cada bloco). `opcoes` vão para gerar_base.
+    """
+    opcoes.setdefault('faixa_matriculas', linhas)
+    for i, inicio in enumerate(range(0, max(linhas, 1), linhas_por_bloco)):
+        bloco = gerar_base(min(linhas_por_bloco, linhas - inicio), convenio, seed + i, **opcoes)
+        bloco.to_csv(caminho, index=False, mode='w' if i == 0 else 'a', header=(i == 0))
+    return caminho
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("caminho")
+    parser.add_argument("--linhas", type=int, default=100_000)
+    parser.add_argument("--convenio", default="govsp")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--lotacoes", type=int, default=200)
+    parser.add_argument("--secretarias", type=int, default=40)
+    parser.add_argument("--vinculos", type=int, default=len(VINCULOS))
+    parser.add_argument("--taxa-cpf-duplicado", type=float, default=0.0)
+    args = parser.parse_args()
+    gerar_csv(args.caminho, args.linhas, args.convenio, args.seed, lotacoes=args.lotacoes, secretarias=args.secretarias,
+              vinculos=args.vinculos, taxa_cpf_duplicado=args.taxa_cpf_duplicado)
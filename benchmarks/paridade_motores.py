@@ -0,0 +1,84 @@
+# benchmarks/paridade_motores.py
+"""
+Confere que os motores de filtro (MOTORES_FILTRO) dão exatamente a mesma saída: para
+cada convênio, estratégia de STRATEGY_MAPEAMENTO e variação da configuração, roda
+FiltroHandler.processar com cada motor sobre a mesma base sintética e compara as
+saídas (valores, tipos e índice) com a do motor pandas. Mostra também o tempo de cada
+motor. Sai com código 1 se alguma saída diferir.
+A mesma conferência, numa base pequena, roda nos testes (tests/test_paridade_motores.py).
+
+Uso:
+    python benchmarks/paridade_motores.py --linhas 200000 --convenios govsp govmt prefsp
+"""
+import argparse
+import dataclasses
+import os
+import sys
+import tempfile
+import time
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import pandas as pd
+
+from bench_paralelo import configuracao
+from constants import MOTORES_FILTRO, TAMANHO_BLOCO_LEITURA
+from filter_handler import FiltroHandler
+from gerar_base_sintetica import gerar_csv
+from juntar_bases import juntar_bases
+from strategies import STRATEGY_MAPEAMENTO
+
+
+def variacoes(config):
+    """A configuração do benchmark e variações que ligam ou desligam cada filtro global."""
+    return {
+        'padrão': config,
+        'sem idade e exclusões': dataclasses.replace(config, data_limite=None, selecao_lotacao=[], selecao_vinculos=[]),
+        'margem mínima e secretaria': dataclasses.replace(config, margem_emprestimo_limite=150.0,
+                                                          selecao_secretaria=['SECRETARIA 1']),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--linhas", type=int, default=200_000)
+    parser.add_argument("--convenios", nargs='+', default=['govsp', 'govmt', 'prefsp'])
+    parser.add_argument("--taxa-cpf-duplicado", type=float, default=0.05)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    diferencas = 0
+    with tempfile.TemporaryDirectory() as tmp:
+        for convenio in args.convenios:
+            caminho = gerar_csv(os.path.join(tmp, 'base.csv'), args.linhas, convenio, args.seed,
+                                taxa_cpf_duplicado=args.taxa_cpf_duplicado)
+            base = juntar_bases([caminho], tamanho_bloco=TAMANHO_BLOCO_LEITURA)
+            for campanha, estrategia in STRATEGY_MAPEAMENTO.items():
+                for nome, config in variacoes(configuracao(campanha, convenio)).items():
+                    saidas, tempos = {}, {}
+                    for motor in MOTORES_FILTRO:
+                        inicio = time.perf_counter()
+                        saidas[motor] = FiltroHandler(base, config, estrategia, memorizar=False, motor=motor).processar()
+                        tempos[motor] = time.perf_counter() - inicio
+                    referencia = saidas[MOTORES_FILTRO[0]]
+                    iguais = []
+                    for motor in MOTORES_FILTRO[1:]:
+                        try:
+                            pd.testing.assert_frame_equal(saidas[motor], referencia, check_exact=True)
+                            iguais.append(True)
+                        except AssertionError:
+                            iguais.append(False)
+                    diferencas += iguais.count(False)
+                    print(f"{convenio} / {campanha} / {nome}: {len(referencia)} linhas | "
+                          + ', '.join(f"{motor} {segundos:.3f}s" for motor, segundos in tempos.items())
+                          + f" | iguais: {all(iguais)}")
+
+    if diferencas:
+        print(f"{diferencas} saída(s) diferente(s) da do motor {MOTORES_FILTRO[0]}.")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
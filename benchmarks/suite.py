@@ -0,0 +1,170 @@
+# benchmarks/suite.py
+"""
+Suíte de benchmarks reprodutível: gera bases sintéticas (ver gerar_base_sintetica) e
+mede, para cada convênio e tamanho de base, o tempo de
+
+- juntar_bases (leitura em blocos, sem o cache em disco);
+- FiltroHandler.processar de cada estratégia de STRATEGY_MAPEAMENTO (sem o cache de etapas);
+- exportação do resultado de cada estratégia em CSV.
+
+Cada execução acrescenta uma linha JSON em `--saida` com o commit atual (e se havia
+alterações não commitadas), os parâmetros e os tempos (o melhor de `--repeticoes`).
+Com `--comparar`, os tempos são comparados aos da última execução de outro commit com
+os mesmos parâmetros (ou do commit indicado), e o script sai com código 1 se alguma
+medição ficou mais lenta que a tolerância: serve de portão contra regressões.
+
+Uso:
+    python benchmarks/suite.py --linhas 100000 1000000 --convenios govsp govmt --comparar
+    python benchmarks/suite.py --linhas 1000000 --taxa-cpf-duplicado 0.05 --comparar abc1234
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import pandas as pd
+
+from bench_paralelo import configuracao
+from constants import TAMANHO_BLOCO_LEITURA
+from exportacao import exportar
+from filter_handler import FiltroHandler
+from gerar_base_sintetica import gerar_csv, VINCULOS
+from juntar_bases import juntar_bases
+from strategies import STRATEGY_MAPEAMENTO
+
+ARQUIVO_RESULTADOS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'resultados.jsonl')
+
+
+def _git(*args) -> str:
+    try:
+        return subprocess.run(['git', *args], cwd=RAIZ, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ''
+
+
+def _melhor_tempo(funcao, repeticoes: int):
+    melhor, resultado = float('inf'), None
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        resultado = funcao()
+        melhor = min(melhor, time.perf_counter() - inicio)
+    return round(melhor, 4), resultado
+
+
+def medir(caminho: str, convenio: str, repeticoes: int, diretorio: str) -> dict:
+    """Tempos (em segundos) de leitura, filtro e exportação de uma base já gerada."""
+    tempos, linhas_saida = {}, {}
+    tempos['juntar_bases'], base = _melhor_tempo(
+        lambda: juntar_bases([caminho], tamanho_bloco=TAMANHO_BLOCO_LEITURA), repeticoes)
+    for campanha, estrategia in STRATEGY_MAPEAMENTO.items():
+        config = configuracao(campanha, convenio)
+        tempos[f'processar:{campanha}'], resultado = _melhor_tempo(
+            lambda: FiltroHandler(base, config, estrategia, memorizar=False).processar(), repeticoes)
+        tempos[f'exportar:{campanha}'], _ = _melhor_tempo(
+            lambda: exportar(resultado, os.path.join(diretorio, 'saida.csv')), repeticoes)
+        linhas_saida[campanha] = len(resultado)
+    return {'segundos': tempos, 'linhas_saida': linhas_saida}
+
+
+def _carregar_resultados(arquivo: str) -> list:
+    if not os.path.exists(arquivo):
+        return []
+    with open(arquivo, encoding='utf-8') as f:
+        return [json.loads(linha) for linha in f if linha.strip()]
+
+
+def _referencia(anteriores: list, atual: dict, commit: str = None):
+    """Última execução com os mesmos parâmetros, do commit indicado ou de outro commit."""
+    for registro in reversed(anteriores):
+        if registro['parametros'] != atual['parametros']:
+            continue
+        if commit and registro['commit'].startswith(commit):
+            return registro
+        if not commit and registro['commit'] != atual['commit']:
+            return registro
+    return None
+
+
+def comparar(atual: dict, referencia: dict, tolerancia: float, minimo_segundos: float) -> list:
+    """Imprime a comparação e devolve as medições que regrediram além da tolerância."""
+    regressoes = []
+    print(f"  comparando com {referencia['commit'][:10]} ({referencia['data']}):")
+    for nome, segundos in atual['segundos'].items():
+        anterior = referencia['segundos'].get(nome)
+        if anterior is None:
+            continue
+        razao = segundos / anterior if anterior else float('inf')
+        regrediu = segundos > anterior * (1 + tolerancia) and segundos - anterior > minimo_segundos
+        if regrediu:
+            regressoes.append(nome)
+        print(f"    {nome:32s} {anterior:8.3f}s -> {segundos:8.3f}s ({razao:5.2f}x){'  REGRESSÃO' if regrediu else ''}")
+    return regressoes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--linhas", type=int, nargs='+', default=[100_000, 1_000_000])
+    parser.add_argument("--convenios", nargs='+', default=['govsp', 'govmt'])
+    parser.add_argument("--lotacoes", type=int, default=200)
+    parser.add_argument("--secretarias", type=int, default=40)
+    parser.add_argument("--vinculos", type=int, default=len(VINCULOS))
+    parser.add_argument("--taxa-cpf-duplicado", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--repeticoes", type=int, default=1)
+    parser.add_argument("--saida", default=ARQUIVO_RESULTADOS, help="Arquivo JSONL de resultados (padrão: %(default)s)")
+    parser.add_argument("--comparar", nargs='?', const='', default=None, metavar='COMMIT',
+                        help="Compara com a última execução de outro commit (ou do COMMIT indicado)")
+    parser.add_argument("--tolerancia", type=float, default=0.15, help="Piora relativa aceita (padrão: %(default)s)")
+    parser.add_argument("--minimo-segundos", type=float, default=0.05,
+                        help="Diferença absoluta abaixo da qual não há regressão (padrão: %(default)s)")
+    args = parser.parse_args()
+
+    anteriores = _carregar_resultados(args.saida)
+    commit = _git('rev-parse', 'HEAD')
+    alterado = bool(_git('status', '--porcelain', '--untracked-files=no'))
+    regressoes = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for convenio in args.convenios:
+            for linhas in args.linhas:
+                parametros = {
+                    'linhas': linhas, 'convenio': convenio, 'lotacoes': args.lotacoes, 'secretarias': args.secretarias,
+                    'vinculos': args.vinculos, 'taxa_cpf_duplicado': args.taxa_cpf_duplicado, 'seed': args.seed,
+                }
+                caminho = gerar_csv(os.path.join(tmp, 'base.csv'), linhas, convenio, args.seed, lotacoes=args.lotacoes,
+                                    secretarias=args.secretarias, vinculos=args.vinculos,
+                                    taxa_cpf_duplicado=args.taxa_cpf_duplicado)
+                registro = {
+                    'commit': commit, 'alterado': alterado,
+                    'data': datetime.datetime.now().isoformat(timespec='seconds'),
+                    'python': platform.python_version(), 'pandas': pd.__version__,
+                    'parametros': parametros,
+                    **medir(caminho, convenio, args.repeticoes, tmp),
+                }
+                os.remove(caminho)
+                print(f"{convenio} / {linhas} linhas: " + ', '.join(f"{k} {v:.3f}s" for k, v in registro['segundos'].items()))
+                with open(args.saida, 'a', encoding='utf-8') as f:
+                    f.write(json.dumps(registro, ensure_ascii=False) + '\n')
+
+                if args.comparar is not None:
+                    referencia = _referencia(anteriores, registro, args.comparar or None)
+                    if referencia is None:
+                        print("  sem execução de referência com os mesmos parâmetros")
+                    else:
+                        regressoes += comparar(registro, referencia, args.tolerancia, args.minimo_segundos)
+
+    if regressoes:
+        print(f"{len(regressoes)} medição(ões) mais lenta(s) que a tolerância.")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+# busca_textual.py
+"""
+Busca de palavras-chave nas colunas de texto da base (lotação, vínculo, secretaria).
+
+As colunas têm poucos valores distintos, então cada palavra-chave é avaliada uma única
+vez por valor distinto (via códigos da categoria ou `factorize`) e o resultado é
+espalhado de volta para as linhas. A busca em si usa um autômato de Aho–Corasick
+sobre o texto em casefold, que testa todas as palavras-chave numa só passada.
+"""
+from typing import Callable, Dict, Iterable, Optional
+
+import numpy as np
+import pandas as pd
+
+
+class AutomatoPalavrasChave:
+    """
+    Autômato de Aho–Corasick para um conjunto de palavras-chave.
+    `encontra(texto)` diz se alguma palavra-chave aparece no texto (sem diferenciar
+    maiúsculas de minúsculas), percorrendo o texto uma única vez.
+    """
+    def __init__(self, palavras_chave: Iterable[str]):
+        self.palavras_chave = tuple(sorted({str(p).casefold() for p in palavras_chave if p}))
+        self._transicoes = [{}]
+        self._falha = [0]
+        self._final = [False]
+        for palavra in self.palavras_chave:
+            self._inserir(palavra)
+        self._construir_falhas()
+
+    def __bool__(self):
+        return bool(self.palavras_chave)
+
+    def _inserir(self, palavra: str):
+        estado = 0
+        for caractere in palavra:
+            proximo = self._transicoes[estado].get(caractere)
+            if proximo is None:
+                proximo = len(self._transicoes)
+                self._transicoes[estado][caractere] = proximo
+                self._transicoes.append({})
+                self._falha.append(0)
+                self._final.append(False)
+            estado = proximo
+        self._final[estado] = True
+
+    def _construir_falhas(self):
+        # Busca em largura: a falha de cada estado é o maior sufixo que também é prefixo
+        fila = list(self._transicoes[0].values())
+        for estado in fila:
+            for caractere, proximo in self._transicoes[estado].items():
+                fila.append(proximo)
+                falha = self._falha[estado]
+                while falha and caractere not in self._transicoes[falha]:
+                    falha = self._falha[falha]
+                candidato = self._transicoes[falha].get(caractere, 0)
+                self._falha[proximo] = candidato if candidato != proximo else 0
+                self._final[proximo] = self._final[proximo] or self._final[self._falha[proximo]]
+
+    def encontra(self, texto: str) -> bool:
+        transicoes, falha, final = self._transicoes, self._falha, self._final
+        estado = 0
+        for caractere in texto.casefold():
+            while estado and caractere not in transicoes[estado]:
+                estado = falha[estado]
+            estado = transicoes[estado].get(caractere, 0)
+            if final[estado]:
+                return True
+        return False
+
+
+def valores_distintos(serie: pd.Series):
+    """
+    Devolve (códigos, valores) de uma coluna: o código de cada linha aponta para a
+    posição do seu valor em `valores`; nulos recebem o código -1.
+    """
+    if isinstance(serie.dtype, pd.CategoricalDtype):
+        return serie.cat.codes.to_numpy(), serie.cat.categories
+    return pd.factorize(serie, use_na_sentinel=True)
+
+
+def contagem_por_valor(serie: pd.Series) -> Dict[object, int]:
+    """Valores distintos da coluna (sem nulos e sem categorias ausentes), em ordem, com o número de linhas de cada um."""
+    codigos, valores = valores_distintos(serie)
+    contagens = np.bincount(codigos[codigos >= 0], minlength=len(valores))
+    return {valores[i]: int(contagens[i]) for i in sorted(np.flatnonzero(contagens), key=lambda i: str(valores[i]))}
+
+
+def mascara_por_valor_distinto(serie: pd.Series, predicado: Callable[[str], bool], distintos=None) -> np.ndarray:
+    """
+    Avalia `predicado` uma vez por valor distinto de texto da coluna e devolve a
+    máscara booleana por linha. Nulos e valores que não são texto dão False.
+    `distintos` permite reaproveitar o resultado de `valores_distintos` da mesma coluna.
+    """
+    codigos, valores = distintos if distintos is not None else valores_distintos(serie)
+    tabela = np.fromiter(
+        (isinstance(v, str) and predicado(v) for v in valores), dtype=bool, count=len(valores)
+    )
+    # O código -1 (nulo) cai na última posição, que é sempre False
+    tabela = np.append(tabela, False)
+    return tabela[codigos]
+
+
+def mascara_exclusao(df: pd.DataFrame, palavras_por_coluna: Dict[str, Optional[Iterable[str]]]) -> np.ndarray:
+    """
+    Combina as exclusões por palavra-chave de várias colunas numa única máscara:
+    True para as linhas em que alguma coluna contém alguma de suas palavras-chave.
+    Colunas ausentes da base ou sem palavras-chave são ignoradas.
+    """
+    excluir = np.zeros(len(df), dtype=bool)
+    for coluna, palavras_chave in palavras_por_coluna.items():
+        if not palavras_chave or coluna not in df.columns:
+            continue
+        automato = AutomatoPalavrasChave(palavras_chave)
+        if automato:
+            excluir |= mascara_por_valor_distinto(df[coluna], automato.encontra)
+    return excluir
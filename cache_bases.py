@@ -0,0 +1,118 @@
+# cache_bases.py
+"""
+Cache em disco dos arquivos já lidos, em formato Feather (Arrow IPC) sem compressão.
+
+Cada arquivo enviado é identificado pelo hash do seu conteúdo mais a versão do
+esquema de leitura, de modo que reenviar um arquivo conhecido pula o parser de CSV
+e carrega a base direto do disco via memory-map. O diretório tem um limite de
+tamanho e os arquivos menos usados recentemente são removidos primeiro (LRU).
+"""
+import hashlib
+import logging
+import os
+from typing import Optional
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+
+from constants import DIRETORIO_CACHE_BASES, LIMITE_CACHE_BASES_BYTES, VERSAO_ESQUEMA, NUM_COLUNAS_ENTRADA
+
+logger = logging.getLogger(__name__)
+
+_TAMANHO_LEITURA_HASH = 8 * 1024 * 1024
+_EXTENSAO = '.feather'
+
+
+def chave_arquivo(arquivo, em_blocos: bool) -> str:
+    """
+    Calcula a chave de cache de um arquivo: SHA-256 do conteúdo, da versão do
+    esquema e do modo de leitura (a leitura em blocos guarda menos colunas).
+    """
+    modo = f"blocos:{NUM_COLUNAS_ENTRADA}" if em_blocos else "inteiro"
+    h = hashlib.sha256(f"esquema={VERSAO_ESQUEMA};modo={modo};".encode())
+    if hasattr(arquivo, 'read'):
+        arquivo.seek(0)
+        for pedaco in iter(lambda: arquivo.read(_TAMANHO_LEITURA_HASH), b''):
+            h.update(pedaco)
+        arquivo.seek(0)
+    else:
+        with open(arquivo, 'rb') as f:
+            for pedaco in iter(lambda: f.read(_TAMANHO_LEITURA_HASH), b''):
+                h.update(pedaco)
+    return h.hexdigest()
+
+
+def _caminho(chave: str, diretorio: str) -> str:
+    return os.path.join(diretorio, chave + _EXTENSAO)
+
+
+def _tipo_texto(tipo_arrow):
+    # Textos voltam como strings Arrow, como definido em ESQUEMA_ENTRADA
+    if pa.types.is_string(tipo_arrow) or pa.types.is_large_string(tipo_arrow):
+        return pd.StringDtype('pyarrow')
+    return None
+
+
+def esta_no_cache(chave: str, diretorio: str = DIRETORIO_CACHE_BASES) -> bool:
+    return os.path.exists(_caminho(chave, diretorio))
+
+
+def ler_do_cache(chave: str, diretorio: str = DIRETORIO_CACHE_BASES) -> Optional[pd.DataFrame]:
+    """Devolve a base em cache para a chave, ou None se ela não existir."""
+    caminho = _caminho(chave, diretorio)
+    if not os.path.exists(caminho):
+        return None
+    try:
+        tabela = feather.read_table(caminho, memory_map=True)
+        # Atualiza a data de modificação, que é o critério do LRU
+        os.utime(caminho)
+    except (OSError, pa.ArrowException) as e:
+        logger.warning("Cache de base ilegível (%s), ignorando: %s", caminho, e)
+        return None
+    return tabela.to_pandas(types_mapper=_tipo_texto)
+
+
+def gravar_no_cache(chave: str, df: pd.DataFrame, diretorio: str = DIRETORIO_CACHE_BASES,
+                    limite_bytes: int = LIMITE_CACHE_BASES_BYTES):
+    """Grava a base no cache e aplica o limite de tamanho do diretório."""
+    caminho = _caminho(chave, diretorio)
+    temporario = f"{caminho}.{os.getpid()}.tmp"
+    try:
+        os.makedirs(diretorio, exist_ok=True)
+        feather.write_feather(df, temporario, compression='uncompressed')
+        # Troca atômica: leitores nunca veem um arquivo pela metade
+        os.replace(temporario, caminho)
+    except (OSError, pa.ArrowException) as e:
+        logger.warning("Não foi possível gravar a base no cache (%s): %s", caminho, e)
+        if os.path.exists(temporario):
+            os.remove(temporario)
+        return
+    limpar_cache(diretorio, limite_bytes)
+
+
+def limpar_cache(diretorio: str = DIRETORIO_CACHE_BASES, limite_bytes: int = LIMITE_CACHE_BASES_BYTES):
+    """Remove os arquivos menos usados recentemente até o diretório caber no limite."""
+    if not os.path.isdir(diretorio):
+        return
+    entradas = []
+    for nome in os.listdir(diretorio):
+        if nome.endswith(_EXTENSAO):
+            try:
+                info = os.stat(os.path.join(diretorio, nome))
+            except OSError:
+                # Outro processo removeu o arquivo entre o listdir e o stat
+                continue
+            entradas.append((info.st_mtime, info.st_size, nome))
+
+    total = sum(tamanho for _, tamanho, _ in entradas)
+    for _, tamanho, nome in sorted(entradas):
+        if total <= limite_bytes:
+            break
+        try:
+            os.remove(os.path.join(diretorio, nome))
+        except FileNotFoundError:
+            pass  # Já removido por outro processo: o espaço foi liberado do mesmo jeito
+        except OSError:
+            continue
+        total -= tamanho
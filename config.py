@@ -1,7 +1,10 @@
 # config.py
-from dataclasses import dataclass, field
+import json
+from dataclasses import dataclass, field, asdict
 from typing import List, Optional, Any
-from datetime import date
+from datetime import date, datetime
+
+import pandas as pd
 
 @dataclass
 class BancoConfig:
@@ -33,3 +36,56 @@ class AppConfig:
     equipes: str
     convai: float
     bancos_config: List[BancoConfig] = field(default_factory=list)
+    # Número máximo de leads da campanha (os de maior valor); None = sem limite
+    limite_campanha: Optional[int] = None
+    # Exclui os CPFs enviados nos últimos N dias, segundo o registro de leads; None = não exclui
+    dias_sem_reenvio: Optional[int] = None
+    # Grava os CPFs da saída no registro de leads quando o arquivo é gerado
+    registrar_envio: bool = False
+
+
+def data_limite_por_idade(idade_maxima: int, hoje: Optional[date] = None) -> date:
+    """Data de nascimento mínima para a idade máxima informada, contada a partir de hoje."""
+    hoje = hoje or datetime.today()
+    return (pd.Timestamp(hoje) - pd.DateOffset(years=idade_maxima)).date()
+
+
+def config_para_dict(config: AppConfig) -> dict:
+    """Converte um AppConfig (com seus bancos) num dicionário serializável em JSON."""
+    dados = asdict(config)
+    if config.data_limite is not None:
+        dados['data_limite'] = config.data_limite.isoformat()
+    return dados
+
+
+def config_de_dict(dados: dict) -> AppConfig:
+    """
+    Monta um AppConfig a partir de um dicionário (o formato de `config_para_dict`).
+    Em vez de `data_limite`, aceita `idade_maxima`, calculada no dia da execução.
+    """
+    dados = dict(dados)
+    idade_maxima = dados.pop('idade_maxima', None)
+    if dados.get('data_limite'):
+        dados['data_limite'] = date.fromisoformat(dados['data_limite'])
+    elif idade_maxima is not None:
+        dados['data_limite'] = data_limite_por_idade(idade_maxima)
+    else:
+        dados['data_limite'] = None
+    dados['bancos_config'] = [BancoConfig(**banco) for banco in dados.get('bancos_config', [])]
+    for campo in ('selecao_lotacao', 'selecao_vinculos', 'selecao_secretaria'):
+        dados.setdefault(campo, [])
+    dados.setdefault('equipes', 'outbound')
+    dados.setdefault('convai', 0.0)
+    return AppConfig(**dados)
+
+
+def carregar_config(caminho: str) -> AppConfig:
+    """Lê um AppConfig de um arquivo JSON."""
+    with open(caminho, encoding='utf-8') as f:
+        return config_de_dict(json.load(f))
+
+
+def salvar_config(config: AppConfig, caminho: str):
+    """Grava um AppConfig num arquivo JSON."""
+    with open(caminho, 'w', encoding='utf-8') as f:
+        json.dump(config_para_dict(config), f, ensure_ascii=False, indent=2)
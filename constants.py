@@ -1,4 +1,5 @@
 # constants.py
+import os
 
 # MAPEAMENTO DE BANCOS
 BANCOS_MAPEAMENTO = {
@@ -38,8 +39,111 @@ COL_MG_CARTAO_DISP = 'MG_Cartao_Disponivel'
 COL_MG_CARTAO_TOTAL = 'MG_Cartao_Total'
 COL_MG_COMPULSORIA_DISP = 'MG_Compulsoria_Disponivel'
 
+# LEITURA DOS ARQUIVOS DE ENTRADA
+NUM_COLUNAS_ENTRADA = 26  # Apenas as primeiras colunas do arquivo são usadas no filtro
+PREFIXO_COLUNAS_MARGEM = 'MG_'
+TAMANHO_BLOCO_LEITURA = 250_000  # Linhas por bloco na leitura em blocos
+
+# ESQUEMA DE TIPOS DA BASE DE ENTRADA
+# Aplicado na leitura. Colunas com poucos valores distintos viram categorias,
+# as margens (MG_*) viram float64 e os demais textos (CPF, matrícula, nomes,
+# telefones...) ficam em strings Arrow, bem mais compactas que objetos Python.
+# As margens são dinheiro: float32 (24 bits de mantissa) perde os centavos a partir
+# de R$ 131.072, então ficam em float64.
+# Altere VERSAO_ESQUEMA sempre que o esquema mudar.
+VERSAO_ESQUEMA = 2
+TIPO_MARGEM = 'float64'
+TIPO_TEXTO = 'string[pyarrow]'
+ESQUEMA_ENTRADA = {
+    'Origem_Dado': 'category',
+    COL_CONVENIO: 'category',
+    COL_LOTACAO: 'category',
+    COL_VINCULO: 'category',
+    COL_SECRETARIA: 'category',
+    COL_CPF: TIPO_TEXTO,
+    COL_MATRICULA: TIPO_TEXTO,
+    COL_NOME_CLIENTE: TIPO_TEXTO,
+    COL_DATA_NASCIMENTO: TIPO_TEXTO,
+}
+
+# EXECUÇÃO PARALELA DO FILTRO
+PROCESSOS_PARALELOS = os.cpu_count() or 1
+LINHAS_MINIMAS_PARALELISMO = 500_000  # Abaixo disso o custo de distribuir as partições não compensa
+
+# CACHE EM DISCO DAS BASES LIDAS
+DIRETORIO_CACHE_BASES = '.cache_bases'
+LIMITE_CACHE_BASES_BYTES = 20 * 1024**3  # 20 GB
+ATTR_CHAVE_BASE = 'chave_conteudo'  # Chave em df.attrs com o hash do conteúdo da base
+ATTR_CARGA_BASE = 'carga'  # Chave em df.attrs com o identificador único de cada carga da base (ver marcar_carga)
+ATTR_CHAVES_ARQUIVOS = 'chaves_arquivos'  # Chaves no cache de cada arquivo da base, na ordem da leitura
+
+# NORMALIZAÇÃO (ver normalizacao.py)
+# Formatos da data de nascimento tentados em ordem (pelo caminho rápido); os demais
+# caem para o parser do pandas, com dayfirst, como o pd.to_datetime de antes
+FORMATOS_DATA_NASCIMENTO = ('%d/%m/%Y', '%Y-%m-%d')
+# Acima dessa fração de datas preenchidas que não viram data, converter_datas avisa no log
+FRACAO_ALERTA_DATAS_INVALIDAS = 0.05
+DIGITOS_CPF = 11
+
+# CACHE DE ETAPAS DO FILTRO (em memória, por base e configuração)
+# Cada item guarda a seleção e as colunas calculadas (algumas colunas float por linha da base)
+TAMANHO_CACHE_ETAPAS = 8
+
+# MOTOR DOS FILTROS GLOBAIS (ver plano_arrow.py)
+# 'pandas' aplica as regras uma a uma; 'arrow' avalia todas numa varredura multithread
+MOTORES_FILTRO = ('pandas', 'arrow')
+MOTOR_FILTRO_PADRAO = 'pandas'
+LINHAS_POR_LOTE_ARROW = 128 * 1024  # Lotes processados em paralelo pelo Acero
+
+# PROCESSAMENTO EM DISCO (bases maiores que a memória, ver processamento_em_disco.py)
+# Tamanho de CSV por partição: cada partição, e cada balde de CPFs, precisa caber em memória
+BYTES_CSV_POR_PARTICAO = 256 * 1024**2
+PARTICOES_EM_DISCO_PADRAO = 16  # Quando o tamanho dos arquivos não é conhecido
+
+# EXPORTAÇÃO DO RESULTADO
+# Formato -> (extensão do arquivo, tipo MIME do download)
+FORMATOS_EXPORTACAO = {
+    'CSV': ('.csv', 'text/csv'),
+    'CSV (gzip)': ('.csv.gz', 'application/gzip'),
+    'CSV (zip)': ('.zip', 'application/zip'),
+    'Parquet': ('.parquet', 'application/vnd.apache.parquet'),
+}
+LINHAS_POR_BLOCO_EXPORTACAO = 100_000  # Linhas escritas por vez no CSV
+DIRETORIO_EXPORTACOES = 'filtro_konsi_exportacoes'  # Dentro do diretório temporário do sistema
+IDADE_MAXIMA_EXPORTACOES_SEGUNDOS = 6 * 3600  # Arquivos exportados mais antigos que isso são apagados
+LINHAS_PREVIA_RESULTADO = 1_000  # Linhas do resultado mostradas na tela
+
+# PRÉVIA POR AMOSTRA (ver previa_amostral.py)
+UNIDADES_AMOSTRA_PREVIA = 50_000  # Grupos de linhas (por CPF e matrícula) sorteados para a prévia
+MINIMO_POR_ESTRATO_PREVIA = 30  # Mínimo de grupos sorteados por estrato (ou todos, se o estrato for menor)
+Z_CONFIANCA_PREVIA = 1.96  # Margem de erro de 95%
+
+# FILA DE PROCESSAMENTOS EM SEGUNDO PLANO (ver fila_jobs.py)
+ARQUIVO_FILA_JOBS = 'filtro_konsi_fila.sqlite3'  # Dentro do diretório temporário do sistema
+# Processamentos executados ao mesmo tempo. Cada trabalhador guarda a última base que leu,
+# então o número fica baixo mesmo em servidores com muitos núcleos
+PROCESSOS_FILA_JOBS = min(2, PROCESSOS_PARALELOS)
+INTERVALO_CONSULTA_FILA_SEGUNDOS = 1.0  # Espera dos trabalhadores com a fila vazia e do app entre atualizações
+
+# REGISTRO DOS LEADS ENVIADOS (ver registro_leads.py)
+ARQUIVO_REGISTRO_LEADS = 'registro_leads.sqlite3'  # No diretório de trabalho, como o snapshot das regras
+
+# CACHE DAS REGRAS DE EXCLUSÃO (MONGODB)
+TTL_CACHE_REGRAS_SEGUNDOS = 300
+# Só os campos usados pelo app são lidos da coleção
+PROJECAO_REGRAS = {'_id': 0, 'convenio': 1, 'produto': 1, 'lotacoes': 1, 'vinculos': 1, 'secretarias': 1}
+# Timeout de seleção de servidor/conexão; passado esse tempo, vale o snapshot local
+TIMEOUT_CONEXAO_MONGO_MS = 3_000
+# Cópia local das regras, regravada a cada leitura bem-sucedida do MongoDB
+ARQUIVO_SNAPSHOT_REGRAS = 'regras_snapshot.json'
+
+# CONVÊNIOS SEM A EXIGÊNCIA DE MARGEM DE BENEFÍCIO TODA DISPONÍVEL (campanha Benefício)
+CONVENIOS_SEM_MARGEM_BENEFICIO_LIVRE = frozenset({'prefrj', 'govpi', 'goval', 'govce'})
+
 # COLUNAS PARA APLICAR CONDIÇÕES
 COLUNAS_CONDICAO = ['Vinculo_Servidor', 'Lotacao', 'Secretaria', 'Aplicar a toda a base']
+# Colunas com os valores distintos pré-calculados para os widgets do app
+COLUNAS_INDICE_VALORES = [COL_LOTACAO, COL_VINCULO, COL_SECRETARIA]
 
 # MAPEAMENTO PARA RENOMEAÇÃO DE SAÍDA
 COLUNAS_MAPEAMENTO_SAIDA = {
@@ -1,65 +1,228 @@
 # db_utils.py
+import json
+import logging
+import os
+import threading
+import time
+
 import streamlit as st
 from pymongo import MongoClient
-from pymongo.errors import ConnectionFailure, OperationFailure
 
-# --- FUNÇÃO DE CONEXÃO CACHEADA ---
-# O intuito do cache é para que nao fique puxando sempre os dados
-@st.cache_resource
-def connect_to_mongodb():
-    """
-    Tenta conectar-se ao MongoDB usando a Connection String dos segredos do Streamlit.
-    Retorna o objeto da coleção de regras.
-    """
-    # Apanha a connection string dos segredos do Streamlit
-    connection_string = st.secrets.get("mongo", {}).get("connection_string")
+from constants import (
+    TTL_CACHE_REGRAS_SEGUNDOS, PROJECAO_REGRAS, TIMEOUT_CONEXAO_MONGO_MS, ARQUIVO_SNAPSHOT_REGRAS,
+)
 
-    if not connection_string:
-        st.error("A Connection String do MongoDB não foi encontrada nos segredos do Streamlit.")
-        return None
+logger = logging.getLogger(__name__)
 
+# --- CONEXÃO ---
+def connect_to_mongodb(connection_string: str, timeout_ms: int = TIMEOUT_CONEXAO_MONGO_MS):
+    """
+    Conecta-se ao MongoDB e retorna o objeto da coleção de regras. O timeout curto de
+    seleção de servidor faz a falha aparecer em segundos, e não nos 30 s padrão do driver.
+    Levanta ConnectionFailure/OperationFailure se não for possível conectar.
+    """
+    client = MongoClient(connection_string, serverSelectionTimeoutMS=timeout_ms, connectTimeoutMS=timeout_ms)
     try:
-        # Tenta criar um cliente e conectar-se
-        client = MongoClient(connection_string)
         # Pinga a base de dados para confirmar uma conexão bem-sucedida
         client.admin.command('ping')
-        st.success("Conexão com o MongoDB estabelecida com sucesso!", icon="🍃")
-        # Seleciona a sua base de dados e a coleção
-        db = client.growth
-        return db.covenant_restrictions 
-    except ConnectionFailure as e:
-        st.error(f"Falha na conexão com o MongoDB. Verifique a sua Connection String e as configurações de rede. Erro: {e}")
-        return None
-    except OperationFailure as e:
-        st.error(f"Falha na autenticação. Verifique o utilizador e a senha na sua Connection String. Erro: {e}")
-        return None
-    except Exception as e:
-        st.error(f"Ocorreu um erro inesperado ao conectar-se ao MongoDB: {e}")
-        return None
+    except Exception:
+        client.close()
+        raise
+    # Seleciona a sua base de dados e a coleção
+    return client.growth.covenant_restrictions
 
 
-# --- FUNÇÃO PARA BUSCAR REGRAS ---
-def carregar_regras_da_bd(collection, convenio, campanha):
+# --- CACHE DE REGRAS ---
+class CacheRegras:
     """
-    Busca um documento de regras na coleção do MongoDB com base no convênio e na campanha.
+    Índice em memória das regras da coleção, por (convenio, produto).
+
+    Todos os documentos são lidos de uma vez (só com os campos usados pelo app) e ficam
+    válidos por `ttl` segundos; depois disso, a próxima consulta relê a coleção. Com
+    `acompanhar_alteracoes()`, um change stream invalida o índice assim que a coleção muda
+    (em servidores sem change stream, fica valendo só o TTL).
+
+    Com `caminho_snapshot`, cada leitura bem-sucedida é gravada nesse arquivo JSON, e o
+    snapshot é usado enquanto não há coleção (ainda conectando ou sem rede) ou quando a
+    leitura falha. `collection` pode ficar None e ser definida depois, com `definir_colecao`
+    ou `conectar_em_segundo_plano`.
     """
-    if collection is None:
-        return {} # Retorna um dicionário vazio se não houver conexão
+    def __init__(self, collection=None, ttl: float = TTL_CACHE_REGRAS_SEGUNDOS, relogio=time.monotonic,
+                 caminho_snapshot: str = None):
+        self.collection = collection
+        self.ttl = ttl
+        self.caminho_snapshot = caminho_snapshot
+        # De onde veio o índice atual: 'mongodb', 'snapshot' ou None (sem regras)
+        self.origem = None
+        self._relogio = relogio
+        self._indice = None
+        self._carregado_em = None
+        self._lock = threading.Lock()
+        self._observador = None
+        self._conexao = None
+
+    @staticmethod
+    def _indexar(documentos) -> dict:
+        indice = {}
+        for documento in documentos:
+            chave = (documento.get('convenio'), documento.get('produto'))
+            # Como no find_one, vale o primeiro documento de cada chave
+            indice.setdefault(chave, documento)
+        return indice
+
+    def _carregar(self):
+        documentos = None
+        if self.collection is not None:
+            try:
+                documentos = list(self.collection.find({}, PROJECAO_REGRAS))
+            except Exception as e:
+                logger.warning("Falha ao ler as regras do MongoDB, usando o snapshot local: %s", e)
+        if documentos is not None:
+            self.origem = 'mongodb'
+            self._gravar_snapshot(documentos)
+        else:
+            documentos = self._ler_snapshot()
+            self.origem = 'snapshot' if documentos is not None else None
+        self._indice = self._indexar(documentos or [])
+        self._carregado_em = self._relogio()
+
+    def _ler_snapshot(self):
+        if not self.caminho_snapshot or not os.path.exists(self.caminho_snapshot):
+            return None
+        try:
+            with open(self.caminho_snapshot, encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning("Snapshot de regras ilegível em %s: %s", self.caminho_snapshot, e)
+            return None
+
+    def _gravar_snapshot(self, documentos):
+        if not self.caminho_snapshot:
+            return
+        # Grava ao lado e renomeia, para nunca deixar um snapshot pela metade
+        temporario = f"{self.caminho_snapshot}.{os.getpid()}.tmp"
+        try:
+            with open(temporario, 'w', encoding='utf-8') as f:
+                json.dump(documentos, f, ensure_ascii=False, default=str)
+            os.replace(temporario, self.caminho_snapshot)
+        except OSError as e:
+            logger.warning("Não foi possível gravar o snapshot de regras em %s: %s", self.caminho_snapshot, e)
+            if os.path.exists(temporario):
+                os.remove(temporario)
+
+    def _expirado(self) -> bool:
+        return self._indice is None or self._relogio() - self._carregado_em >= self.ttl
+
+    def obter(self, convenio: str, produto: str) -> dict:
+        """Regra do convênio/produto (cópia), ou {} se não houver."""
+        with self._lock:
+            if self._expirado():
+                self._carregar()
+            regra = self._indice.get((convenio, produto))
+        return dict(regra) if regra else {}
+
+    def invalidar(self):
+        """Força a releitura da coleção na próxima consulta."""
+        with self._lock:
+            self._indice = None
+
+    def definir_colecao(self, collection, acompanhar_alteracoes: bool = True):
+        """Passa a ler as regras de `collection` (a partir da próxima consulta)."""
+        with self._lock:
+            self.collection = collection
+            self._indice = None
+        if acompanhar_alteracoes:
+            self.acompanhar_alteracoes()
+
+    def conectar_em_segundo_plano(self, connection_string: str, timeout_ms: int = TIMEOUT_CONEXAO_MONGO_MS):
+        """
+        Conecta-se ao MongoDB numa thread, sem bloquear quem chamou; até lá (e se a conexão
+        falhar) as consultas usam o snapshot. Sem sucesso, tenta de novo a cada `ttl` segundos.
+        """
+        if self._conexao is not None:
+            return
 
+        def conectar():
+            while True:
+                try:
+                    self.definir_colecao(connect_to_mongodb(connection_string, timeout_ms))
+                    logger.info("Conexão com o MongoDB estabelecida.")
+                    return
+                except Exception as e:
+                    logger.warning("Falha na conexão com o MongoDB, usando o snapshot de regras: %s", e)
+                    time.sleep(self.ttl)
+
+        self._conexao = threading.Thread(target=conectar, name='conexao-regras', daemon=True)
+        self._conexao.start()
+
+    def acompanhar_alteracoes(self):
+        """Inicia (uma vez) a thread que invalida o índice a cada alteração na coleção."""
+        if self._observador is None and self.collection is not None:
+            self._observador = threading.Thread(target=self._observar, name='cache-regras', daemon=True)
+            self._observador.start()
+
+    def _observar(self):
+        try:
+            with self.collection.watch() as alteracoes:
+                for _ in alteracoes:
+                    self.invalidar()
+        except Exception as e:
+            # Servidor sem replica set (ou coleção de teste sem watch): fica só o TTL
+            logger.warning("Change stream indisponível para as regras, usando só o TTL: %s", e)
+
+
+@st.cache_resource
+def fonte_de_regras() -> CacheRegras:
+    """
+    Cache de regras do app, criado uma vez por processo. Carrega na hora o snapshot local
+    e conecta-se ao MongoDB (Connection String dos segredos do Streamlit) em segundo plano,
+    de modo que a abertura do app não espera pela base de dados.
+    """
+    fonte = CacheRegras(caminho_snapshot=ARQUIVO_SNAPSHOT_REGRAS)
     try:
-        # Cria a chave da campanha no formato correto (ex: 'beneficio_cartao')
-        campanha_key = campanha.lower().replace(' & ', '_').replace(' ', '_')
+        connection_string = st.secrets.get("mongo", {}).get("connection_string")
+    except Exception:
+        connection_string = None
+    if connection_string:
+        fonte.conectar_em_segundo_plano(connection_string)
+    else:
+        st.warning("A Connection String do MongoDB não foi encontrada nos segredos do Streamlit; usando o snapshot local de regras.")
+    return fonte
 
-        # Consulta a base de dados para encontrar o documento que corresponde
-        query = {"convenio": convenio, "produto": campanha_key}
-        regra = collection.find_one(query)
 
-        if regra:
-            # Retorna o documento inteiro da regra se encontrado
-            return regra
-        else:
-            # Retorna um dicionário vazio se nenhuma regra for encontrada para essa combinação
-            return {}
+_caches_regras = {}
+_lock_caches = threading.Lock()
+
+def cache_regras(collection, acompanhar_alteracoes: bool = True) -> CacheRegras:
+    """Cache de regras de uma coleção já conectada, criado na primeira chamada e compartilhado."""
+    with _lock_caches:
+        cache = _caches_regras.get(collection)
+        if cache is None:
+            cache = _caches_regras[collection] = CacheRegras(collection)
+            if acompanhar_alteracoes:
+                cache.acompanhar_alteracoes()
+    return cache
+
+
+def chave_produto(campanha: str) -> str:
+    """Chave da campanha no formato da coleção (ex: 'Benefício & Cartão' -> 'benefício_cartão')."""
+    return campanha.lower().replace(' & ', '_').replace(' ', '_')
+
+
+# --- FUNÇÃO PARA BUSCAR REGRAS ---
+def carregar_regras_da_bd(fonte, convenio, campanha):
+    """
+    Busca as regras do convênio e da campanha. `fonte` é um CacheRegras (ver fonte_de_regras)
+    ou uma coleção, que ganha o seu próprio cache; a consulta é feita no índice em memória,
+    que lê a coleção inteira de uma vez e a relê a cada TTL.
+    """
+    if fonte is None:
+        return {} # Retorna um dicionário vazio se não houver conexão
+
+    try:
+        if not isinstance(fonte, CacheRegras):
+            fonte = cache_regras(fonte)
+        return fonte.obter(convenio, chave_produto(campanha))
     except Exception as e:
         st.error(f"Erro ao buscar regras na base de dados: {e}")
         return {}
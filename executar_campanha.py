@@ -0,0 +1,191 @@
+# executar_campanha.py
+"""
+Executa uma ou mais campanhas pela linha de comando, sem o Streamlit.
+
+Recebe um arquivo JSON com a configuração da campanha (um AppConfig serializado,
+com a lista de BancoConfig em `bancos_config`; ver config.config_de_dict) e os
+arquivos CSV de higienização, e grava o CSV filtrado no mesmo formato do download
+do app (ou, com --formato, em CSV compactado ou Parquet; ver exportacao). Se a
+configuração não trouxer o `convenio`, ele é lido da base.
+
+Para várias campanhas sobre a mesma base, o JSON pode ser uma lista de configurações
+ou um objeto com os campos comuns e a lista `campanhas` (cada item sobrepõe os campos
+comuns). A base é lida e pré-filtrada uma só vez e as campanhas rodam em paralelo
+(ver filter_handler.processar_campanhas); cada uma gera um arquivo <convenio>-<campanha>
+no diretório de saída.
+
+Uso:
+    python executar_campanha.py campanha.json base1.csv base2.csv -o saida.csv
+    python executar_campanha.py campanhas.json base1.csv base2.csv -d saidas/
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+import tracemalloc
+
+from config import config_de_dict
+from constants import (
+    PROCESSOS_PARALELOS, TAMANHO_BLOCO_LEITURA, FORMATOS_EXPORTACAO, MOTORES_FILTRO, MOTOR_FILTRO_PADRAO,
+    ARQUIVO_REGISTRO_LEADS,
+)
+from exportacao import exportar, nome_download
+from filter_handler import FiltroHandler, processar_campanhas
+from juntar_bases import juntar_bases, convenio_da_base
+from processamento_em_disco import espalhar_em_disco, FiltroEmDisco
+from registro_leads import RegistroLeads
+from strategies import STRATEGY_MAPEAMENTO
+
+logger = logging.getLogger('executar_campanha')
+
+
+def _especificacoes(dados) -> list:
+    """Lista de dicionários de configuração, um por campanha, a partir do JSON lido."""
+    if isinstance(dados, list):
+        return [dict(item) for item in dados]
+    if 'campanhas' in dados:
+        comuns = {chave: valor for chave, valor in dados.items() if chave != 'campanhas'}
+        return [{**comuns, **item} for item in dados['campanhas']]
+    return [dict(dados)]
+
+
+def _nomes_saida(configs, diretorio: str, formato: str) -> list:
+    nomes, usados = [], {}
+    for config in configs:
+        nome = f"{config.convenio}-{config.campanha}"
+        usados[nome] = usados.get(nome, 0) + 1
+        if usados[nome] > 1:
+            nome = f"{nome}_{usados[nome]}"
+        nomes.append(os.path.join(diretorio, nome_download(nome, formato)))
+    return nomes
+
+
+def _configs(especificacoes, convenio: str) -> list:
+    configs = []
+    for dados in especificacoes:
+        dados.setdefault('convenio', convenio)
+        config = config_de_dict(dados)
+        if config.campanha not in STRATEGY_MAPEAMENTO:
+            raise ValueError(f"Campanha desconhecida: {config.campanha!r} (opções: {', '.join(STRATEGY_MAPEAMENTO)})")
+        configs.append(config)
+    return configs
+
+
+def executar(caminho_config: str, arquivos: list, saida: str = None, num_processos: int = PROCESSOS_PARALELOS,
+             tamanho_bloco: int = TAMANHO_BLOCO_LEITURA, usar_cache: bool = True, diretorio_saida: str = '.',
+             formato: str = 'CSV', motor: str = MOTOR_FILTRO_PADRAO, em_disco: bool = False,
+             registro_leads: str = ARQUIVO_REGISTRO_LEADS) -> list:
+    """
+    Executa as campanhas descritas em `caminho_config` e devolve os caminhos dos arquivos gravados
+    (no `formato` escolhido, uma das chaves de FORMATOS_EXPORTACAO). `motor` é o motor dos
+    filtros globais (ver FiltroHandler); com `em_disco`, a base não é carregada inteira em
+    memória (ver processamento_em_disco). `registro_leads` é o arquivo do registro de leads
+    consultado com `dias_sem_reenvio` e gravado com `registrar_envio` (ver registro_leads).
+    `saida` só vale quando há uma única campanha.
+    """
+    with open(caminho_config, encoding='utf-8') as f:
+        especificacoes = _especificacoes(json.load(f))
+    if not especificacoes:
+        raise ValueError("Nenhuma campanha na configuração.")
+    if saida and len(especificacoes) > 1:
+        raise ValueError("Com várias campanhas, use o diretório de saída em vez de um arquivo.")
+    # O arquivo do registro só é aberto (e criado) se alguma campanha o usa
+    usa_registro = any(dados.get('dias_sem_reenvio') or dados.get('registrar_envio') for dados in especificacoes)
+    registro = RegistroLeads(registro_leads) if usa_registro else None
+    if em_disco:
+        return _executar_em_disco(especificacoes, arquivos, saida, tamanho_bloco, diretorio_saida, formato, motor,
+                                  registro)
+
+    inicio = time.perf_counter()
+    base = juntar_bases(arquivos, tamanho_bloco=tamanho_bloco or None, usar_cache=usar_cache)
+    if base.empty:
+        raise ValueError("Nenhum arquivo válido foi carregado.")
+    logger.info("Base carregada: %d linhas em %.1fs", len(base), time.perf_counter() - inicio)
+
+    configs = _configs(especificacoes, convenio_da_base(base))
+    strategy_classes = [STRATEGY_MAPEAMENTO[config.campanha] for config in configs]
+
+    inicio = time.perf_counter()
+    if len(configs) == 1:
+        resultados = [FiltroHandler(base, configs[0], strategy_classes[0], num_processos=num_processos,
+                                   motor=motor, registro=registro).processar()]
+    else:
+        resultados = processar_campanhas(base, configs, strategy_classes, motor=motor, registro=registro)
+    logger.info("Filtro concluído: %d campanha(s) em %.1fs", len(configs), time.perf_counter() - inicio)
+
+    caminhos = [saida] if saida else _nomes_saida(configs, diretorio_saida, formato)
+    os.makedirs(diretorio_saida, exist_ok=True)
+    for config, resultado, caminho in zip(configs, resultados, caminhos):
+        exportar(resultado, caminho, formato)
+        logger.info("%s: %d linhas gravadas em %s", config.campanha, len(resultado), caminho)
+        if config.registrar_envio:
+            registro.registrar_saida(resultado, config.campanha, config.equipes)
+    return caminhos
+
+
+def _executar_em_disco(especificacoes, arquivos: list, saida: str, tamanho_bloco: int, diretorio_saida: str,
+                       formato: str, motor: str, registro: RegistroLeads) -> list:
+    """As campanhas de `executar` sobre a base espalhada em partições no disco, uma de cada vez."""
+    inicio = time.perf_counter()
+    with espalhar_em_disco(arquivos, tamanho_bloco=tamanho_bloco) as base:
+        if not base.linhas:
+            raise ValueError("Nenhum arquivo válido foi carregado.")
+        logger.info("Base gravada em %d partições: %d linhas em %.1fs",
+                    base.num_particoes, base.linhas, time.perf_counter() - inicio)
+
+        configs = _configs(especificacoes, base.convenio)
+        caminhos = [saida] if saida else _nomes_saida(configs, diretorio_saida, formato)
+        os.makedirs(diretorio_saida, exist_ok=True)
+        for config, caminho in zip(configs, caminhos):
+            inicio = time.perf_counter()
+            linhas = FiltroEmDisco(base, config, STRATEGY_MAPEAMENTO[config.campanha], motor=motor,
+                                   registro=registro).processar(caminho, formato)
+            logger.info("%s: %d linhas gravadas em %s (%.1fs)", config.campanha, linhas, caminho, time.perf_counter() - inicio)
+    return caminhos
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("config", help="Arquivo JSON com a configuração da(s) campanha(s)")
+    parser.add_argument("arquivos", nargs='+', help="Arquivos CSV de higienização")
+    parser.add_argument("-o", "--saida", help="CSV de saída, só para uma campanha (padrão: <convenio>-<campanha>.csv)")
+    parser.add_argument("-d", "--diretorio-saida", default='.', help="Diretório dos CSVs gerados (padrão: atual)")
+    parser.add_argument("--formato", choices=list(FORMATOS_EXPORTACAO), default='CSV',
+                        help="Formato dos arquivos gerados (padrão: %(default)s)")
+    parser.add_argument("--processos", type=int, default=PROCESSOS_PARALELOS,
+                        help="Processos para a execução particionada de uma campanha (padrão: %(default)s)")
+    parser.add_argument("--tamanho-bloco", type=int, default=TAMANHO_BLOCO_LEITURA,
+                        help="Linhas por bloco na leitura; 0 lê cada arquivo inteiro (padrão: %(default)s)")
+    parser.add_argument("--motor", choices=MOTORES_FILTRO, default=MOTOR_FILTRO_PADRAO,
+                        help="Motor dos filtros globais: regra a regra ou numa varredura Arrow (padrão: %(default)s)")
+    parser.add_argument("--em-disco", action='store_true',
+                        help="Para bases maiores que a memória: processa a base em partições gravadas no disco")
+    parser.add_argument("--registro-leads", default=ARQUIVO_REGISTRO_LEADS,
+                        help="Arquivo SQLite do registro de leads enviados (padrão: %(default)s)")
+    parser.add_argument("--sem-cache", action='store_true', help="Não usa o cache em disco das bases lidas")
+    parser.add_argument("--perfil-json", action='store_true',
+                        help="Registra no log, em JSON, o tempo e as linhas de cada etapa do filtro (ver perfil)")
+    parser.add_argument("--perfil-memoria", action='store_true',
+                        help="Mede também o pico de memória de cada etapa (com tracemalloc, mais lento)")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+    if args.perfil_json:
+        logging.getLogger('perfil').setLevel(logging.DEBUG)
+    if args.perfil_memoria:
+        tracemalloc.start()
+    try:
+        executar(args.config, args.arquivos, args.saida, num_processos=args.processos,
+                 tamanho_bloco=args.tamanho_bloco, usar_cache=not args.sem_cache,
+                 diretorio_saida=args.diretorio_saida, formato=args.formato, motor=args.motor,
+                 em_disco=args.em_disco, registro_leads=args.registro_leads)
+    except Exception as e:
+        logger.error("Falha ao executar a campanha: %s", e)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,154 @@
+# exportacao.py
+"""
+Exportação do resultado filtrado para arquivo em disco.
+
+O CSV é escrito em blocos de LINHAS_POR_BLOCO_EXPORTACAO linhas direto no arquivo
+(opcionalmente dentro de um gzip ou zip), sem montar o texto inteiro em memória, e
+com o mesmo conteúdo do `to_csv(sep=';', encoding='utf-8-sig')` de antes. Também há
+saída em Parquet. `exportar_em_blocos` grava uma sequência de DataFrames como um só
+arquivo, para resultados que não cabem inteiros em memória. O app guarda só o caminho do arquivo exportado e serve o download
+a partir do disco; os arquivos antigos são apagados por `limpar_exportacoes`.
+"""
+import gzip
+import io
+import logging
+import os
+import tempfile
+import time
+import zipfile
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from constants import (
+    FORMATOS_EXPORTACAO, LINHAS_POR_BLOCO_EXPORTACAO,
+    DIRETORIO_EXPORTACOES, IDADE_MAXIMA_EXPORTACOES_SEGUNDOS,
+)
+
+logger = logging.getLogger(__name__)
+
+SEPARADOR_CSV = ';'
+CODIFICACAO_CSV = 'utf-8-sig'
+
+
+def _fatias(df: pd.DataFrame, linhas_por_bloco: int):
+    for inicio in range(0, max(len(df), 1), linhas_por_bloco):
+        yield df.iloc[inicio:inicio + linhas_por_bloco]
+
+
+def _escrever_csv(blocos, arquivo_texto):
+    for i, bloco in enumerate(blocos):
+        bloco.to_csv(arquivo_texto, index=False, sep=SEPARADOR_CSV, header=(i == 0))
+
+
+def esquema_estavel(esquema: pa.Schema) -> pa.Schema:
+    """
+    Esquema que serve para todos os pedaços de um mesmo resultado: os índices das
+    categorias passam a int32 (cada pedaço escolhe o menor que cabe nas suas) e colunas
+    sem nenhum valor, de tipo nulo, passam a texto.
+    """
+    campos = []
+    for campo in esquema:
+        if pa.types.is_dictionary(campo.type):
+            campo = campo.with_type(pa.dictionary(pa.int32(), campo.type.value_type))
+        elif pa.types.is_null(campo.type):
+            campo = campo.with_type(pa.string())
+        campos.append(campo)
+    return pa.schema(campos, metadata=esquema.metadata)
+
+
+def _escrever_parquet(blocos, caminho: str):
+    escritor = None
+    try:
+        for bloco in blocos:
+            tabela = pa.Table.from_pandas(bloco, preserve_index=False)
+            if escritor is None:
+                escritor = pq.ParquetWriter(caminho, esquema_estavel(tabela.schema))
+            # Um bloco sem linhas num pedaço pode ter tipo nulo numa coluna de texto
+            escritor.write_table(tabela.cast(escritor.schema))
+    finally:
+        if escritor is not None:
+            escritor.close()
+
+
+def exportar(df: pd.DataFrame, caminho: str, formato: str = 'CSV',
+             linhas_por_bloco: int = LINHAS_POR_BLOCO_EXPORTACAO) -> str:
+    """
+    Grava `df` em `caminho` no formato escolhido (uma das chaves de FORMATOS_EXPORTACAO).
+    O arquivo é escrito ao lado com outro nome e só então renomeado, para que nunca
+    exista um arquivo pela metade no caminho final.
+    """
+    if formato == 'Parquet':
+        return exportar_em_blocos([df], caminho, formato)
+    return exportar_em_blocos(_fatias(df, linhas_por_bloco), caminho, formato)
+
+
+def exportar_em_blocos(blocos, caminho: str, formato: str = 'CSV') -> str:
+    """
+    Como `exportar`, mas recebendo o resultado em pedaços (DataFrames com as mesmas
+    colunas, na ordem da saída), que são gravados um a um no mesmo arquivo. Deve haver
+    ao menos um pedaço, ainda que vazio, para o cabeçalho.
+    """
+    if formato not in FORMATOS_EXPORTACAO:
+        raise ValueError(f"Formato de exportação desconhecido: {formato!r}")
+    temporario = f"{caminho}.{os.getpid()}.tmp"
+    try:
+        if formato == 'Parquet':
+            _escrever_parquet(blocos, temporario)
+        elif formato == 'CSV (gzip)':
+            with gzip.open(temporario, 'wt', encoding=CODIFICACAO_CSV, newline='', compresslevel=6) as f:
+                _escrever_csv(blocos, f)
+        elif formato == 'CSV (zip)':
+            nome_interno = os.path.basename(caminho)
+            nome_interno = nome_interno[:-len('.zip')] if nome_interno.endswith('.zip') else nome_interno
+            with zipfile.ZipFile(temporario, 'w', compression=zipfile.ZIP_DEFLATED) as zf:
+                with zf.open(nome_interno + '.csv', 'w', force_zip64=True) as binario:
+                    with io.TextIOWrapper(binario, encoding=CODIFICACAO_CSV, newline='') as f:
+                        _escrever_csv(blocos, f)
+        else:
+            with open(temporario, 'w', encoding=CODIFICACAO_CSV, newline='') as f:
+                _escrever_csv(blocos, f)
+        os.replace(temporario, caminho)
+    finally:
+        if os.path.exists(temporario):
+            os.remove(temporario)
+    return caminho
+
+
+def exportar_temporario(df: pd.DataFrame, nome: str, formato: str = 'CSV') -> str:
+    """
+    Exporta `df` para um arquivo novo no diretório de exportações (dentro do diretório
+    temporário do sistema) e devolve o caminho. `nome` é o nome do arquivo sem extensão.
+    """
+    diretorio = os.path.join(tempfile.gettempdir(), DIRETORIO_EXPORTACOES)
+    os.makedirs(diretorio, exist_ok=True)
+    limpar_exportacoes(diretorio)
+    extensao = FORMATOS_EXPORTACAO[formato][0] if formato in FORMATOS_EXPORTACAO else ''
+    descritor, caminho = tempfile.mkstemp(prefix=f"{nome}_", suffix=extensao, dir=diretorio)
+    os.close(descritor)
+    try:
+        return exportar(df, caminho, formato)
+    except Exception:
+        os.remove(caminho)
+        raise
+
+
+def nome_download(nome: str, formato: str) -> str:
+    """Nome do arquivo oferecido no download, com a extensão do formato."""
+    return nome + FORMATOS_EXPORTACAO[formato][0]
+
+
+def limpar_exportacoes(diretorio: str = None, idade_maxima: float = IDADE_MAXIMA_EXPORTACOES_SEGUNDOS):
+    """Apaga os arquivos exportados há mais de `idade_maxima` segundos."""
+    diretorio = diretorio or os.path.join(tempfile.gettempdir(), DIRETORIO_EXPORTACOES)
+    if not os.path.isdir(diretorio):
+        return
+    limite = time.time() - idade_maxima
+    for nome in os.listdir(diretorio):
+        caminho = os.path.join(diretorio, nome)
+        try:
+            if os.path.getmtime(caminho) < limite:
+                os.remove(caminho)
+        except OSError as e:
+            logger.warning("Não foi possível apagar a exportação antiga %s: %s", caminho, e)
@@ -0,0 +1,279 @@
+# fila_jobs.py
+"""
+Fila de processamentos em segundo plano, para o app não travar durante o filtro.
+
+O app não roda mais o FiltroHandler dentro do clique do botão: `FilaJobs.enviar` grava
+o pedido (configuração, chave da base, formato e motor) numa tabela SQLite e devolve o
+id do job. Um pool de processos trabalhadores (`iniciar_trabalhadores`) consome a fila:
+cada um pega o job mais antigo, remonta a base a partir dos arquivos no cache em disco
+(ver cache_bases), roda o filtro e exporta o resultado. Cada etapa do perfil é gravada na fila assim que termina,
+e o app acompanha o andamento consultando `status`.
+
+Como tudo fica no arquivo SQLite, vários analistas (e vários processos do servidor)
+compartilham a mesma fila, e um job não se perde num rerun ou recarregamento da página.
+Jobs de um trabalhador que morreu voltam para a fila em `recolocar_orfaos`.
+"""
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import sqlite3
+import tempfile
+import time
+import traceback
+import uuid
+from contextlib import closing, contextmanager
+from multiprocessing.process import BaseProcess
+from typing import List, Optional, Tuple
+
+import pandas as pd
+
+from cache_bases import esta_no_cache, gravar_no_cache, ler_do_cache
+from config import AppConfig, config_para_dict, config_de_dict
+from constants import (
+    ARQUIVO_FILA_JOBS, ATTR_CHAVE_BASE, ATTR_CHAVES_ARQUIVOS, INTERVALO_CONSULTA_FILA_SEGUNDOS, LINHAS_PREVIA_RESULTADO,
+    MOTOR_FILTRO_PADRAO, PROCESSOS_FILA_JOBS,
+)
+from exportacao import exportar_temporario
+from filter_handler import FiltroHandler
+from juntar_bases import juntar_do_cache, marcar_carga
+from plano_campanha import compilar_plano
+from registro_leads import registro_leads
+from strategies import STRATEGY_MAPEAMENTO
+
+logger = logging.getLogger(__name__)
+
+NA_FILA = 'na_fila'
+PROCESSANDO = 'processando'
+CONCLUIDO = 'concluido'
+ERRO = 'erro'
+
+_ESQUEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    estado TEXT NOT NULL,
+    nome TEXT NOT NULL,
+    config TEXT NOT NULL,
+    chave_base TEXT NOT NULL,
+    chaves_arquivos TEXT,
+    formato TEXT NOT NULL,
+    motor TEXT NOT NULL,
+    criado_em REAL NOT NULL,
+    iniciado_em REAL,
+    concluido_em REAL,
+    pid INTEGER,
+    etapas TEXT NOT NULL DEFAULT '[]',
+    linhas INTEGER,
+    segundos_filtro REAL,
+    arquivo TEXT,
+    previa TEXT,
+    erro TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_estado ON jobs (estado, criado_em);
+"""
+
+
+def origem_da_base(base: pd.DataFrame) -> Tuple[str, Optional[List[str]]]:
+    """
+    De onde os trabalhadores leem a base: a sua chave e, para bases lidas com `usar_cache`,
+    as chaves dos seus arquivos no cache, que o trabalhador junta de novo (ver
+    juntar_bases.juntar_do_cache) sem que o envio grave outra cópia da base. Uma base
+    montada de outro jeito é gravada inteira no cache, uma única vez.
+    """
+    chave = base.attrs.get(ATTR_CHAVE_BASE)
+    chaves_arquivos = base.attrs.get(ATTR_CHAVES_ARQUIVOS)
+    if chave is not None and chaves_arquivos and all(esta_no_cache(c) for c in chaves_arquivos):
+        return chave, list(chaves_arquivos)
+    if chave is None:
+        chave = hashlib.sha256(pd.util.hash_pandas_object(base, index=False).to_numpy().tobytes()).hexdigest()
+    if not esta_no_cache(chave):
+        gravar_no_cache(chave, base)
+    return chave, None
+
+
+class FilaJobs:
+    """Fila de jobs num arquivo SQLite; cada método abre a sua própria conexão."""
+    def __init__(self, caminho: str = None):
+        self.caminho = caminho or os.path.join(tempfile.gettempdir(), ARQUIVO_FILA_JOBS)
+        with self._conectar() as conexao:
+            conexao.executescript(_ESQUEMA)
+            # Filas criadas antes da coluna chaves_arquivos
+            colunas = {linha['name'] for linha in conexao.execute("PRAGMA table_info(jobs)")}
+            if 'chaves_arquivos' not in colunas:
+                conexao.execute("ALTER TABLE jobs ADD COLUMN chaves_arquivos TEXT")
+
+    @contextmanager
+    def _conectar(self):
+        # Sem transação implícita (cada comando é gravado na hora); pegar_proximo abre a sua
+        with closing(sqlite3.connect(self.caminho, timeout=30, isolation_level=None)) as conexao:
+            conexao.row_factory = sqlite3.Row
+            conexao.execute('PRAGMA journal_mode=WAL')
+            yield conexao
+
+    def _atualizar(self, id_job: str, **campos):
+        atribuicoes = ', '.join(f"{nome} = ?" for nome in campos)
+        with self._conectar() as conexao:
+            conexao.execute(f"UPDATE jobs SET {atribuicoes} WHERE id = ?", (*campos.values(), id_job))
+
+    def enviar(self, base: pd.DataFrame, config: AppConfig, formato: str, nome: str,
+               motor: str = MOTOR_FILTRO_PADRAO) -> str:
+        """
+        Põe um processamento da base na fila e devolve o id do job. A configuração é
+        validada antes (ValueError se for inválida), para o erro aparecer já no envio.
+        """
+        compilar_plano(config)
+        id_job = uuid.uuid4().hex
+        chave, chaves_arquivos = origem_da_base(base)
+        with self._conectar() as conexao:
+            conexao.execute(
+                "INSERT INTO jobs (id, estado, nome, config, chave_base, chaves_arquivos, formato, motor, criado_em) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (id_job, NA_FILA, nome, json.dumps(config_para_dict(config), ensure_ascii=False),
+                 chave, json.dumps(chaves_arquivos) if chaves_arquivos else None, formato, motor, time.time()),
+            )
+        return id_job
+
+    def pegar_proximo(self) -> Optional[dict]:
+        """Marca o job mais antigo da fila como em processamento por este processo e o devolve."""
+        with self._conectar() as conexao:
+            # BEGIN IMMEDIATE trava a escrita: dois trabalhadores nunca pegam o mesmo job
+            conexao.execute('BEGIN IMMEDIATE')
+            try:
+                linha = conexao.execute(
+                    "SELECT * FROM jobs WHERE estado = ? ORDER BY criado_em LIMIT 1", (NA_FILA,)).fetchone()
+                if linha is not None:
+                    conexao.execute("UPDATE jobs SET estado = ?, iniciado_em = ?, pid = ? WHERE id = ?",
+                                    (PROCESSANDO, time.time(), os.getpid(), linha['id']))
+                conexao.execute('COMMIT')
+            except Exception:
+                conexao.execute('ROLLBACK')
+                raise
+        return dict(linha) if linha is not None else None
+
+    def registrar_etapas(self, id_job: str, etapas: List[dict]):
+        self._atualizar(id_job, etapas=json.dumps(etapas, ensure_ascii=False, default=str))
+
+    def concluir(self, id_job: str, arquivo: str, previa: str, linhas: int, segundos_filtro: float,
+                 etapas: List[dict]):
+        self._atualizar(id_job, estado=CONCLUIDO, concluido_em=time.time(), arquivo=arquivo, previa=previa,
+                        linhas=linhas, segundos_filtro=segundos_filtro,
+                        etapas=json.dumps(etapas, ensure_ascii=False, default=str))
+
+    def falhar(self, id_job: str, erro: str):
+        self._atualizar(id_job, estado=ERRO, concluido_em=time.time(), erro=erro)
+
+    def status(self, id_job: str) -> Optional[dict]:
+        """
+        O job como dicionário (None se o id não existir), com as etapas já concluídas em
+        `etapas` e, enquanto ele espera, quantos jobs estão à sua frente em `posicao`.
+        """
+        with self._conectar() as conexao:
+            linha = conexao.execute("SELECT * FROM jobs WHERE id = ?", (id_job,)).fetchone()
+            if linha is None:
+                return None
+            job = dict(linha)
+            job['etapas'] = json.loads(job['etapas'])
+            if job['estado'] == NA_FILA:
+                job['posicao'] = conexao.execute(
+                    "SELECT COUNT(*) FROM jobs WHERE estado = ? AND criado_em < ?",
+                    (NA_FILA, job['criado_em'])).fetchone()[0]
+        return job
+
+    def recolocar_orfaos(self) -> int:
+        """Devolve à fila os jobs em processamento cujo processo não existe mais."""
+        with self._conectar() as conexao:
+            linhas = conexao.execute("SELECT id, pid FROM jobs WHERE estado = ?", (PROCESSANDO,)).fetchall()
+            orfaos = [linha['id'] for linha in linhas if not _processo_vivo(linha['pid'])]
+            for id_job in orfaos:
+                conexao.execute("UPDATE jobs SET estado = ?, pid = NULL, etapas = '[]' WHERE id = ? AND estado = ?",
+                                (NA_FILA, id_job, PROCESSANDO))
+        if orfaos:
+            logger.warning("%d job(s) de trabalhadores encerrados voltaram para a fila", len(orfaos))
+        return len(orfaos)
+
+
+def _processo_vivo(pid: Optional[int]) -> bool:
+    if not pid:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _executar_job(fila: FilaJobs, job: dict, bases: dict):
+    """
+    Roda um job: filtro, exportação, prévia e, se a configuração pedir, o registro dos
+    leads enviados. `bases` guarda a última base lida pelo trabalhador.
+    """
+    chave = job['chave_base']
+    if chave not in bases:
+        # A base anterior é solta antes de ler a nova: o trabalhador guarda uma só
+        bases.clear()
+        chaves_arquivos = json.loads(job['chaves_arquivos']) if job.get('chaves_arquivos') else None
+        base = juntar_do_cache(chaves_arquivos) if chaves_arquivos else ler_do_cache(chave)
+        if base is None:
+            raise ValueError("A base deste processamento não está mais no cache; carregue os arquivos de novo.")
+        # A marca da carga liga o cache de etapas do FiltroHandler entre os jobs da mesma base
+        base.attrs[ATTR_CHAVE_BASE] = chave
+        marcar_carga(base)
+        bases[chave] = base
+
+    config = config_de_dict(json.loads(job['config']))
+    # O paralelismo é entre jobs: cada trabalhador processa o seu num só processo
+    handler = FiltroHandler(bases[chave], config, STRATEGY_MAPEAMENTO[config.campanha], motor=job['motor'])
+    handler.perfil.ao_registrar = lambda _: fila.registrar_etapas(job['id'], handler.relatorio)
+    resultado = handler.processar()
+    segundos_filtro = handler.perfil.segundos_totais()
+
+    with handler.perfil.etapa("exportação", formato=job['formato']):
+        arquivo = exportar_temporario(resultado, job['nome'], job['formato'])
+        previa = arquivo + '.previa.parquet'
+        resultado.head(LINHAS_PREVIA_RESULTADO).to_parquet(previa, index=False)
+    if handler.plano.registrar_envio:
+        with handler.perfil.etapa("registro dos leads enviados", linhas_saida=len(resultado)):
+            registro_leads().registrar_saida(resultado, handler.plano.campanha, handler.plano.equipes)
+    fila.concluir(job['id'], arquivo, previa, len(resultado), segundos_filtro, handler.relatorio)
+
+
+def trabalhar(caminho_fila: str, pid_pai: int = None, intervalo: float = INTERVALO_CONSULTA_FILA_SEGUNDOS):
+    """Laço de um trabalhador: executa os jobs da fila, um de cada vez, enquanto o processo pai existir."""
+    fila = FilaJobs(caminho_fila)
+    bases = {}
+    while pid_pai is None or os.getppid() == pid_pai:
+        job = fila.pegar_proximo()
+        if job is None:
+            time.sleep(intervalo)
+            continue
+        inicio = time.perf_counter()
+        try:
+            _executar_job(fila, job, bases)
+            logger.info("Job %s concluído em %.1fs", job['id'], time.perf_counter() - inicio)
+        except Exception as e:
+            logger.error("Job %s falhou:\n%s", job['id'], traceback.format_exc())
+            fila.falhar(job['id'], f"{type(e).__name__}: {e}")
+
+
+def iniciar_trabalhadores(fila: FilaJobs, num_processos: int = PROCESSOS_FILA_JOBS) -> List[BaseProcess]:
+    """
+    Inicia `num_processos` trabalhadores para a fila, depois de devolver a ela os jobs
+    órfãos. São processos daemon: terminam junto com o processo que os criou.
+
+    Os trabalhadores são criados com 'spawn' (um interpretador novo), e não com o 'fork'
+    padrão: o servidor do Streamlit tem threads vivas (loop do Tornado, conexão do MongoDB
+    em segundo plano...), e um filho criado por fork pode travar num lock que uma delas
+    segurava no momento da cópia.
+    """
+    fila.recolocar_orfaos()
+    contexto = multiprocessing.get_context('spawn')
+    processos = []
+    for i in range(max(1, num_processos)):
+        processo = contexto.Process(target=trabalhar, args=(fila.caminho, os.getpid()),
+                                    name=f"trabalhador-fila-{i}", daemon=True)
+        processo.start()
+        processos.append(processo)
+    return processos
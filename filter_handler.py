@@ -1,23 +1,102 @@
 # filter_handler.py
+import threading
+from collections import OrderedDict
+import numpy as np
 import pandas as pd
-import re 
-from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import List, Sequence
 from config import AppConfig
 from constants import *
-from strategies import FiltroStrategy
+from strategies import FiltroStrategy, para_reais, codigos_matricula, matriculas_marcadas
+from busca_textual import mascara_exclusao
+from juntar_bases import carga_da_base
+from normalizacao import normalizar_nomes, normalizar_cpfs, converter_datas, nascidos_a_partir_de
+from perfil import Perfil
+from plano_campanha import compilar_plano
+from plano_arrow import avaliar_regras, diferente_de, maior_ou_igual, nao_contem, tabela_arrow, valores_excluidos
+from registro_leads import RegistroLeads, cpfs_como_inteiros, registro_leads
 
 class FiltroHandler:
     """
     Orquestra todo o processo de filtragem, aplicando etapas comuns de pré e pós-processamento,
     e utilizando uma estratégia específica para a lógica de negócio da campanha.
+
+    A base recebida não é copiada nem alterada. Os filtros só restringem um vetor booleano
+    de seleção (`selecao`) e as colunas tratadas ou calculadas vão para um DataFrame à parte
+    (`resultado`), posicional e com o mesmo número de linhas da base. As linhas da saída
+    são materializadas uma única vez, no pós-processamento.
+
+    Se a base estiver marcada com um identificador de carga (ver juntar_bases.marcar_carga),
+    os passos 1 e 2 e a saída da estratégia ficam memorizados no cache de etapas do módulo,
+    cada um pela parte da configuração de que depende. Mudar só os bancos reexecuta apenas a
+    estratégia e o pós-processamento; `memorizar=False` desliga o cache.
+
+    Cada etapa (e cada regra dentro dela) é registrada em `perfil`, com tempo, pico de
+    memória e linhas selecionadas antes e depois; `relatorio` devolve esses registros.
+
+    `motor` escolhe como os filtros globais do passo 2 são avaliados: 'pandas' (regra a
+    regra) ou 'arrow' (todas numa varredura multithread, ver plano_arrow). A saída é a mesma.
+
+    Com `dias_sem_reenvio` na configuração, os CPFs enviados nesse período segundo o
+    `registro` (padrão: o arquivo ARQUIVO_REGISTRO_LEADS) ficam fora da saída.
     """
-    def __init__(self, df: pd.DataFrame, config: AppConfig, strategy_class: type[FiltroStrategy]):
-        self.df = df.copy()
-        self.config = config
+    def __init__(self, df: pd.DataFrame, config: AppConfig, strategy_class: type[FiltroStrategy], num_processos: int = 1,
+                 memorizar: bool = True, motor: str = MOTOR_FILTRO_PADRAO, registro: RegistroLeads = None):
+        if motor not in MOTORES_FILTRO:
+            raise ValueError(f"Motor de filtro desconhecido: {motor!r} (opções: {', '.join(MOTORES_FILTRO)})")
+        self.base = df
+        self.motor = motor
+        # A configuração é validada e compilada uma vez; as etapas leem o plano
+        self.plano = compilar_plano(config)
+        self.config = self.plano.config
         self.strategy_class = strategy_class
-        # Atributos para guardar as matrículas que já usaram os produtos no GOVSP
-        self.usou_beneficio_matriculas = set()
-        self.usou_cartao_matriculas = set()
+        self.memorizar = memorizar
+        self.registro = registro
+        # Com mais de um processo (e base grande o bastante), usa a execução particionada
+        self.num_processos = max(1, int(num_processos or 1))
+        # Só as primeiras colunas do arquivo participam do filtro e da saída
+        self.colunas_entrada = list(df.columns[:NUM_COLUNAS_ENTRADA])
+        self.selecao = np.ones(len(df), dtype=bool)
+        self.resultado = pd.DataFrame(index=pd.RangeIndex(len(df)))
+        # Saída final, montada em _post_processamento
+        self.df = None
+        # Marcação, por linha, das matrículas que já usaram os produtos no GOVSP (None fora do GOVSP)
+        self.usou_beneficio = None
+        self.usou_cartao = None
+        # Códigos das matrículas (ver strategies.codigos_matricula), calculados uma vez por base
+        self._codigos_matricula = None
+        # Na execução particionada, a decisão de aplicar o filtro de idade é tomada
+        # sobre a base inteira e repassada às partições (None = decidir localmente)
+        self._filtro_idade_ativo = None
+        self.perfil = Perfil(self.plano.campanha)
+
+    @property
+    def relatorio(self) -> List[dict]:
+        """Registros do perfil, um por etapa executada (ver perfil.Perfil)."""
+        return self.perfil.relatorio()
+
+    def _etapa(self, nome: str, **detalhes):
+        """Etapa do perfil contando as linhas selecionadas."""
+        return self.perfil.etapa(nome, contar=lambda: int(np.count_nonzero(self.selecao)), **detalhes)
+
+    def _codigos(self) -> np.ndarray:
+        """Códigos das matrículas da base, memorizados por base no cache de etapas."""
+        if self._codigos_matricula is None:
+            chave = self._chave_etapa('codigos_matricula')
+            self._codigos_matricula = _cache_etapas.obter(chave) if chave is not None else None
+            if self._codigos_matricula is None:
+                self._codigos_matricula = codigos_matricula(self.base)
+                if chave is not None:
+                    _cache_etapas.guardar(chave, self._codigos_matricula)
+        return self._codigos_matricula
+
+    def _coluna(self, nome: str) -> pd.Series:
+        """Coluna já tratada (em `resultado`) ou, se não houver, a original da base."""
+        if nome in self.resultado.columns:
+            return self.resultado[nome]
+        if nome not in self.colunas_entrada:
+            raise KeyError(nome)
+        return self.base[nome]
 
     def _identificar_uso_previo_govsp(self):
         """
@@ -25,128 +104,522 @@ class FiltroHandler:
         Identifica e memoriza as matrículas de clientes do GOVSP que já utilizaram
         o cartão benefício ou consignado.
         """
-        if self.config.convenio == 'govsp':
+        if not self.plano.govsp:
+            return
+        with self._etapa("uso prévio govsp") as detalhes:
             # Converte as colunas para numérico antes de calcular, para segurança
-            mg_beneficio_total = pd.to_numeric(self.df[COL_MG_BENEFICIO_SAQUE_TOTAL], errors='coerce').fillna(0)
-            mg_beneficio_disp = pd.to_numeric(self.df[COL_MG_BENEFICIO_SAQUE_DISP], errors='coerce').fillna(0)
+            mg_beneficio_total = pd.to_numeric(self.base[COL_MG_BENEFICIO_SAQUE_TOTAL], errors='coerce').fillna(0)
+            mg_beneficio_disp = pd.to_numeric(self.base[COL_MG_BENEFICIO_SAQUE_DISP], errors='coerce').fillna(0)
             margem_beneficio_usada = mg_beneficio_total - mg_beneficio_disp
-            df_usou_beneficio = self.df.loc[margem_beneficio_usada > 0]
-            if not df_usou_beneficio.empty:
-                self.usou_beneficio_matriculas = set(df_usou_beneficio[COL_MATRICULA])
+            self.usou_beneficio = matriculas_marcadas(self._codigos(), (margem_beneficio_usada > 0).to_numpy())
 
-            mg_cartao_total = pd.to_numeric(self.df[COL_MG_CARTAO_TOTAL], errors='coerce').fillna(0)
-            mg_cartao_disp = pd.to_numeric(self.df[COL_MG_CARTAO_DISP], errors='coerce').fillna(0)
+            mg_cartao_total = pd.to_numeric(self.base[COL_MG_CARTAO_TOTAL], errors='coerce').fillna(0)
+            mg_cartao_disp = pd.to_numeric(self.base[COL_MG_CARTAO_DISP], errors='coerce').fillna(0)
             margem_cartao_usada = mg_cartao_total - mg_cartao_disp
-            df_usou_cartao = self.df.loc[margem_cartao_usada > 0]
-            if not df_usou_cartao.empty:
-                self.usou_cartao_matriculas = set(df_usou_cartao[COL_MATRICULA])
+            self.usou_cartao = matriculas_marcadas(self._codigos(), (margem_cartao_usada > 0).to_numpy())
+            detalhes['linhas_usou_beneficio'] = int(np.count_nonzero(self.usou_beneficio))
+            detalhes['linhas_usou_cartao'] = int(np.count_nonzero(self.usou_cartao))
 
     def _pre_processamento(self):
         """
         Passo 2: Aplica todos os filtros globais (lotação, vínculo, idade, etc.)
-        sobre o dataframe.
+        sobre a seleção de linhas.
         """
-        if self.df.empty:
+        if self.base.empty:
             raise ValueError("A base de dados está vazia.")
 
-        self.df = self.df.iloc[:, :26]
-        
-        # Limpezas de dados
-        if COL_NOME_CLIENTE in self.df.columns:
-            self.df[COL_NOME_CLIENTE] = self.df[COL_NOME_CLIENTE].apply(lambda x: x.title() if isinstance(x, str) else x)
-        if COL_CPF in self.df.columns:
-            self.df[COL_CPF] = self.df[COL_CPF].str.replace(r"[.-]", "", regex=True)
-            
+        # Limpezas de dados: nome e CPF só são tratados nas linhas que chegam à saída (ver _post_processamento)
         # <<< CORREÇÃO: Garante que as colunas de margem são numéricas antes de filtrar >>>
-        if COL_MG_EMPRESTIMO_DISP in self.df.columns:
-            self.df[COL_MG_EMPRESTIMO_DISP] = pd.to_numeric(self.df[COL_MG_EMPRESTIMO_DISP], errors='coerce').fillna(0)
-        if COL_MG_COMPULSORIA_DISP in self.df.columns:
-            self.df[COL_MG_COMPULSORIA_DISP] = pd.to_numeric(self.df[COL_MG_COMPULSORIA_DISP], errors='coerce').fillna(0)
+        with self._etapa("conversão das margens"):
+            if COL_MG_EMPRESTIMO_DISP in self.colunas_entrada:
+                self.resultado[COL_MG_EMPRESTIMO_DISP] = para_reais(pd.to_numeric(self.base[COL_MG_EMPRESTIMO_DISP], errors='coerce')).fillna(0).to_numpy()
+            if COL_MG_COMPULSORIA_DISP in self.colunas_entrada:
+                self.resultado[COL_MG_COMPULSORIA_DISP] = para_reais(pd.to_numeric(self.base[COL_MG_COMPULSORIA_DISP], errors='coerce')).fillna(0).to_numpy()
 
+        if self.motor == 'arrow':
+            self._aplicar_filtros_globais_arrow()
+        else:
+            self._aplicar_filtros_globais()
 
-        # Filtros de Exclusão Globais
-        if self.config.selecao_lotacao and COL_LOTACAO in self.df.columns:
-            padrao_lotacao = '|'.join([re.escape(k) for k in self.config.selecao_lotacao if k])
-            if padrao_lotacao: self.df = self.df[~self.df[COL_LOTACAO].str.contains(padrao_lotacao, case=False, na=False)]
+        # A regra das margens negativas do GOVSP vale por matrícula, não por linha
+        if self.plano.govsp:
+            with self._etapa("govsp: matrículas com margem negativa"):
+                negativos = self.selecao & (self._coluna(COL_MG_EMPRESTIMO_DISP).to_numpy() < 0)
+                if negativos.any():
+                    matriculas = self._coluna(COL_MATRICULA)
+                    self.selecao &= ~matriculas.isin(matriculas[negativos]).to_numpy()
 
-        if self.config.selecao_vinculos and COL_VINCULO in self.df.columns:
-            padrao_vinculo = '|'.join([re.escape(k) for k in self.config.selecao_vinculos if k])
-            if padrao_vinculo: self.df = self.df[~self.df[COL_VINCULO].str.contains(padrao_vinculo, case=False, na=False)]
-        
-        if self.config.selecao_secretaria and COL_SECRETARIA in self.df.columns:
-            padrao_secretaria = '|'.join([re.escape(k) for k in self.config.selecao_secretaria if k])
-            if padrao_secretaria: self.df = self.df[~self.df[COL_SECRETARIA].str.contains(padrao_secretaria, case=False, na=False)]
+    def _aplicar_filtros_globais(self):
+        """Filtros globais por linha, aplicados um a um sobre a seleção (motor pandas)."""
+        # Filtros de Exclusão Globais (uma única máscara, avaliada por valor distinto)
+        self._aplicar_exclusoes()
 
         # Filtro de Idade
-        if self.config.data_limite and COL_DATA_NASCIMENTO in self.df.columns and self.df[COL_DATA_NASCIMENTO].notna().any():
-            self.df[COL_DATA_NASCIMENTO] = pd.to_datetime(self.df[COL_DATA_NASCIMENTO], dayfirst=True, errors='coerce')
-            self.df = self.df.dropna(subset=[COL_DATA_NASCIMENTO])
-            self.df = self.df[self.df[COL_DATA_NASCIMENTO].dt.date >= self.config.data_limite]
+        self._aplicar_filtro_idade()
 
         # Filtro por margem mínima (agora sobre uma coluna garantidamente numérica)
-        self.df = self.df.loc[self.df[COL_MG_EMPRESTIMO_DISP] >= self.config.margem_emprestimo_limite]
-        
+        with self._etapa("margem de empréstimo mínima"):
+            mg_emprestimo = self._coluna(COL_MG_EMPRESTIMO_DISP).to_numpy()
+            self.selecao &= mg_emprestimo >= self.plano.margem_emprestimo_limite
+
         # Outros filtros específicos de convênios que se aplicam a todos os produtos
-        if self.config.convenio == 'govsp':
-            self.df = self.df[self.df[COL_LOTACAO] != "ALESP"] # Remove ALESP
-            negativos = self.df.loc[self.df[COL_MG_EMPRESTIMO_DISP] < 0]
-            if not negativos.empty: self.df = self.df.loc[~self.df[COL_MATRICULA].isin(negativos[COL_MATRICULA])]
-        
-        elif self.config.convenio == 'govmt':
-            self.df = self.df.loc[self.df[COL_MG_COMPULSORIA_DISP] >= 0]
-    
+        if self.plano.remover_alesp:
+            with self._etapa("govsp: ALESP"):
+                self.selecao &= (self._coluna(COL_LOTACAO) != "ALESP").to_numpy() # Remove ALESP
+
+        if self.plano.margem_compulsoria_nao_negativa:
+            with self._etapa("govmt: margem compulsória negativa"):
+                self.selecao &= self._coluna(COL_MG_COMPULSORIA_DISP).to_numpy() >= 0
+
+    def _aplicar_filtros_globais_arrow(self):
+        """
+        Os mesmos filtros de _aplicar_filtros_globais, com as regras por linha avaliadas
+        numa única varredura multithread (ver plano_arrow). O filtro de idade fica fora
+        do plano: ele depende das exclusões para decidir se é aplicado e a conversão das
+        datas tem o seu próprio caminho rápido.
+        """
+        regras_exclusao, regras = {}, {}
+        for coluna, palavras in self.plano.exclusoes:
+            if coluna in self.colunas_entrada:
+                regras_exclusao[f"exclusão por {coluna}"] = nao_contem(coluna, valores_excluidos(self.base[coluna], palavras))
+        regras["margem de empréstimo mínima"] = maior_ou_igual(COL_MG_EMPRESTIMO_DISP, self.plano.margem_emprestimo_limite)
+        if self.plano.remover_alesp:
+            regras["govsp: ALESP"] = diferente_de(COL_LOTACAO, "ALESP")
+        if self.plano.margem_compulsoria_nao_negativa:
+            regras["govmt: margem compulsória negativa"] = maior_ou_igual(COL_MG_COMPULSORIA_DISP, 0)
+
+        with self._etapa("filtros globais (arrow)", regras=len(regras_exclusao) + len(regras)):
+            # As margens vêm já convertidas de `resultado`; as demais colunas, da base
+            extras = {col: self.resultado[col].to_numpy() for col in self.resultado.columns}
+            colunas = [col for col in (COL_LOTACAO, COL_VINCULO, COL_SECRETARIA)
+                       if col in self.colunas_entrada and col not in extras]
+            mascaras = avaliar_regras(tabela_arrow(self.base[colunas], extras), {**regras_exclusao, **regras})
+            for nome in regras_exclusao:
+                self.selecao &= mascaras[nome]
+
+        self._aplicar_filtro_idade()
+        for nome in regras:
+            self.selecao &= mascaras[nome]
+
+    def _aplicar_filtro_idade(self):
+        filtro_idade_ativo = self._filtro_idade_ativo
+        if filtro_idade_ativo is None:
+            filtro_idade_ativo = self._filtro_idade_se_aplica()
+        if filtro_idade_ativo:
+            with self._etapa("idade máxima"):
+                datas = self._datas_nascimento()
+                self.resultado[COL_DATA_NASCIMENTO] = datas
+                self.selecao &= nascidos_a_partir_de(datas, self.plano.data_limite)
+
+    def _aplicar_exclusoes(self):
+        """
+        Remove da seleção as linhas cuja lotação, vínculo ou secretaria contém alguma
+        palavra-chave excluída. Cada coluna é uma etapa do perfil.
+        """
+        for coluna, palavras in self.plano.exclusoes:
+            if coluna in self.colunas_entrada:
+                with self._etapa(f"exclusão por {coluna}", palavras_chave=len(palavras)):
+                    self.selecao &= ~mascara_exclusao(self.base, {coluna: palavras})
+
+    def _filtro_idade_se_aplica(self) -> bool:
+        """O filtro de idade só é aplicado se houver alguma data de nascimento preenchida nas linhas selecionadas."""
+        return bool(
+            self.plano.data_limite and COL_DATA_NASCIMENTO in self.colunas_entrada
+            and self.base[COL_DATA_NASCIMENTO][self.selecao].notna().any()
+        )
+
+    def _datas_nascimento(self) -> np.ndarray:
+        """
+        Datas de nascimento convertidas, com o mesmo tamanho da base. Só as linhas
+        selecionadas são convertidas; as demais ficam NaT.
+        """
+        posicoes = np.flatnonzero(self.selecao)
+        datas = np.full(len(self.base), np.datetime64('NaT'), dtype='datetime64[ns]')
+        datas[posicoes] = converter_datas(self.base[COL_DATA_NASCIMENTO].take(posicoes))
+        return datas
+
     def _post_processamento(self):
         """
-        Passo 4: Aplica formatação final, remove duplicados e faz a verificação final
-        contra as matrículas memorizadas.
+        Passo 4: Ordena, faz a verificação final contra as matrículas memorizadas, remove
+        duplicados e só então materializa as linhas e colunas da saída, uma única vez.
         """
+        posicoes = np.flatnonzero(self.selecao)
+        # No pós-processamento o perfil conta as posições que ainda vão para a saída
+        contar = lambda: len(posicoes)
+
+        # Os CPFs enviados recentemente saem antes do limite, que fica com os maiores dos que sobraram
+        if self.plano.dias_sem_reenvio and COL_CPF in self.colunas_entrada:
+            with self.perfil.etapa("CPFs enviados recentemente", contar, dias=self.plano.dias_sem_reenvio):
+                posicoes = self._sem_enviados_recentes(posicoes)
+
+        colunas = {}
+        limite = self.plano.limite_campanha
+        if limite and limite < len(posicoes):
+            # Só as maiores linhas são ordenadas; os CPFs duplicados já saem nessa etapa
+            with self.perfil.etapa("maiores da campanha", contar, limite=limite):
+                posicoes, cpfs = self._selecionar_maiores(posicoes, limite)
+                if cpfs is not None:
+                    colunas[COL_CPF] = cpfs
+        else:
+            with self.perfil.etapa("ordenação", contar):
+                posicoes = self._ordenar(posicoes)
+
         # Verificação final contra a lista de uso prévio do GOVSP
-        if self.config.convenio == 'govsp':
-            if 'valor_liberado_beneficio' in self.df.columns and self.usou_beneficio_matriculas:
-                self.df.loc[self.df[COL_MATRICULA].isin(self.usou_beneficio_matriculas), 'valor_liberado_beneficio'] = 0
-            if 'valor_liberado_cartao' in self.df.columns and self.usou_cartao_matriculas:
-                self.df.loc[self.df[COL_MATRICULA].isin(self.usou_cartao_matriculas), 'valor_liberado_cartao'] = 0
-        
+        if self.plano.govsp:
+            with self.perfil.etapa("govsp: zerar valores de uso prévio", contar):
+                self._zerar_uso_previo(posicoes)
+
         # O resto do pós-processamento
-        if COL_CPF in self.df.columns:
-            self.df = self.df.drop_duplicates(subset=[COL_CPF])
+        if COL_CPF in self.colunas_entrada and COL_CPF not in colunas:
+            with self.perfil.etapa("CPFs duplicados", contar):
+                posicoes, colunas[COL_CPF] = self._sem_cpfs_duplicados(posicoes)
+        if COL_NOME_CLIENTE in self.colunas_entrada:
+            with self.perfil.etapa("nomes", contar):
+                nomes = self.base[COL_NOME_CLIENTE].take(posicoes)
+                colunas[COL_NOME_CLIENTE] = normalizar_nomes(nomes).array
+
+        with self.perfil.etapa("montagem da saída", contar):
+            self.df = self._montar_saida(posicoes, colunas)
+
+        with self.perfil.etapa("nome da campanha e convai", contar) as detalhes:
+            detalhes['linhas_convai'] = self._gerar_nome_campanha()
+
+    def _ordenar(self, posicoes: np.ndarray) -> np.ndarray:
+        """Posições em ordem decrescente da coluna da estratégia (mesmo algoritmo de sort_values)."""
+        chaves = pd.Series(self.resultado[self.strategy_class.coluna_ordenacao].to_numpy()[posicoes])
+        return posicoes[chaves.sort_values(ascending=False).index.to_numpy()]
+
+    def _sem_enviados_recentes(self, posicoes: np.ndarray) -> np.ndarray:
+        """Tira as posições cujo CPF foi enviado nos últimos `dias_sem_reenvio` dias (ver registro_leads)."""
+        registro = self.registro or registro_leads()
+        cpfs = cpfs_como_inteiros(self.base[COL_CPF].take(posicoes))
+        return posicoes[~registro.mascara_enviados(cpfs, self.plano.dias_sem_reenvio)]
+
+    def _sem_cpfs_duplicados(self, posicoes: np.ndarray):
+        """Mantém a primeira linha de cada CPF normalizado. Devolve as posições e os CPFs delas."""
+        cpfs = normalizar_cpfs(self.base[COL_CPF].take(posicoes))
+        unicos = ~cpfs.duplicated().to_numpy()
+        return posicoes[unicos], cpfs.array[unicos]
 
+    def _selecionar_maiores(self, posicoes: np.ndarray, limite: int):
+        """
+        As `limite` primeiras linhas da saída (ordenada e sem CPFs duplicados) sem ordenar
+        a seleção inteira: `np.partition` acha o corte das `n` maiores chaves em O(n), e só
+        as linhas a partir do corte são ordenadas e deduplicadas. Se os CPFs repetidos
+        deixarem menos de `limite` linhas, o corte desce na proporção que faltou (ao
+        menos dobrando `n`). Devolve as posições e os CPFs normalizados delas (None se
+        a base não tiver CPF).
+        """
+        chaves = np.asarray(self.resultado[self.strategy_class.coluna_ordenacao].to_numpy()[posicoes], dtype=np.float64)
+        # Chaves nulas vão para o fim da ordenação, então só entram quando faltam linhas
+        valores = np.where(np.isnan(chaves), -np.inf, chaves)
+        n = limite
+        while True:
+            if n < len(valores):
+                corte = np.partition(valores, len(valores) - n)[len(valores) - n]
+                # Os empates com o corte entram todos, para não depender de qual deles o partition escolheu
+                candidatas = np.flatnonzero(valores >= corte)
+            else:
+                candidatas = np.arange(len(valores))
+            ordenadas = self._ordenar(posicoes[candidatas])
+            if COL_CPF not in self.colunas_entrada:
+                return ordenadas[:limite], None
+            ordenadas, cpfs = self._sem_cpfs_duplicados(ordenadas)
+            if len(ordenadas) >= limite or len(candidatas) == len(valores):
+                return ordenadas[:limite], cpfs[:limite]
+            n = max(2 * n, int(len(candidatas) * limite / max(len(ordenadas), 1) * 1.1))
+
+    def _montar_saida(self, posicoes: np.ndarray, colunas: dict) -> pd.DataFrame:
+        """
+        DataFrame de saída com as linhas `posicoes`, nas colunas de COLUNAS_FINAIS já
+        renomeadas. `colunas` traz as colunas já tratadas (ex: CPF e nome) e é completado.
+        """
         for col in COLUNAS_FINAIS:
-            if col not in self.df.columns: self.df[col] = ''
-        
-        colunas_presentes = [col for col in COLUNAS_FINAIS if col in self.df.columns]
-        self.df = self.df[colunas_presentes]
-        self.df.rename(columns=COLUNAS_MAPEAMENTO_SAIDA, inplace=True)
-        self.df = self.df.drop(columns=['tratado', 'tratado_beneficio', 'tratado_cartao', 'comissao_total'], errors='ignore')
-
-        self._gerar_nome_campanha()
-
-    def _gerar_nome_campanha(self):
-        """Gera o nome da campanha para a coluna final."""
-        data_hoje = datetime.today().strftime('%d%m%Y')
-        nome_campanha_slug = self.config.campanha.lower().replace(' & ', '&')
-        nome_campanha_base = f"{self.config.convenio}_{data_hoje}_{nome_campanha_slug}"
-        self.df['Campanha'] = f"{nome_campanha_base}_{self.config.equipes}"
-
-        if self.config.convai > 0:
-            n_convai = int((self.config.convai / 100) * len(self.df))
+            if col in colunas:
+                continue
+            if col in self.resultado.columns:
+                colunas[col] = self.resultado[col].array.take(posicoes)
+            elif col in self.colunas_entrada:
+                colunas[col] = self.base[col].array.take(posicoes)
+            else:
+                colunas[col] = np.full(len(posicoes), '', dtype=object)
+
+        # copy=False evita a consolidação dos blocos, que duplicaria a memória da saída
+        df = pd.DataFrame({col: colunas[col] for col in COLUNAS_FINAIS}, index=self.base.index[posicoes], copy=False)
+        df.rename(columns=COLUNAS_MAPEAMENTO_SAIDA, inplace=True)
+        return df
+
+    def _zerar_uso_previo(self, posicoes: np.ndarray):
+        """Zera o valor liberado das matrículas do GOVSP que já usaram o benefício ou o cartão."""
+        for coluna, usou in (('valor_liberado_beneficio', self.usou_beneficio),
+                             ('valor_liberado_cartao', self.usou_cartao)):
+            if coluna in self.resultado.columns and usou is not None:
+                # Substitui a coluna em vez de alterá-la, pois ela pode estar no cache de etapas
+                valores = self.resultado[coluna].to_numpy().copy()
+                valores[posicoes[usou[posicoes]]] = 0
+                self.resultado[coluna] = valores
+
+    def _gerar_nome_campanha(self) -> int:
+        """Gera o nome da campanha para a coluna final. Devolve quantas linhas foram sorteadas para o convai."""
+        nome_campanha_base = self.plano.nome_base()
+        self.df['Campanha'] = f"{nome_campanha_base}_{self.plano.equipes}"
+
+        if self.plano.convai > 0:
+            n_convai = int((self.plano.convai / 100) * len(self.df))
             if n_convai > 0 and not self.df.empty:
                 indices_convai = self.df.sample(n=n_convai, random_state=42).index
                 self.df.loc[indices_convai, 'Campanha'] = f"{nome_campanha_base}_convai"
+                return n_convai
+        return 0
+
+    def _aplicar_estrategia(self):
+        """Passo 3: Deixa a estratégia fazer os cálculos sobre a seleção atual."""
+        with self._etapa(f"estratégia {self.plano.campanha}"):
+            codigos = self._codigos() if self.plano.govsp else None
+            estrategia = self.strategy_class(self.base, self.plano, self.selecao, self.resultado, self.perfil, codigos)
+            self.selecao = estrategia.aplicar_regras_especificas()
 
     def processar(self) -> pd.DataFrame:
         """Executa o pipeline completo de filtragem na ordem correta."""
-        # Passo 1: Identificar uso prévio na base completa
-        self._identificar_uso_previo_govsp()
-        
-        # Passo 2: Aplicar filtros gerais
-        self._pre_processamento()
+        if self.num_processos > 1 and len(self.base) >= LINHAS_MINIMAS_PARALELISMO:
+            return self._processar_em_paralelo()
+
+        # Passos 1 e 2: Identificar uso prévio na base completa e aplicar filtros gerais
+        self._preparar()
 
         # Passo 3: Deixar a estratégia fazer os cálculos
-        strategy_instance = self.strategy_class(self.df, self.config)
-        self.df = strategy_instance.aplicar_regras_especificas()
+        chave_estrategia = self._chave_etapa('estrategia', self.strategy_class.__name__, self.plano)
+        if not self._restaurar_etapa(chave_estrategia):
+            inicio_perfil = len(self.perfil.etapas)
+            self._aplicar_estrategia()
+            self._memorizar_etapa(chave_estrategia, inicio_perfil)
 
         # Passo 4: Aplicar formatação e validações finais
         self._post_processamento()
 
         return self.df
+
+    def _preparar(self):
+        """Passos 1 e 2, ou o seu resultado memorizado para a mesma base e `chave_pre_processamento`."""
+        chave = self._chave_etapa('pre', self.motor, self.plano.chave_pre_processamento)
+        if not self._restaurar_etapa(chave):
+            inicio_perfil = len(self.perfil.etapas)
+            self._identificar_uso_previo_govsp()
+            self._pre_processamento()
+            self._memorizar_etapa(chave, inicio_perfil)
+
+    def _chave_etapa(self, *partes):
+        """Chave da etapa no cache, ou None se a base não estiver marcada (ver juntar_bases.marcar_carga)."""
+        carga = carga_da_base(self.base)
+        if not self.memorizar or carga is None:
+            return None
+        return (carga,) + partes
+
+    def _memorizar_etapa(self, chave, inicio_perfil: int):
+        if chave is not None:
+            _cache_etapas.guardar(chave, (
+                self.selecao.copy(), self.resultado.copy(deep=False),
+                self.usou_beneficio, self.usou_cartao,
+                self.perfil.relatorio()[inicio_perfil:],
+            ))
+
+    def _restaurar_etapa(self, chave) -> bool:
+        memorizado = _cache_etapas.obter(chave) if chave is not None else None
+        if memorizado is None:
+            return False
+        selecao, resultado, self.usou_beneficio, self.usou_cartao, etapas = memorizado
+        # As colunas novas vão só para a cópia rasa, e a seleção é copiada: o cache não muda
+        self.selecao = selecao.copy()
+        self.resultado = resultado.copy(deep=False)
+        # O perfil mostra as etapas da execução original, marcadas como vindas do cache
+        self.perfil.incorporar(etapas, cache=True)
+        return True
+
+    def derivar(self, config: AppConfig, strategy_class: type[FiltroStrategy]) -> 'FiltroHandler':
+        """
+        Cria um handler para outra campanha que reaproveita os passos 1 e 2 já executados
+        neste (uso prévio do GOVSP, limpezas e filtros globais). Só vale para configurações
+        com a mesma `chave_pre_processamento`. A seleção é copiada e o `resultado` é uma
+        cópia rasa: as colunas calculadas pela nova estratégia não aparecem aqui.
+        """
+        derivado = FiltroHandler(self.base, config, strategy_class, memorizar=self.memorizar, motor=self.motor,
+                                 registro=self.registro)
+        derivado.selecao = self.selecao.copy()
+        derivado.resultado = self.resultado.copy(deep=False)
+        derivado.usou_beneficio = self.usou_beneficio
+        derivado.usou_cartao = self.usou_cartao
+        derivado._codigos_matricula = self._codigos_matricula
+        derivado.perfil.incorporar(self.perfil.etapas)
+        return derivado
+
+    def _processar_em_paralelo(self) -> pd.DataFrame:
+        """
+        Executa os passos 1 a 3 em partições da base, num pool de processos, e junta as
+        seleções e colunas calculadas antes do passo 4. As partições são feitas por hash
+        da matrícula, então tudo o que é decidido por matrícula (uso prévio e negativos do
+        GOVSP) fica dentro de uma só partição. O que depende da base inteira (filtro de
+        idade, ordenação, CPFs duplicados e sorteio do convai) é feito aqui, de modo que a
+        saída é idêntica à da execução serial.
+        """
+        if self.base.empty:
+            raise ValueError("A base de dados está vazia.")
+
+        # Decisão global do filtro de idade, sobre as linhas que sobram das exclusões
+        self._aplicar_exclusoes()
+        filtro_idade_ativo = self._filtro_idade_se_aplica()
+
+        # Cada partição leva as posições das suas linhas na base como índice
+        particao = pd.util.hash_pandas_object(self.base[COL_MATRICULA], index=False).to_numpy() % self.num_processos
+        particoes = []
+        for i in range(self.num_processos):
+            posicoes = np.flatnonzero(particao == i)
+            if len(posicoes):
+                df = self.base.iloc[posicoes, :NUM_COLUNAS_ENTRADA]
+                df.index = posicoes
+                particoes.append(df)
+
+        # As regras dentro das partições não aparecem uma a uma no perfil, só o conjunto
+        with self._etapa("passos 1 a 3 em partições", processos=len(particoes)):
+            with ProcessPoolExecutor(max_workers=len(particoes)) as executor:
+                resultados = list(executor.map(
+                    _processar_particao, particoes,
+                    [self.plano] * len(particoes), [self.strategy_class] * len(particoes),
+                    [filtro_idade_ativo] * len(particoes), [self.motor] * len(particoes),
+                ))
+
+            # Cada partição devolve só as linhas selecionadas, indexadas pela posição na base
+            self.selecao = np.zeros(len(self.base), dtype=bool)
+            for resultado, _, _ in resultados:
+                self.selecao[resultado.index.to_numpy()] = True
+            self.resultado = pd.concat([resultado for resultado, _, _ in resultados]).reindex(pd.RangeIndex(len(self.base)))
+            # As marcações de uso prévio voltam como posições; a matrícula fica numa só partição
+            if self.plano.govsp:
+                self.usou_beneficio = np.zeros(len(self.base), dtype=bool)
+                self.usou_cartao = np.zeros(len(self.base), dtype=bool)
+                for _, usou_beneficio, usou_cartao in resultados:
+                    self.usou_beneficio[usou_beneficio] = True
+                    self.usou_cartao[usou_cartao] = True
+
+        # Passo 4: Aplicar formatação e validações finais, sobre o resultado completo
+        self._post_processamento()
+
+        return self.df
+
+
+class _CacheEtapas:
+    """Cache LRU, compartilhado entre threads, das etapas já executadas pelo FiltroHandler."""
+    def __init__(self, tamanho: int):
+        self.tamanho = tamanho
+        self._itens = OrderedDict()
+        self._lock = threading.Lock()
+
+    def obter(self, chave):
+        with self._lock:
+            valor = self._itens.get(chave)
+            if valor is not None:
+                self._itens.move_to_end(chave)
+            return valor
+
+    def guardar(self, chave, valor):
+        with self._lock:
+            self._itens[chave] = valor
+            self._itens.move_to_end(chave)
+            while len(self._itens) > self.tamanho:
+                self._itens.popitem(last=False)
+
+    def limpar(self):
+        with self._lock:
+            self._itens.clear()
+
+
+_cache_etapas = _CacheEtapas(TAMANHO_CACHE_ETAPAS)
+
+
+def limpar_cache_etapas():
+    """Descarta todas as etapas memorizadas (libera a memória das seleções e colunas guardadas)."""
+    _cache_etapas.limpar()
+
+
+def processar_campanhas(df: pd.DataFrame, configs: Sequence[AppConfig], strategy_classes: Sequence[type[FiltroStrategy]],
+                        max_threads: int = None, motor: str = MOTOR_FILTRO_PADRAO,
+                        registro: RegistroLeads = None) -> List[pd.DataFrame]:
+    """
+    Executa várias campanhas sobre a mesma base, devolvendo uma saída por campanha (na
+    ordem de `configs`). Os passos 1 e 2 rodam uma única vez por grupo de campanhas com a
+    mesma `chave_pre_processamento`; a estratégia e o pós-processamento de cada campanha
+    rodam em paralelo, em threads que compartilham a base sem copiá-la.
+    """
+    if len(configs) != len(strategy_classes):
+        raise ValueError("Informe uma estratégia para cada configuração.")
+    if df.empty:
+        raise ValueError("A base de dados está vazia.")
+
+    pre_processados = {}
+    handlers = []
+    for config, strategy_class in zip(configs, strategy_classes):
+        plano = compilar_plano(config)
+        chave = plano.chave_pre_processamento
+        if chave not in pre_processados:
+            handler = FiltroHandler(df, plano, strategy_class, motor=motor, registro=registro)
+            handler._preparar()
+            pre_processados[chave] = handler
+        handlers.append(pre_processados[chave].derivar(plano, strategy_class))
+
+    def finalizar(handler: FiltroHandler) -> pd.DataFrame:
+        handler._aplicar_estrategia()
+        handler._post_processamento()
+        return handler.df
+
+    with ThreadPoolExecutor(max_workers=max_threads or len(handlers)) as executor:
+        return list(executor.map(finalizar, handlers))
+
+
+def _processar_particao(df: pd.DataFrame, config: AppConfig, strategy_class: type[FiltroStrategy], filtro_idade_ativo: bool,
+                        motor: str = MOTOR_FILTRO_PADRAO):
+    """
+    Passos 1 a 3 do FiltroHandler sobre uma partição (executado num processo do pool).
+    Devolve as colunas calculadas só das linhas selecionadas, indexadas como em `df`, e
+    as posições (os índices de `df`) das linhas marcadas com uso prévio do GOVSP.
+    """
+    # A partição herda o attrs da base, mas não pode usar as etapas memorizadas dela
+    handler = FiltroHandler(df, config, strategy_class, memorizar=False, motor=motor)
+    handler._filtro_idade_ativo = filtro_idade_ativo
+    handler._identificar_uso_previo_govsp()
+    handler._pre_processamento()
+    handler._aplicar_estrategia()
+    resultado = handler.resultado[handler.selecao]
+    resultado.index = df.index[handler.selecao]
+    posicoes_usou = [df.index.to_numpy()[usou] if usou is not None else np.empty(0, dtype=np.int64)
+                     for usou in (handler.usou_beneficio, handler.usou_cartao)]
+    return resultado, *posicoes_usou
+
+
+def _candidatos_da_particao(df: pd.DataFrame, config: AppConfig, strategy_class: type[FiltroStrategy],
+                            filtro_idade_ativo: bool, motor: str = MOTOR_FILTRO_PADRAO, registro: RegistroLeads = None):
+    """
+    Passos 1 a 3 e a parte do passo 4 que não depende das outras partições (uso prévio
+    zerado, CPFs enviados recentemente, CPF e nome normalizados) sobre uma partição da base. Devolve as linhas
+    selecionadas já no formato da saída, indexadas como em `df`, a chave de ordenação
+    da estratégia de cada uma e o perfil das etapas. A ordenação, os CPFs duplicados e o convai ficam para
+    quem junta as partições (ver processamento_em_disco).
+    """
+    handler = FiltroHandler(df, config, strategy_class, memorizar=False, motor=motor, registro=registro)
+    handler._filtro_idade_ativo = filtro_idade_ativo
+    handler._identificar_uso_previo_govsp()
+    handler._pre_processamento()
+    handler._aplicar_estrategia()
+
+    posicoes = np.flatnonzero(handler.selecao)
+    if handler.plano.dias_sem_reenvio and COL_CPF in handler.colunas_entrada:
+        posicoes = handler._sem_enviados_recentes(posicoes)
+    # A chave é lida antes de zerar o uso prévio, como na ordenação de _post_processamento
+    chaves = handler.resultado[strategy_class.coluna_ordenacao].to_numpy()[posicoes]
+    if handler.plano.govsp:
+        handler._zerar_uso_previo(posicoes)
+    colunas = {}
+    if COL_CPF in handler.colunas_entrada:
+        colunas[COL_CPF] = normalizar_cpfs(df[COL_CPF].take(posicoes)).array
+    if COL_NOME_CLIENTE in handler.colunas_entrada:
+        colunas[COL_NOME_CLIENTE] = normalizar_nomes(df[COL_NOME_CLIENTE].take(posicoes)).array
+    saida = handler._montar_saida(posicoes, colunas)
+    return saida, chaves, handler.perfil
@@ -1,30 +1,260 @@
 # juntar_bases.py
 
-import streamlit as st
+import hashlib
+import logging
+import uuid
+import weakref
+from typing import Callable, Optional
+
+import numpy as np
 import pandas as pd
+from pandas.api.types import union_categoricals
+
+from constants import (
+    COL_CONVENIO, NUM_COLUNAS_ENTRADA, PREFIXO_COLUNAS_MARGEM,
+    ESQUEMA_ENTRADA, TIPO_MARGEM, TIPO_TEXTO, ATTR_CHAVE_BASE, ATTR_CHAVES_ARQUIVOS, ATTR_CARGA_BASE,
+)
+from cache_bases import chave_arquivo, ler_do_cache, gravar_no_cache
+
+logger = logging.getLogger(__name__)
+
+# Bases marcadas por marcar_carga, pelo identificador da carga (a entrada some com a base)
+_cargas = weakref.WeakValueDictionary()
+
+
+def _notificar_no_log(nivel: str, mensagem: str):
+    logger.log(logging.ERROR if nivel == 'error' else logging.WARNING, mensagem)
+
+
+def tipos_de_leitura(colunas) -> dict:
+    """
+    Monta o dicionário de `dtype` do read_csv a partir de ESQUEMA_ENTRADA.
+    As margens ficam de fora: são convertidas depois por `converter_margens`,
+    para que valores inválidos virem nulos em vez de interromper a leitura.
+    """
+    return {
+        col: ESQUEMA_ENTRADA.get(col, TIPO_TEXTO)
+        for col in colunas if not str(col).startswith(PREFIXO_COLUNAS_MARGEM)
+    }
+
+
+def converter_margens(df: pd.DataFrame) -> pd.DataFrame:
+    """Converte as colunas de margem (MG_*) para TIPO_MARGEM."""
+    for col in df.columns:
+        if str(col).startswith(PREFIXO_COLUNAS_MARGEM):
+            df[col] = pd.to_numeric(df[col], errors='coerce').astype(TIPO_MARGEM)
+    return df
+
+
+class _ArmazemColunar:
+    """
+    Acumula os blocos lidos coluna a coluna e monta o DataFrame final uma única vez.
+    Cada coluna é concatenada e tem seus blocos liberados antes da próxima, de modo que
+    o pico de memória fica próximo do tamanho do DataFrame final.
+    """
+    def __init__(self):
+        self._partes = {}
+        self._linhas = 0
+
+    def adicionar(self, bloco: pd.DataFrame, copiar: bool = True):
+        n = len(bloco)
+        for col in bloco.columns:
+            if col not in self._partes:
+                # Coluna nova: as linhas dos blocos anteriores ficam como lacuna (nulos)
+                self._partes[col] = [self._linhas] if self._linhas else []
+            serie = bloco[col]
+            if copiar and isinstance(serie.dtype, np.dtype):
+                # Copia a coluna para que o bloco inteiro possa ser liberado em seguida
+                serie = pd.Series(serie.to_numpy(copy=True))
+            self._partes[col].append(serie.reset_index(drop=True))
+        for col, partes in self._partes.items():
+            if col not in bloco.columns:
+                partes.append(n)
+        self._linhas += n
+
+    @staticmethod
+    def _concatenar(partes) -> pd.Series:
+        referencia = next(p for p in partes if not isinstance(p, int))
+        if isinstance(referencia.dtype, pd.CategoricalDtype):
+            # Cada bloco tem suas próprias categorias: une todas sem passar por objeto
+            categoricos = [
+                pd.Categorical.from_codes(np.full(p, -1), categories=referencia.cat.categories)
+                if isinstance(p, int) else p.array
+                for p in partes
+            ]
+            return pd.Series(union_categoricals(categoricos))
+        series = [
+            pd.Series(None, index=pd.RangeIndex(p), dtype=referencia.dtype) if isinstance(p, int) else p
+            for p in partes
+        ]
+        return series[0] if len(series) == 1 else pd.concat(series, ignore_index=True)
+
+    def materializar(self) -> pd.DataFrame:
+        dados = {}
+        for col in list(self._partes):
+            partes = self._partes.pop(col)
+            dados[col] = self._concatenar(partes)
+            del partes
+        # copy=False evita a consolidação dos blocos, que duplicaria a memória
+        return pd.DataFrame(dados, copy=False)
+
+    @property
+    def linhas(self) -> int:
+        return self._linhas
+
 
-# A anotação @st.cache_data foi removida daqui, pois a moveremos para o app.py
-def juntar_bases(files):
+def _nome_arquivo(arquivo) -> str:
+    return getattr(arquivo, 'name', str(arquivo))
+
+
+def _ler_cabecalho(arquivo) -> list:
+    cabecalho = pd.read_csv(arquivo, nrows=0)
+    if hasattr(arquivo, 'seek'):
+        arquivo.seek(0)
+    return list(cabecalho.columns)
+
+
+def _ler_inteiro(arquivo):
+    """Lê o arquivo CSV inteiro de uma vez, já com os tipos de ESQUEMA_ENTRADA."""
+    colunas = _ler_cabecalho(arquivo)
+    df = pd.read_csv(arquivo, dtype=tipos_de_leitura(colunas), low_memory=False)
+    yield converter_margens(df)
+
+
+def _ler_em_blocos(arquivo, tamanho_bloco: int):
     """
-    Recebe uma lista de objetos de arquivo do Streamlit e os concatena.
+    Lê um arquivo CSV em blocos de até `tamanho_bloco` linhas, mantendo apenas as
+    primeiras NUM_COLUNAS_ENTRADA colunas. Os tipos de ESQUEMA_ENTRADA são fixados
+    já na leitura, para que todos os blocos tenham o mesmo tipo por coluna.
     """
-    dataframes = []
+    colunas = _ler_cabecalho(arquivo)[:NUM_COLUNAS_ENTRADA]
+    leitor = pd.read_csv(arquivo, usecols=range(len(colunas)), dtype=tipos_de_leitura(colunas), chunksize=tamanho_bloco)
+    with leitor:
+        for bloco in leitor:
+            yield converter_margens(bloco)
+
+
+def _ler_arquivo(arquivo, tamanho_bloco: int = None):
+    if tamanho_bloco:
+        return _ler_em_blocos(arquivo, tamanho_bloco)
+    return _ler_inteiro(arquivo)
+
+
+def _ler_com_cache(arquivo, tamanho_bloco: int = None):
+    """
+    Lê um arquivo passando pelo cache em disco: se o conteúdo já foi lido antes,
+    a base vem direto do Feather; senão é lida do CSV e gravada no cache.
+    Devolve a chave do conteúdo e a base (None se o arquivo estiver vazio).
+    """
+    chave = chave_arquivo(arquivo, em_blocos=bool(tamanho_bloco))
+    df = ler_do_cache(chave)
+    if df is None:
+        armazem = _ArmazemColunar()
+        for bloco in _ler_arquivo(arquivo, tamanho_bloco):
+            armazem.adicionar(bloco)
+            del bloco
+        if not armazem.linhas:
+            return chave, None
+        df = armazem.materializar()
+        gravar_no_cache(chave, df)
+    return chave, df
+
+
+def juntar_bases(files, tamanho_bloco: int = None, usar_cache: bool = False,
+                 notificar: Optional[Callable[[str, str], None]] = None):
+    """
+    Recebe uma lista de arquivos (objetos de arquivo do Streamlit ou caminhos) e os concatena.
+
+    Os tipos das colunas seguem ESQUEMA_ENTRADA (categorias, float64 nas margens e strings Arrow).
+    Se `tamanho_bloco` for informado, usa a leitura em blocos: cada arquivo é lido
+    em pedaços de até `tamanho_bloco` linhas, só com as colunas usadas pelo
+    FiltroHandler, e os blocos vão direto para um armazenamento colunar. Assim o
+    pico de memória fica perto do tamanho da base final, em vez de ~2x a entrada.
+
+    Com `usar_cache`, cada arquivo passa pelo cache em disco (ver cache_bases): a chave
+    de conteúdo da base final fica em `df.attrs[ATTR_CHAVE_BASE]` e as chaves no cache
+    dos arquivos com linhas, em `df.attrs[ATTR_CHAVES_ARQUIVOS]` (ver juntar_do_cache), e a
+    base é marcada com um identificador de carga (ver marcar_carga).
+
+    Erros e avisos de leitura vão para `notificar(nivel, mensagem)`, com nivel 'error'
+    ou 'warning' (o app mostra na tela); sem ele, vão para o log.
+    """
+    notificar = notificar or _notificar_no_log
+    armazem = _ArmazemColunar()
+    chaves, chaves_com_linhas = [], []
     # 'files' aqui é a lista de objetos UploadedFile
     for arquivo in files:
+        linhas_antes = armazem.linhas
         try:
-            # Lê o objeto de arquivo diretamente
-            df = pd.read_csv(arquivo, low_memory=False)
-            if df.empty:
-                st.warning(f"O arquivo {arquivo.name} está vazio.")
+            if usar_cache:
+                chave, df = _ler_com_cache(arquivo, tamanho_bloco)
+                chaves.append(chave)
+                if df is not None:
+                    chaves_com_linhas.append(chave)
+                    armazem.adicionar(df, copiar=False)
+                    del df
             else:
-                dataframes.append(df)
+                for bloco in _ler_arquivo(arquivo, tamanho_bloco):
+                    armazem.adicionar(bloco)
+                    del bloco
         except Exception as e:
-            # Como 'arquivo' é um objeto, arquivo.name funciona corretamente
-            st.error(f"Erro ao carregar {arquivo.name}: {e}")
+            notificar('error', f"Erro ao carregar {_nome_arquivo(arquivo)}: {e}")
             continue
-            
-    if dataframes:
-        return pd.concat(dataframes, ignore_index=True)
+        if armazem.linhas == linhas_antes:
+            notificar('warning', f"O arquivo {_nome_arquivo(arquivo)} está vazio.")
+
+    if armazem.linhas:
+        base = armazem.materializar()
+        if usar_cache:
+            base.attrs[ATTR_CHAVE_BASE] = hashlib.sha256('|'.join(chaves).encode()).hexdigest()
+            base.attrs[ATTR_CHAVES_ARQUIVOS] = chaves_com_linhas
+            marcar_carga(base)
+        return base
     else:
-        st.error("Nenhum arquivo válido foi carregado.")
-        return pd.DataFrame()
\ No newline at end of file
+        notificar('error', "Nenhum arquivo válido foi carregado.")
+        return pd.DataFrame()
+
+
+def juntar_do_cache(chaves) -> Optional[pd.DataFrame]:
+    """
+    Remonta a base que `juntar_bases` leu com `usar_cache` a partir das chaves dos seus
+    arquivos (`df.attrs[ATTR_CHAVES_ARQUIVOS]`), sem reler os CSVs. None se algum
+    arquivo não estiver mais no cache.
+    """
+    armazem = _ArmazemColunar()
+    for chave in chaves:
+        df = ler_do_cache(chave)
+        if df is None:
+            return None
+        armazem.adicionar(df, copiar=False)
+        del df
+    return armazem.materializar() if armazem.linhas else None
+
+
+def marcar_carga(base: pd.DataFrame) -> pd.DataFrame:
+    """
+    Grava em `base.attrs[ATTR_CARGA_BASE]` um identificador novo (uuid4) desta carga da
+    base, que liga a ela o cache de etapas do FiltroHandler (ver carga_da_base).
+    """
+    carga = uuid.uuid4().hex
+    base.attrs[ATTR_CARGA_BASE] = carga
+    _cargas[carga] = base
+    return base
+
+
+def carga_da_base(base: pd.DataFrame) -> Optional[str]:
+    """
+    Identificador da carga da base (ver marcar_carga), ou None se ela não foi marcada. O
+    attrs passa para os DataFrames derivados (cópias, fatias, reordenações), que não são
+    a base marcada: neles o identificador herdado é descartado e o resultado é None.
+    """
+    carga = base.attrs.get(ATTR_CARGA_BASE)
+    if carga is not None and _cargas.get(carga) is not base:
+        del base.attrs[ATTR_CARGA_BASE]
+        return None
+    return carga
+
+
+def convenio_da_base(base: pd.DataFrame) -> str:
+    """Convênio da base, lido da primeira linha da coluna de convênio."""
+    return base.loc[0, COL_CONVENIO].strip().lower()
@@ -0,0 +1,109 @@
+# normalizacao.py
+"""
+Normalização vetorial das colunas de texto da base: nomes, CPFs e datas de nascimento.
+
+As funções recebem Series de texto (de preferência `string[pyarrow]`, como lidas por
+juntar_bases) e usam os kernels de string e de data do Arrow, sem laços em Python.
+Nomes e datas saem iguais ao tratamento linha a linha de antes (`str.title()` e
+`pd.to_datetime(dayfirst=True)`), e os casos que o caminho rápido não cobre caem para
+o pandas só nas linhas afetadas (as datas fora de FORMATOS_DATA_NASCIMENTO passam pelo
+parser flexível, com dayfirst). O CPF, além de perder '.' e '-', vira uma chave de
+largura fixa, para que a remoção de duplicados não dependa da formatação.
+"""
+import logging
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from constants import FORMATOS_DATA_NASCIMENTO, DIGITOS_CPF, FRACAO_ALERTA_DATAS_INVALIDAS
+
+logger = logging.getLogger(__name__)
+
+
+def _arrow(serie: pd.Series) -> pa.ChunkedArray:
+    """Conteúdo da Series como array Arrow de strings (sem cópia se já for string[pyarrow])."""
+    if not isinstance(serie.dtype, pd.StringDtype) or serie.dtype.storage != 'pyarrow':
+        serie = serie.astype(pd.StringDtype('pyarrow'))
+    return pa.chunked_array(serie.array._pa_array)
+
+
+def normalizar_nomes(serie: pd.Series) -> pd.Series:
+    """Nomes com a primeira letra de cada palavra maiúscula, como `str.title()`."""
+    return pd.Series(pd.arrays.ArrowStringArray(pc.utf8_title(_arrow(serie))), index=serie.index, copy=False)
+
+
+def normalizar_cpfs(serie: pd.Series) -> pd.Series:
+    """
+    CPFs como chave de DIGITOS_CPF dígitos: sem pontuação e completados com zeros à
+    esquerda (o zero inicial some quando o CPF passa por uma planilha como número).
+    Valores sem dígitos ou com dígitos demais não são CPFs válidos e ficam só sem '.' e '-'.
+    """
+    cpfs = _arrow(serie)
+    sem_pontuacao = pc.replace_substring(pc.replace_substring(cpfs, '.', ''), '-', '')
+    # Caminho rápido para o formato usual (000.000.000-00); a regex só roda se houver outro
+    so_digitos = pc.utf8_is_digit(sem_pontuacao)
+    digitos = sem_pontuacao
+    if not pc.all(so_digitos).as_py():
+        digitos = pc.if_else(so_digitos, sem_pontuacao, pc.replace_substring_regex(cpfs, r'\D', ''))
+    tamanho = pc.utf8_length(digitos)
+    valido = pc.and_(pc.greater(tamanho, 0), pc.less_equal(tamanho, DIGITOS_CPF))
+    chaves = pc.if_else(valido, pc.utf8_lpad(digitos, DIGITOS_CPF, '0'), sem_pontuacao)
+    return pd.Series(pd.arrays.ArrowStringArray(chaves), index=serie.index, copy=False)
+
+
+def converter_datas(serie: pd.Series, formatos=FORMATOS_DATA_NASCIMENTO) -> np.ndarray:
+    """
+    Datas convertidas para datetime64[ns] (NaT quando inválidas ou vazias), tentando os
+    formatos em ordem. O primeiro formato passa pelo `strptime` do Arrow, que aceita dias
+    fora do mês (31/02 vira 02/03): as datas cujo dia não confere com o texto, e as que
+    não estão no formato com zeros à esquerda, são refeitas pelo parser estrito do pandas.
+    O que nenhum formato converte passa pelo parser flexível do pandas (`dayfirst=True`,
+    valor a valor), que aceita outros layouts (03-05-1960, 03/05/60, com hora...). Se
+    ainda sobrar mais de FRACAO_ALERTA_DATAS_INVALIDAS das datas preenchidas, avisa no log.
+    """
+    textos = _arrow(serie)
+    datas = pc.strptime(textos, format=formatos[0], unit='ns', error_is_null=True)
+    if formatos[0] == '%d/%m/%Y':
+        dia = pc.utf8_lpad(pc.cast(pc.day(datas), pa.string()), 2, '0')
+        conferem = pc.and_(pc.equal(pc.utf8_length(textos), 10), pc.equal(pc.utf8_slice_codeunits(textos, 0, 2), dia))
+        datas = pc.if_else(pc.fill_null(conferem, False), datas, pa.scalar(None, datas.type))
+    resultado = datas.to_numpy(zero_copy_only=False).astype('datetime64[ns]')
+
+    # Linhas preenchidas que o caminho rápido não converteu: parser estrito, formato a formato
+    pendentes = np.flatnonzero(np.isnat(resultado) & ~serie.isna().to_numpy())
+    for formato in formatos:
+        if not len(pendentes):
+            break
+        convertidas = pd.to_datetime(serie.iloc[pendentes].astype(object), format=formato, errors='coerce')
+        resultado[pendentes] = convertidas.to_numpy(dtype='datetime64[ns]')
+        pendentes = pendentes[np.isnat(resultado[pendentes])]
+    if len(pendentes):
+        convertidas = pd.to_datetime(serie.iloc[pendentes].astype(object), format='mixed', dayfirst=True,
+                                     errors='coerce')
+        resultado[pendentes] = convertidas.to_numpy(dtype='datetime64[ns]')
+        pendentes = pendentes[np.isnat(resultado[pendentes])]
+    if len(pendentes):
+        _avisar_datas_invalidas(serie, pendentes)
+    return resultado
+
+
+def _avisar_datas_invalidas(serie: pd.Series, pendentes: np.ndarray):
+    invalidas = serie.iloc[pendentes]
+    # Texto em branco conta como data vazia, não como inválida
+    invalidas = invalidas[invalidas.astype(object).str.strip().astype(bool)]
+    preenchidas = int(serie.notna().sum())
+    if preenchidas and len(invalidas) > FRACAO_ALERTA_DATAS_INVALIDAS * preenchidas:
+        logger.warning("%d de %d datas de nascimento preenchidas não foram reconhecidas (ex: %s); "
+                       "essas linhas são descartadas pelo filtro de idade.",
+                       len(invalidas), preenchidas, ', '.join(map(repr, invalidas.unique()[:3])))
+
+
+def nascidos_a_partir_de(datas: np.ndarray, data_limite) -> np.ndarray:
+    """
+    Máscara das datas (datetime64[ns]) iguais ou posteriores a `data_limite`, comparando
+    os inteiros de 64 bits diretamente. NaT é o menor int64, então nunca passa.
+    """
+    limite = np.datetime64(data_limite, 'ns').astype(np.int64)
+    return datas.view(np.int64) >= limite
@@ -0,0 +1,101 @@
+# perfil.py
+"""
+Relatório por etapa do pipeline de filtragem: tempo, pico de memória e linhas
+selecionadas antes e depois de cada regra. Serve tanto para achar as regras caras
+quanto como funil da campanha (quantas linhas cada regra removeu).
+
+O pico de memória só é medido com o tracemalloc ativo (ex: PYTHONTRACEMALLOC=1 ou a
+opção --perfil-memoria do executar_campanha); sem ele fica None, e o custo do relatório
+é só o de contar a seleção. Cada etapa também vai para o logger 'perfil' como uma
+linha JSON, em nível DEBUG.
+"""
+import json
+import logging
+import time
+import tracemalloc
+from contextlib import contextmanager
+from typing import Callable, List, Optional
+
+logger = logging.getLogger('perfil')
+
+
+class Perfil:
+    """
+    Acumula os registros das etapas, na ordem em que foram executadas. `ao_registrar`,
+    se dado, é chamado com cada registro assim que a etapa termina (ex: para mostrar o
+    andamento de um processamento em segundo plano).
+    """
+    def __init__(self, campanha: str = None, ao_registrar: Optional[Callable[[dict], None]] = None):
+        self.campanha = campanha
+        self.ao_registrar = ao_registrar
+        self.etapas: List[dict] = []
+        # Picos já vistos pelas etapas abertas: uma etapa interna zera o pico do tracemalloc,
+        # então repassa o seu à etapa de fora ao terminar
+        self._picos: List[int] = []
+        self._nivel = 0
+
+    @contextmanager
+    def etapa(self, nome: str, contar: Optional[Callable[[], int]] = None, **detalhes):
+        """
+        Mede o bloco como a etapa `nome`. `contar` devolve o número de linhas selecionadas
+        e é chamado antes e depois do bloco; `detalhes` entram como campos do registro, e o
+        bloco recebe esse dicionário para acrescentar outros.
+        """
+        linhas_entrada = contar() if contar else None
+        medir_memoria = tracemalloc.is_tracing()
+        pico_mb = None
+        if medir_memoria:
+            atual, pico = tracemalloc.get_traced_memory()
+            if self._picos:
+                self._picos[-1] = max(self._picos[-1], pico)
+            tracemalloc.reset_peak()
+            self._picos.append(atual)
+        nivel = self._nivel
+        self._nivel += 1
+        inicio = time.perf_counter()
+        try:
+            yield detalhes
+        finally:
+            segundos = time.perf_counter() - inicio
+            self._nivel -= 1
+            if medir_memoria:
+                pico = max(self._picos.pop(), tracemalloc.get_traced_memory()[1])
+                if self._picos:
+                    self._picos[-1] = max(self._picos[-1], pico)
+                pico_mb = round((pico - atual) / 2**20, 1)
+        registro = {
+            'etapa': nome,
+            'nivel': nivel,
+            'segundos': round(segundos, 4),
+            'pico_mb': pico_mb,
+            'linhas_entrada': linhas_entrada,
+            'linhas_saida': contar() if contar else None,
+            **detalhes,
+        }
+        self.registrar(registro)
+
+    def registrar(self, registro: dict):
+        self.etapas.append(registro)
+        if self.ao_registrar:
+            self.ao_registrar(registro)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(json.dumps({'campanha': self.campanha, **registro}, ensure_ascii=False, default=str))
+
+    def incorporar(self, etapas: List[dict], **detalhes):
+        """
+        Acrescenta registros feitos em outra execução (ex: etapas vindas do cache). Eles
+        já foram para o log quando executados, então não são registrados de novo.
+        """
+        self.etapas.extend({**registro, **detalhes} for registro in etapas)
+
+    def relatorio(self) -> List[dict]:
+        """
+        Cópia dos registros, um dicionário por etapa. `nivel` é a profundidade da etapa
+        (as de nível 1 estão dentro de uma de nível 0, e assim por diante); uma etapa
+        interna é registrada antes da que a contém.
+        """
+        return [dict(registro) for registro in self.etapas]
+
+    def segundos_totais(self) -> float:
+        """Tempo das etapas de nível 0 executadas agora (sem as vindas do cache)."""
+        return sum(r['segundos'] for r in self.etapas if r.get('nivel') == 0 and not r.get('cache'))
@@ -0,0 +1,69 @@
+# plano_arrow.py
+"""
+Motor Arrow dos filtros globais do FiltroHandler (passo 2).
+
+No motor pandas cada regra restringe o vetor de seleção numa passada própria. Aqui as
+regras que dependem só da própria linha (exclusões por palavra-chave, margem mínima,
+ALESP, margem compulsória) viram expressões do `pyarrow.compute` e são avaliadas juntas
+numa única varredura do Acero, que divide a base em lotes e os processa em várias
+threads. As colunas de texto não são copiadas: `string[pyarrow]` e categorias passam
+para o Arrow como estão.
+
+O resultado é o mesmo do motor pandas, linha a linha; o script
+benchmarks/paridade_motores.py confere isso sobre as estratégias e convênios.
+"""
+from typing import Dict, Iterable, List
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+
+from busca_textual import AutomatoPalavrasChave, valores_distintos
+from constants import LINHAS_POR_LOTE_ARROW
+
+
+def valores_excluidos(serie: pd.Series, palavras_chave: Iterable[str]) -> List[str]:
+    """Valores distintos da coluna que contêm alguma das palavras-chave (como em busca_textual)."""
+    automato = AutomatoPalavrasChave(palavras_chave)
+    if not automato:
+        return []
+    _, valores = valores_distintos(serie)
+    return [v for v in valores if isinstance(v, str) and automato.encontra(v)]
+
+
+def nao_contem(coluna: str, valores: List[str]) -> pc.Expression:
+    """Linhas cujo valor não está em `valores`; nulos passam, como no motor pandas."""
+    return ~pc.field(coluna).isin(valores)
+
+
+def diferente_de(coluna: str, valor: str) -> pc.Expression:
+    """Linhas com valor diferente de `valor`; nulos passam (como `serie != valor` no pandas)."""
+    return (pc.field(coluna) != valor) | ~pc.field(coluna).is_valid()
+
+
+def maior_ou_igual(coluna: str, limite) -> pc.Expression:
+    return pc.field(coluna) >= limite
+
+
+def tabela_arrow(df: pd.DataFrame, extras: Dict[str, np.ndarray] = None) -> pa.Table:
+    """Colunas de `df` (sem o índice) mais as colunas calculadas de `extras`, como tabela Arrow."""
+    tabela = pa.Table.from_pandas(df, preserve_index=False)
+    for nome, valores in (extras or {}).items():
+        tabela = tabela.append_column(nome, pa.array(valores))
+    return tabela
+
+
+def avaliar_regras(tabela: pa.Table, regras: Dict[str, pc.Expression],
+                   linhas_por_lote: int = LINHAS_POR_LOTE_ARROW) -> Dict[str, np.ndarray]:
+    """
+    Avalia todas as regras numa só varredura da tabela, em lotes de `linhas_por_lote`
+    processados em paralelo. Devolve uma máscara booleana (na ordem das linhas) por regra.
+    """
+    if not regras:
+        return {}
+    dataset = ds.dataset(tabela.to_batches(max_chunksize=linhas_por_lote), schema=tabela.schema)
+    avaliadas = dataset.to_table(columns=regras, use_threads=True)
+    # Uma regra que ainda dê nulo (ex: coluna toda vazia) não seleciona a linha
+    return {nome: pc.fill_null(avaliadas[nome], False).to_numpy(zero_copy_only=False) for nome in regras}
@@ -0,0 +1,210 @@
+# plano_campanha.py
+"""
+Plano de execução compilado de uma campanha.
+
+O AppConfig é o que a tela (ou o JSON) preenche: listas, valores soltos e o convênio
+como texto. `compilar_plano` valida a configuração uma única vez e a resolve num
+PlanoCampanha imutável e hashable, que é o que o FiltroHandler e as estratégias
+executam:
+
+- as condições dos bancos já com o padrão compilado;
+- os parâmetros numéricos dos bancos em tuplas alinhadas, prontas para
+  `MotorAtribuicao.por_banco` (também separadas por cartão, para Benefício & Cartão);
+- as palavras-chave de exclusão por coluna, sem repetições;
+- as regras que dependem do convênio já decididas (ex: ALESP no GOVSP, margem
+  compulsória no GOVMT).
+
+Por ser hashable, o plano serve direto de chave do cache de etapas. `para_dict` e
+`plano_de_dict` o serializam, pela configuração de origem.
+"""
+import re
+from dataclasses import dataclass, field
+from datetime import date, datetime
+from typing import Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from busca_textual import mascara_por_valor_distinto
+from config import AppConfig, BancoConfig, config_para_dict, config_de_dict
+from constants import COL_LOTACAO, COL_VINCULO, COL_SECRETARIA, CONVENIOS_SEM_MARGEM_BENEFICIO_LIVRE
+
+CARTOES = ('Benefício', 'Consignado')
+
+
+@dataclass(frozen=True)
+class PlanoBanco:
+    """Um banco resolvido. `padrao` é None quando o banco vale para a base toda."""
+    banco: str
+    prazo: str
+    coluna_condicional: Optional[str]
+    padrao: Optional[re.Pattern]
+    coeficiente: float
+    fator_seguranca: float
+    comissao: float  # Fração do valor liberado (a comissão da tela dividida por 100)
+    coeficiente_parcela: Optional[float]
+    cartao_escolhido: Optional[str]
+
+    def mascara(self, df: pd.DataFrame, distintos=None) -> np.ndarray:
+        """
+        Condição do banco: linhas em que a coluna condicional contém o valor escolhido
+        (sem diferenciar maiúsculas), ou a base toda. Avaliada uma vez por valor distinto.
+        """
+        if self.padrao is None:
+            return np.ones(len(df), dtype=bool)
+        return mascara_por_valor_distinto(df[self.coluna_condicional], lambda v: self.padrao.search(v) is not None, distintos)
+
+
+@dataclass(frozen=True)
+class GrupoBancos:
+    """Bancos na ordem de prioridade e os seus parâmetros, um valor por banco."""
+    bancos: Tuple[PlanoBanco, ...] = ()
+    codigos: Tuple[str, ...] = field(init=False, compare=False, repr=False)
+    prazos: Tuple[str, ...] = field(init=False, compare=False, repr=False)
+    coeficientes: Tuple[float, ...] = field(init=False, compare=False, repr=False)
+    fatores_seguranca: Tuple[float, ...] = field(init=False, compare=False, repr=False)
+    coeficientes_efetivos: Tuple[float, ...] = field(init=False, compare=False, repr=False)
+    comissoes: Tuple[float, ...] = field(init=False, compare=False, repr=False)
+    coeficientes_parcela: Tuple[float, ...] = field(init=False, compare=False, repr=False)
+    tem_coeficiente_parcela: Tuple[bool, ...] = field(init=False, compare=False, repr=False)
+
+    def __post_init__(self):
+        def definir(nome, valores):
+            object.__setattr__(self, nome, tuple(valores))
+        definir('codigos', (b.banco for b in self.bancos))
+        definir('prazos', (b.prazo for b in self.bancos))
+        definir('coeficientes', (b.coeficiente for b in self.bancos))
+        definir('fatores_seguranca', (b.fator_seguranca for b in self.bancos))
+        definir('coeficientes_efetivos', (b.coeficiente * b.fator_seguranca for b in self.bancos))
+        definir('comissoes', (b.comissao for b in self.bancos))
+        definir('coeficientes_parcela', (b.coeficiente_parcela or np.nan for b in self.bancos))
+        definir('tem_coeficiente_parcela', (bool(b.coeficiente_parcela) for b in self.bancos))
+
+    def __len__(self):
+        return len(self.bancos)
+
+
+@dataclass(frozen=True)
+class PlanoCampanha:
+    """Configuração validada e resolvida de uma campanha (ver `compilar_plano`)."""
+    campanha: str
+    convenio: str
+    equipes: str
+    convai: float
+    comissao_minima: float
+    margem_emprestimo_limite: float
+    data_limite: Optional[date]
+    limite_campanha: Optional[int]
+    # CPFs enviados nesse número de dias ficam de fora (ver registro_leads); None = não exclui
+    dias_sem_reenvio: Optional[int]
+    registrar_envio: bool
+    # (coluna, palavras-chave) de cada coluna com exclusões
+    exclusoes: Tuple[Tuple[str, Tuple[str, ...]], ...]
+    bancos: GrupoBancos
+    # Bancos de cada cartão (Benefício & Cartão), na ordem de CARTOES
+    bancos_por_cartao: Tuple[GrupoBancos, ...]
+    # Regras por convênio, já decididas
+    govsp: bool
+    remover_alesp: bool
+    margem_compulsoria_nao_negativa: bool
+    margem_beneficio_livre: bool
+    slug_campanha: str
+    # Configuração de origem; fora da comparação e do hash, que ficam com os campos resolvidos
+    config: AppConfig = field(compare=False, repr=False)
+
+    @property
+    def chave_pre_processamento(self) -> tuple:
+        """
+        Campos de que dependem os passos 1 e 2 do FiltroHandler. Campanhas com a mesma
+        chave podem compartilhar a base já pré-filtrada.
+        """
+        return (
+            self.convenio, self.data_limite, self.margem_emprestimo_limite,
+            frozenset((coluna, frozenset(palavras)) for coluna, palavras in self.exclusoes),
+        )
+
+    def bancos_do_cartao(self, cartao: str) -> GrupoBancos:
+        return self.bancos_por_cartao[CARTOES.index(cartao)]
+
+    def nome_base(self, hoje: date = None) -> str:
+        """Nome da campanha na coluna final, sem o sufixo da equipe ou do convai."""
+        data = (hoje or datetime.today()).strftime('%d%m%Y')
+        return f"{self.convenio}_{data}_{self.slug_campanha}"
+
+    def para_dict(self) -> dict:
+        return config_para_dict(self.config)
+
+
+def _compilar_banco(indice: int, banco: BancoConfig) -> PlanoBanco:
+    nome = f"Banco {indice + 1} ({banco.banco})"
+    if banco.parcelas is None or banco.parcelas < 1:
+        raise ValueError(f"{nome}: o número de parcelas deve ser pelo menos 1.")
+    if banco.coeficiente is None or banco.coeficiente < 0:
+        raise ValueError(f"{nome}: o coeficiente não pode ser negativo.")
+    if banco.comissao is None or not 0 <= banco.comissao <= 100:
+        raise ValueError(f"{nome}: a comissão deve estar entre 0 e 100%.")
+    if banco.margem_seguranca is not None and not 0 <= banco.margem_seguranca <= 1:
+        raise ValueError(f"{nome}: a margem de segurança deve estar entre 0 e 1.")
+    if banco.cartao_escolhido is not None and banco.cartao_escolhido not in CARTOES:
+        raise ValueError(f"{nome}: cartão desconhecido {banco.cartao_escolhido!r} (opções: {', '.join(CARTOES)}).")
+
+    if banco.coluna_condicional == "Aplicar a toda a base":
+        coluna, padrao = None, None
+    else:
+        if not banco.coluna_condicional:
+            raise ValueError(f"{nome}: escolha a coluna da condição.")
+        if banco.valor_condicional is None or str(banco.valor_condicional) == '':
+            raise ValueError(f"{nome}: escolha o valor de '{banco.coluna_condicional}' da condição.")
+        coluna = banco.coluna_condicional
+        padrao = re.compile(re.escape(str(banco.valor_condicional)), re.IGNORECASE)
+
+    return PlanoBanco(
+        banco=str(banco.banco), prazo=str(banco.parcelas), coluna_condicional=coluna, padrao=padrao,
+        coeficiente=banco.coeficiente, fator_seguranca=banco.margem_seguranca or 1.0,
+        comissao=banco.comissao / 100, coeficiente_parcela=banco.coeficiente_parcela,
+        cartao_escolhido=banco.cartao_escolhido,
+    )
+
+
+def compilar_plano(config: AppConfig) -> PlanoCampanha:
+    """Valida a configuração e a resolve num PlanoCampanha. Levanta ValueError se ela for inválida."""
+    if isinstance(config, PlanoCampanha):
+        return config
+    if not config.campanha:
+        raise ValueError("Escolha o tipo da campanha.")
+    if not config.convenio:
+        raise ValueError("O convênio da base não foi identificado.")
+    if not 0 <= config.convai <= 100:
+        raise ValueError("A porcentagem para IA deve estar entre 0 e 100.")
+    if config.limite_campanha is not None and config.limite_campanha < 0:
+        raise ValueError("O limite de leads não pode ser negativo.")
+    if config.dias_sem_reenvio is not None and config.dias_sem_reenvio < 0:
+        raise ValueError("O número de dias sem reenvio não pode ser negativo.")
+
+    bancos = tuple(_compilar_banco(i, banco) for i, banco in enumerate(config.bancos_config))
+    exclusoes = tuple(
+        (coluna, tuple(dict.fromkeys(palavras)))
+        for coluna, palavras in ((COL_LOTACAO, config.selecao_lotacao), (COL_VINCULO, config.selecao_vinculos),
+                                 (COL_SECRETARIA, config.selecao_secretaria))
+        if palavras
+    )
+    return PlanoCampanha(
+        campanha=config.campanha, convenio=config.convenio, equipes=config.equipes, convai=config.convai,
+        comissao_minima=config.comissao_minima, margem_emprestimo_limite=config.margem_emprestimo_limite,
+        data_limite=config.data_limite, limite_campanha=config.limite_campanha or None,
+        dias_sem_reenvio=config.dias_sem_reenvio or None, registrar_envio=bool(config.registrar_envio),
+        exclusoes=exclusoes,
+        bancos=GrupoBancos(bancos),
+        bancos_por_cartao=tuple(GrupoBancos(tuple(b for b in bancos if b.cartao_escolhido == cartao)) for cartao in CARTOES),
+        govsp=config.convenio == 'govsp',
+        remover_alesp=config.convenio == 'govsp',
+        margem_compulsoria_nao_negativa=config.convenio == 'govmt',
+        margem_beneficio_livre=config.convenio not in CONVENIOS_SEM_MARGEM_BENEFICIO_LIVRE,
+        slug_campanha=config.campanha.lower().replace(' & ', '&'),
+        config=config,
+    )
+
+
+def plano_de_dict(dados: dict) -> PlanoCampanha:
+    """Compila o plano de um dicionário no formato de `config_para_dict` (ou de `PlanoCampanha.para_dict`)."""
+    return compilar_plano(config_de_dict(dados))
@@ -0,0 +1,172 @@
+# previa_amostral.py
+"""
+Prévia da campanha sobre uma amostra estratificada da base, para ajustar os bancos
+(coeficiente, comissão, margem de segurança...) sem rodar o filtro na base inteira.
+
+A unidade da amostra é o grupo de linhas ligadas por CPF ou matrícula: todas as linhas
+de um grupo sorteado entram juntas, de modo que a remoção de CPFs duplicados e as
+regras por matrícula do GOVSP (uso prévio, margem negativa) se comportam como na base
+inteira. Os estratos são as combinações de valores das colunas usadas nas condições
+dos bancos (COLUNAS_CONDICAO); cada grupo fica no estrato da sua primeira linha.
+Em cada estrato é sorteada uma parte proporcional ao seu tamanho, com um mínimo por
+estrato, e o sorteio é fixo (semente), então só os parâmetros mudam entre as prévias.
+
+Os totais da base (leads, valor liberado e comissão) são estimados pelo estimador
+estratificado usual, com a correção de população finita na variância; a margem é a de
+95% (Z_CONFIANCA_PREVIA). A prévia ignora o limite de leads da campanha.
+"""
+import dataclasses
+from typing import List
+
+import numpy as np
+import pandas as pd
+
+from config import AppConfig
+from constants import (
+    ATTR_CHAVE_BASE, COL_CPF, COL_MATRICULA, COLUNAS_CONDICAO, MINIMO_POR_ESTRATO_PREVIA, MOTOR_FILTRO_PADRAO,
+    UNIDADES_AMOSTRA_PREVIA, Z_CONFIANCA_PREVIA,
+)
+from filter_handler import FiltroHandler
+from juntar_bases import marcar_carga
+from normalizacao import normalizar_cpfs
+from strategies import FiltroStrategy
+
+
+class AmostraEstratificada:
+    """
+    Linhas dos grupos sorteados (`df`, com o índice da base) e, para cada linha, o código
+    da sua unidade (`unidade_da_linha`). `estrato[u]` é o estrato da unidade sorteada u;
+    `tamanhos[h]` e `sorteadas[h]` são quantas unidades o estrato h tem na base e na amostra.
+    """
+    def __init__(self, df: pd.DataFrame, unidade_da_linha: np.ndarray, estrato: np.ndarray,
+                 tamanhos: np.ndarray, sorteadas: np.ndarray, colunas_estrato: List[str]):
+        self.df = df
+        self.unidade_da_linha = unidade_da_linha
+        self.estrato = estrato
+        self.tamanhos = tamanhos
+        self.sorteadas = sorteadas
+        self.colunas_estrato = colunas_estrato
+
+
+def colunas_de_estrato(config: AppConfig) -> List[str]:
+    """Colunas usadas nas condições dos bancos da configuração (sem 'Aplicar a toda a base')."""
+    colunas = {banco.coluna_condicional for banco in config.bancos_config}
+    return [coluna for coluna in COLUNAS_CONDICAO if coluna in colunas and coluna != 'Aplicar a toda a base']
+
+
+def _codigos_sem_nulos(serie: pd.Series) -> np.ndarray:
+    """Códigos de `factorize`, com um código próprio para cada linha nula (nulos não ligam linhas)."""
+    codigos, valores = pd.factorize(serie)
+    nulos = np.flatnonzero(codigos < 0)
+    codigos[nulos] = len(valores) + np.arange(len(nulos))
+    return codigos
+
+
+def unidades_de_amostragem(base: pd.DataFrame) -> np.ndarray:
+    """
+    Código do grupo de cada linha: linhas com o mesmo CPF (normalizado) ou a mesma
+    matrícula ficam no mesmo grupo, também de forma transitiva. Os rótulos (a menor linha
+    alcançada) são propagados por CPF e por matrícula até pararem de mudar.
+    """
+    chaves = []
+    if COL_CPF in base.columns:
+        chaves.append(_codigos_sem_nulos(normalizar_cpfs(base[COL_CPF])))
+    if COL_MATRICULA in base.columns:
+        chaves.append(_codigos_sem_nulos(base[COL_MATRICULA]))
+    rotulos = np.arange(len(base))
+    mudou = bool(chaves)
+    while mudou:
+        mudou = False
+        for codigos in chaves:
+            menor = np.full(int(codigos.max()) + 1, len(base))
+            np.minimum.at(menor, codigos, rotulos)
+            novos = menor[codigos]
+            if (novos != rotulos).any():
+                rotulos, mudou = novos, True
+    return pd.factorize(rotulos)[0]
+
+
+def amostrar(base: pd.DataFrame, colunas_estrato: List[str], unidades: int = UNIDADES_AMOSTRA_PREVIA,
+             minimo_por_estrato: int = MINIMO_POR_ESTRATO_PREVIA, semente: int = 42) -> AmostraEstratificada:
+    """Sorteia cerca de `unidades` grupos (ver unidades_de_amostragem), estratificados pelas `colunas_estrato`."""
+    unidade_da_base = unidades_de_amostragem(base)
+    num_unidades = int(unidade_da_base.max()) + 1 if len(base) else 0
+    primeira_linha = np.full(num_unidades, len(base), dtype=np.int64)
+    np.minimum.at(primeira_linha, unidade_da_base, np.arange(len(base)))
+
+    colunas_estrato = [coluna for coluna in colunas_estrato if coluna in base.columns]
+    if colunas_estrato:
+        estrato_da_linha = base[colunas_estrato].iloc[primeira_linha].groupby(colunas_estrato, dropna=False, observed=True).ngroup().to_numpy()
+    else:
+        estrato_da_linha = np.zeros(num_unidades, dtype=np.int64)
+    tamanhos = np.bincount(estrato_da_linha, minlength=int(estrato_da_linha.max(initial=-1)) + 1)
+
+    # Alocação proporcional, com um mínimo por estrato e sem passar do tamanho do estrato
+    sorteadas = np.round(tamanhos * min(1.0, unidades / max(num_unidades, 1))).astype(np.int64)
+    sorteadas = np.minimum(tamanhos, np.maximum(sorteadas, minimo_por_estrato))
+
+    # Ordem aleatória dentro de cada estrato: entram as primeiras `sorteadas[h]` unidades
+    ordem = np.lexsort((np.random.default_rng(semente).random(num_unidades), estrato_da_linha))
+    inicio_estrato = np.concatenate(([0], np.cumsum(tamanhos)[:-1]))
+    posto = np.empty(num_unidades, dtype=np.int64)
+    posto[ordem] = np.arange(num_unidades) - inicio_estrato[estrato_da_linha[ordem]]
+    sorteada = posto < sorteadas[estrato_da_linha]
+
+    # Novos códigos 0..n-1 para as unidades sorteadas, na ordem dos códigos da base
+    codigo = np.cumsum(sorteada) - 1
+    linhas = np.flatnonzero(sorteada[unidade_da_base])
+    df = base.iloc[linhas]
+    chave_base = base.attrs.get(ATTR_CHAVE_BASE)
+    if chave_base is not None:
+        # Chave e carga próprias da amostra, para o cache de etapas do FiltroHandler valer entre as prévias
+        df.attrs[ATTR_CHAVE_BASE] = f"{chave_base}:amostra:{'|'.join(colunas_estrato)}:{unidades}:{semente}"
+        marcar_carga(df)
+    return AmostraEstratificada(df, codigo[unidade_da_base[linhas]], estrato_da_linha[sorteada],
+                                tamanhos, sorteadas, colunas_estrato)
+
+
+def _somar_colunas(saida: pd.DataFrame, prefixo: str) -> np.ndarray:
+    colunas = [coluna for coluna in saida.columns if coluna.startswith(prefixo)]
+    valores = saida[colunas].apply(pd.to_numeric, errors='coerce')
+    return valores.fillna(0).sum(axis=1).to_numpy(dtype=np.float64)
+
+
+def _total_estimado(y: np.ndarray, amostra: AmostraEstratificada):
+    """Total estratificado de `y` (um valor por unidade sorteada) e a margem de erro."""
+    n = amostra.sorteadas.astype(np.float64)
+    tamanho = amostra.tamanhos.astype(np.float64)
+    com_amostra = n > 0
+    media = np.divide(np.bincount(amostra.estrato, weights=y, minlength=len(n)), n, out=np.zeros_like(n), where=com_amostra)
+    desvios = np.bincount(amostra.estrato, weights=(y - media[amostra.estrato])**2, minlength=len(n))
+    # Estratos com uma só unidade sorteada não têm variância estimável (e, com a FPC, em geral são inteiros)
+    variancia_media = np.divide(desvios, n * (n - 1), out=np.zeros_like(n), where=n > 1)
+    total = float(np.sum(tamanho * media))
+    variancia = float(np.sum(tamanho**2 * (1 - n / np.maximum(tamanho, 1)) * variancia_media))
+    return total, Z_CONFIANCA_PREVIA * np.sqrt(variancia)
+
+
+def estimar_campanha(amostra: AmostraEstratificada, config: AppConfig, strategy_class: type[FiltroStrategy],
+                     motor: str = MOTOR_FILTRO_PADRAO) -> pd.DataFrame:
+    """
+    Roda o filtro na amostra e estima, para a base inteira, o número de leads, o valor
+    liberado e a comissão totais. Uma linha por métrica: o valor na amostra, a estimativa
+    e a margem de erro (a estimativa ± margem cobre o total em ~95% dos sorteios).
+    """
+    config = dataclasses.replace(config, limite_campanha=None)
+    saida = FiltroHandler(amostra.df, config, strategy_class, motor=motor).processar()
+
+    # A saída mantém o índice da base; daí a posição na amostra e a unidade de cada lead
+    posicoes = amostra.df.index.get_indexer(saida.index)
+    unidades = amostra.unidade_da_linha[posicoes]
+    num_unidades = len(amostra.estrato)
+    metricas = {
+        'leads': np.ones(len(saida)),
+        'valor liberado': _somar_colunas(saida, 'valor_liberado_'),
+        'comissão': _somar_colunas(saida, 'comissao_'),
+    }
+    linhas = []
+    for nome, valores in metricas.items():
+        y = np.bincount(unidades, weights=valores, minlength=num_unidades)
+        estimativa, margem = _total_estimado(y, amostra)
+        linhas.append({'métrica': nome, 'na amostra': valores.sum(), 'estimativa': estimativa, 'margem (95%)': margem})
+    return pd.DataFrame(linhas)
@@ -0,0 +1,381 @@
+# processamento_em_disco.py
+"""
+Processamento de bases maiores que a memória.
+
+A base é lida em blocos e espalhada em partições Parquet num diretório local, por hash
+da matrícula (`espalhar_em_disco`). Cada partição é carregada sozinha e passa pelos
+passos 1 a 3 do FiltroHandler, inclusive a atribuição dos bancos: como todas as linhas
+de uma matrícula caem na mesma partição, o uso prévio e as margens negativas do GOVSP
+são decididos ali mesmo. A memória usada fica em torno do tamanho de uma partição.
+
+As operações que dependem da base inteira são feitas em disco:
+
+- o filtro de idade é decidido numa primeira passada, só com as colunas necessárias;
+- os candidatos de cada partição vão para baldes por hash do CPF normalizado, e cada
+  balde, que cabe em memória, é ordenado e perde os CPFs duplicados (agregação por hash);
+- os baldes ordenados são intercalados em blocos (ordenação externa) e gravados direto
+  no arquivo final, com o convai sorteado por amostragem sequencial, bloco a bloco.
+
+A saída tem as mesmas linhas da execução em memória. A diferença está nos empates: a
+ordenação em memória não é estável, e aqui as linhas com a mesma chave seguem a ordem
+da base (o que também decide qual linha de um CPF repetido fica). O sorteio do convai
+sorteia o mesmo número de linhas, mas não as mesmas.
+"""
+import logging
+import math
+import os
+import shutil
+import tempfile
+from typing import List, Optional
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from busca_textual import mascara_exclusao
+from config import AppConfig
+from constants import *
+from exportacao import exportar_em_blocos, esquema_estavel
+from filter_handler import _candidatos_da_particao
+from juntar_bases import _ler_arquivo, _nome_arquivo, _notificar_no_log, convenio_da_base
+from perfil import Perfil
+from plano_campanha import compilar_plano
+from registro_leads import RegistroLeads, coluna_cpf_da_saida, cpfs_como_inteiros, registro_leads
+from strategies import FiltroStrategy
+
+logger = logging.getLogger(__name__)
+
+# Colunas auxiliares gravadas junto com as linhas
+COLUNA_POSICAO = '__posicao'  # Posição da linha na base, na ordem dos arquivos
+COLUNA_CHAVE = '__chave'  # Chave de ordenação da estratégia
+
+
+def _particao_por_hash(serie: pd.Series, num_particoes: int) -> np.ndarray:
+    return (pd.util.hash_pandas_object(serie, index=False).to_numpy() % num_particoes).astype(np.int64)
+
+
+def _tamanho(arquivo) -> Optional[int]:
+    tamanho = getattr(arquivo, 'size', None)
+    if tamanho is None and isinstance(arquivo, (str, os.PathLike)):
+        tamanho = os.path.getsize(arquivo)
+    return tamanho
+
+
+def num_particoes_para(files) -> int:
+    """Partições para que cada uma tenha cerca de BYTES_CSV_POR_PARTICAO de CSV."""
+    tamanhos = [_tamanho(arquivo) for arquivo in files]
+    if any(tamanho is None for tamanho in tamanhos):
+        return PARTICOES_EM_DISCO_PADRAO
+    return max(1, math.ceil(sum(tamanhos) / BYTES_CSV_POR_PARTICAO))
+
+
+class _Particionador:
+    """Grava DataFrames em vários arquivos Parquet, um por partição, com um esquema comum."""
+    def __init__(self, diretorio: str, prefixo: str, num_particoes: int):
+        self.caminhos = [os.path.join(diretorio, f"{prefixo}_{i:04d}.parquet") for i in range(num_particoes)]
+        self.linhas = np.zeros(num_particoes, dtype=np.int64)
+        self.esquema = None
+        self._escritores = [None] * num_particoes
+
+    def escrever(self, df: pd.DataFrame, particao: np.ndarray):
+        tabela = pa.Table.from_pandas(df, preserve_index=False)
+        if self.esquema is None:
+            self.esquema = esquema_estavel(tabela.schema)
+        tabela = tabela.cast(self.esquema)
+        ordem = np.argsort(particao, kind='stable')
+        limites = np.searchsorted(particao[ordem], np.arange(len(self.caminhos) + 1))
+        for i, (inicio, fim) in enumerate(zip(limites[:-1], limites[1:])):
+            if inicio == fim:
+                continue
+            if self._escritores[i] is None:
+                self._escritores[i] = pq.ParquetWriter(self.caminhos[i], self.esquema)
+            self._escritores[i].write_table(tabela.take(ordem[inicio:fim]))
+            self.linhas[i] += fim - inicio
+
+    def fechar(self):
+        for escritor in self._escritores:
+            if escritor is not None:
+                escritor.close()
+        self._escritores = [None] * len(self.caminhos)
+
+
+class BaseEmDisco:
+    """
+    Base de entrada gravada em partições Parquet (ver `espalhar_em_disco`). Pode ser
+    usada como gerenciador de contexto, que apaga o diretório ao sair.
+    """
+    def __init__(self, diretorio: str, caminhos: List[str], linhas: int, colunas: List[str], convenio: Optional[str]):
+        self.diretorio = diretorio
+        self.caminhos = caminhos
+        self.linhas = linhas
+        self.colunas = colunas
+        self.convenio = convenio
+
+    @property
+    def num_particoes(self) -> int:
+        return len(self.caminhos)
+
+    def ler_particao(self, i: int, colunas: List[str] = None) -> Optional[pd.DataFrame]:
+        """
+        Linhas da partição `i` (None se ela estiver vazia), indexadas pela posição na base.
+        `colunas` restringe a leitura a algumas colunas.
+        """
+        if not os.path.exists(self.caminhos[i]):
+            return None
+        if colunas is not None:
+            colunas = list(colunas) + [COLUNA_POSICAO]
+        df = pq.read_table(self.caminhos[i], columns=colunas).to_pandas()
+        df.index = pd.Index(df.pop(COLUNA_POSICAO).to_numpy())
+        return df
+
+    def apagar(self):
+        shutil.rmtree(self.diretorio, ignore_errors=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.apagar()
+
+
+def espalhar_em_disco(files, diretorio: str = None, num_particoes: int = None,
+                      tamanho_bloco: int = TAMANHO_BLOCO_LEITURA, notificar=None) -> BaseEmDisco:
+    """
+    Lê os arquivos em blocos (como juntar_bases) e grava as linhas em `num_particoes`
+    partições Parquet dentro de `diretorio` (um diretório temporário novo, se omitido),
+    pelo hash da matrícula. Só um bloco fica em memória por vez.
+    """
+    notificar = notificar or _notificar_no_log
+    num_particoes = num_particoes or num_particoes_para(files)
+    diretorio = diretorio or tempfile.mkdtemp(prefix='filtro_em_disco_')
+    os.makedirs(diretorio, exist_ok=True)
+    particionador = _Particionador(diretorio, 'base', num_particoes)
+    colunas, convenio, linhas = None, None, 0
+    try:
+        for arquivo in files:
+            linhas_antes = linhas
+            try:
+                for bloco in _ler_arquivo(arquivo, tamanho_bloco or TAMANHO_BLOCO_LEITURA):
+                    if colunas is None:
+                        colunas = list(bloco.columns)
+                        convenio = convenio_da_base(bloco) if COL_CONVENIO in bloco.columns and len(bloco) else None
+                    elif list(bloco.columns) != colunas:
+                        # Arquivos com colunas diferentes seguem as colunas do primeiro
+                        bloco = bloco.reindex(columns=colunas)
+                    bloco[COLUNA_POSICAO] = np.arange(linhas, linhas + len(bloco), dtype=np.int64)
+                    particionador.escrever(bloco, _particao_por_hash(bloco[COL_MATRICULA], num_particoes))
+                    linhas += len(bloco)
+                    del bloco
+            except Exception as e:
+                notificar('error', f"Erro ao carregar {_nome_arquivo(arquivo)}: {e}")
+                continue
+            if linhas == linhas_antes:
+                notificar('warning', f"O arquivo {_nome_arquivo(arquivo)} está vazio.")
+    finally:
+        particionador.fechar()
+    if not linhas:
+        notificar('error', "Nenhum arquivo válido foi carregado.")
+    return BaseEmDisco(diretorio, particionador.caminhos, linhas, colunas or [], convenio)
+
+
+def _ordem(tabela: pa.Table):
+    """
+    Chaves da ordem da saída: chave da estratégia decrescente (nulos por último) e, nos
+    empates, a posição na base. Devolve (é_nulo, -chave, posição), para np.lexsort.
+    """
+    chave = tabela[COLUNA_CHAVE].to_numpy().astype(np.float64)
+    nula = np.isnan(chave)
+    return nula.astype(np.int8), np.where(nula, 0.0, -chave), tabela[COLUNA_POSICAO].to_numpy()
+
+
+def _ordenar(tabela: pa.Table) -> pa.Table:
+    nula, chave, posicao = _ordem(tabela)
+    return tabela.take(np.lexsort((posicao, chave, nula)))
+
+
+def _ate(tabela: pa.Table, corte: tuple) -> np.ndarray:
+    """Máscara das linhas que vêm antes do `corte` na ordem da saída (inclusive)."""
+    nula, chave, posicao = _ordem(tabela)
+    corte_nula, corte_chave, corte_posicao = corte
+    return (nula < corte_nula) | ((nula == corte_nula) & (
+        (chave < corte_chave) | ((chave == corte_chave) & (posicao <= corte_posicao))))
+
+
+class FiltroEmDisco:
+    """
+    Executa uma campanha sobre uma BaseEmDisco, partição a partição, e grava o resultado
+    direto no arquivo de saída. As etapas ficam em `perfil`, como no FiltroHandler.
+    """
+    def __init__(self, base: BaseEmDisco, config: AppConfig, strategy_class: type[FiltroStrategy],
+                 motor: str = MOTOR_FILTRO_PADRAO, registro: RegistroLeads = None):
+        self.base = base
+        self.registro = registro
+        self.plano = compilar_plano(config)
+        self.config = self.plano.config
+        self.strategy_class = strategy_class
+        self.motor = motor
+        self.perfil = Perfil(self.plano.campanha)
+
+    @property
+    def relatorio(self) -> List[dict]:
+        return self.perfil.relatorio()
+
+    def _filtro_idade_se_aplica(self) -> bool:
+        """Mesma decisão do FiltroHandler, lendo das partições só as colunas necessárias."""
+        colunas_entrada = self.base.colunas[:NUM_COLUNAS_ENTRADA]
+        if not (self.plano.data_limite and COL_DATA_NASCIMENTO in colunas_entrada):
+            return False
+        palavras_por_coluna = dict(self.plano.exclusoes)
+        colunas = [col for col in palavras_por_coluna if col in colunas_entrada] + [COL_DATA_NASCIMENTO]
+        for i in range(self.base.num_particoes):
+            df = self.base.ler_particao(i, colunas)
+            if df is not None and df[COL_DATA_NASCIMENTO][~mascara_exclusao(df, palavras_por_coluna)].notna().any():
+                return True
+        return False
+
+    def processar(self, caminho: str, formato: str = 'CSV') -> int:
+        """Grava o resultado em `caminho` (no `formato` de exportacao) e devolve o número de linhas."""
+        if not self.base.linhas:
+            raise ValueError("A base de dados está vazia.")
+        with tempfile.TemporaryDirectory(prefix='trabalho_', dir=self.base.diretorio) as trabalho:
+            with self.perfil.etapa("decisão do filtro de idade") as detalhes:
+                filtro_idade_ativo = self._filtro_idade_se_aplica()
+                detalhes['ativo'] = filtro_idade_ativo
+
+            baldes = _Particionador(trabalho, 'balde', self.base.num_particoes)
+            coluna_cpf = COLUNAS_MAPEAMENTO_SAIDA.get(COL_CPF, COL_CPF)
+            colunas_saida = None
+            try:
+                for i in range(self.base.num_particoes):
+                    df = self.base.ler_particao(i)
+                    if df is None:
+                        continue
+                    with self.perfil.etapa("passos 1 a 3 na partição", particao=i, linhas_entrada=len(df)) as detalhes:
+                        saida, chaves, _ = _candidatos_da_particao(
+                            df, self.plano, self.strategy_class, filtro_idade_ativo, self.motor, self.registro)
+                        detalhes['linhas_saida'] = len(saida)
+                        colunas_saida = list(saida.columns)
+                        if len(saida):
+                            saida[COLUNA_CHAVE] = np.asarray(chaves, dtype=np.float64)
+                            saida[COLUNA_POSICAO] = saida.index.to_numpy()
+                            if coluna_cpf in saida.columns:
+                                balde = _particao_por_hash(saida[coluna_cpf], self.base.num_particoes)
+                            else:
+                                balde = saida.index.to_numpy() % self.base.num_particoes
+                            baldes.escrever(saida, balde)
+                    del df, saida
+            finally:
+                baldes.fechar()
+
+            # Na intercalação fica carregado um lote de cada corrida: juntos, um bloco da exportação
+            linhas_por_lote = max(1, LINHAS_POR_BLOCO_EXPORTACAO // max(1, int(np.count_nonzero(baldes.linhas))))
+            with self.perfil.etapa("CPFs duplicados por balde", baldes=len(baldes.caminhos)) as detalhes:
+                corridas = [self._ordenar_balde(caminho_balde, coluna_cpf, linhas_por_lote, self.plano.limite_campanha)
+                            for caminho_balde, linhas in zip(baldes.caminhos, baldes.linhas) if linhas]
+                total = sum(pq.ParquetFile(corrida).metadata.num_rows for corrida in corridas)
+                if self.plano.limite_campanha:
+                    total = min(total, self.plano.limite_campanha)
+                detalhes['linhas_entrada'] = int(baldes.linhas.sum())
+                detalhes['linhas_saida'] = total
+
+            blocos = self._blocos_da_saida(corridas, total, colunas_saida, linhas_por_lote)
+            cpfs_enviados = []
+            if self.plano.registrar_envio:
+                blocos = _guardando_cpfs(blocos, cpfs_enviados)
+            with self.perfil.etapa("ordenação, convai e gravação", linhas_saida=total):
+                exportar_em_blocos(blocos, caminho, formato)
+
+        # Os CPFs só vão para o registro depois que o arquivo foi gravado por inteiro
+        if self.plano.registrar_envio:
+            with self.perfil.etapa("registro dos leads enviados", linhas_saida=total):
+                (self.registro or registro_leads()).registrar(
+                    np.concatenate(cpfs_enviados or [np.empty(0, dtype=np.int64)]), self.plano.campanha, self.plano.equipes)
+        return total
+
+    @staticmethod
+    def _ordenar_balde(caminho: str, coluna_cpf: str, linhas_por_lote: int, limite: int = None) -> str:
+        """
+        Ordena o balde e tira os CPFs repetidos (fica a primeira linha de cada um na ordem
+        da saída). Com `limite`, só as primeiras linhas do balde podem chegar à saída.
+        """
+        tabela = _ordenar(pq.read_table(caminho))
+        if coluna_cpf in tabela.column_names:
+            unicos = ~tabela[coluna_cpf].to_pandas().duplicated().to_numpy()
+            tabela = tabela.filter(pa.array(unicos))
+        if limite:
+            tabela = tabela.slice(0, limite)
+        corrida = caminho.replace('.parquet', '_ordenado.parquet')
+        pq.write_table(tabela, corrida, row_group_size=linhas_por_lote)
+        os.remove(caminho)
+        return corrida
+
+    def _blocos_da_saida(self, corridas: List[str], total: int, colunas_saida: List[str], linhas_por_lote: int):
+        """
+        Intercala as corridas ordenadas em blocos: a cada passo, saem todas as linhas que
+        vêm antes da última linha carregada de alguma corrida que ainda tem linhas no disco.
+        Cada bloco recebe a coluna 'Campanha', com o convai sorteado bloco a bloco. Para
+        depois de `total` linhas.
+        """
+        nome_campanha_base = self.plano.nome_base()
+        n_convai = int((self.plano.convai / 100) * total) if self.plano.convai > 0 else 0
+        sorteio = np.random.default_rng(42)
+        restantes, faltam = total, n_convai
+
+        leitores = [pq.ParquetFile(corrida).iter_batches(batch_size=linhas_por_lote) for corrida in corridas]
+        carregadas = [None] * len(leitores)
+        esgotadas = [False] * len(leitores)
+        emitiu = False
+        while restantes:
+            for j, leitor in enumerate(leitores):
+                if not esgotadas[j] and (carregadas[j] is None or not len(carregadas[j])):
+                    lote = next(leitor, None)
+                    if lote is None:
+                        esgotadas[j] = True
+                    else:
+                        carregadas[j] = pa.Table.from_batches([lote])
+            abertas = [t for t in carregadas if t is not None and len(t)]
+            if not abertas:
+                break
+
+            # Limite: a menor "última linha carregada" entre as corridas que ainda têm linhas no disco
+            ultimas = [tuple(x[-1] for x in _ordem(t.slice(len(t) - 1)))
+                       for j, t in enumerate(carregadas) if t is not None and len(t) and not esgotadas[j]]
+            corte = min(ultimas) if ultimas else None
+            partes = []
+            for j, tabela in enumerate(carregadas):
+                if tabela is None or not len(tabela):
+                    continue
+                if corte is None:
+                    partes.append(tabela)
+                    carregadas[j] = None
+                else:
+                    mascara = _ate(tabela, corte)
+                    partes.append(tabela.filter(pa.array(mascara)))
+                    carregadas[j] = tabela.filter(pa.array(~mascara))
+            bloco = _ordenar(pa.concat_tables(partes, promote_options='permissive')).slice(0, restantes).to_pandas()
+            if not len(bloco):
+                continue
+
+            campanha = np.full(len(bloco), f"{nome_campanha_base}_{self.plano.equipes}", dtype=object)
+            if faltam:
+                sorteadas = sorteio.hypergeometric(len(bloco), restantes - len(bloco), faltam) if restantes > len(bloco) else faltam
+                campanha[sorteio.choice(len(bloco), sorteadas, replace=False)] = f"{nome_campanha_base}_convai"
+                faltam -= sorteadas
+            restantes -= len(bloco)
+            bloco = bloco.drop(columns=[COLUNA_CHAVE, COLUNA_POSICAO])
+            bloco['Campanha'] = campanha
+            emitiu = True
+            yield bloco
+
+        if not emitiu:
+            yield pd.DataFrame(columns=list(colunas_saida or []) + ['Campanha'])
+
+
+def _guardando_cpfs(blocos, cpfs: list):
+    """Repassa os blocos da saída, acrescentando a `cpfs` os CPFs (inteiros) de cada um."""
+    for bloco in blocos:
+        coluna = coluna_cpf_da_saida(bloco)
+        if coluna is not None:
+            cpfs.append(cpfs_como_inteiros(bloco[coluna]))
+        yield bloco
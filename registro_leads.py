@@ -0,0 +1,238 @@
+# registro_leads.py
+"""
+Registro dos leads já enviados, para não mandar o mesmo CPF de novo em poucos dias.
+
+O `_post_processamento` só tira os CPFs repetidos dentro da própria saída; a mesma
+pessoa ainda podia sair em campanhas (ou equipes) diferentes na mesma semana. O
+registro é um arquivo SQLite com duas tabelas (além do contador `versao`):
+
+- `envios`: o histórico, uma linha por CPF enviado em cada campanha, com a equipe e a
+  data/hora do envio;
+- `ultimo_envio`: o envio mais recente de cada CPF (chave primária), que é o que o
+  filtro consulta.
+
+Os CPFs são guardados como inteiros. Para filtrar, `RegistroLeads.enviados_desde` lê
+`ultimo_envio` uma vez num vetor ordenado e a pertinência de cada CPF da campanha é uma
+busca binária (`np.searchsorted`), o que vale para milhões de CPFs dos dois lados. O
+vetor fica em memória e só é relido quando o registro muda (o contador `versao` é
+incrementado a cada gravação, por qualquer processo); o processo que relê a tabela
+deixa o vetor num snapshot .npz ao lado do arquivo, que os outros carregam direto.
+"""
+import logging
+import os
+import sqlite3
+import threading
+import time
+from contextlib import closing, contextmanager
+from itertools import chain, repeat
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from constants import ARQUIVO_REGISTRO_LEADS, COL_CPF, COLUNAS_MAPEAMENTO_SAIDA
+from normalizacao import normalizar_cpfs
+
+logger = logging.getLogger(__name__)
+
+SEGUNDOS_POR_DIA = 24 * 3600
+
+_ESQUEMA = """
+CREATE TABLE IF NOT EXISTS envios (
+    cpf INTEGER NOT NULL,
+    campanha TEXT NOT NULL,
+    equipes TEXT,
+    enviado_em REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS envios_enviado_em ON envios (enviado_em);
+CREATE TABLE IF NOT EXISTS ultimo_envio (
+    cpf INTEGER PRIMARY KEY,
+    enviado_em REAL NOT NULL
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS versao (
+    id INTEGER PRIMARY KEY CHECK (id = 0),
+    valor INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO versao (id, valor) VALUES (0, 0);
+"""
+
+
+def cpfs_como_inteiros(cpfs: pd.Series) -> np.ndarray:
+    """CPFs normalizados (ver normalizacao.normalizar_cpfs) como int64; -1 nos que não são CPFs válidos."""
+    numeros = pd.to_numeric(normalizar_cpfs(cpfs), errors='coerce')
+    return np.asarray(numeros.fillna(-1), dtype=np.int64)
+
+
+def coluna_cpf_da_saida(saida: pd.DataFrame) -> Optional[str]:
+    """Nome da coluna de CPF numa saída do filtro (já renomeada para o discador), ou None se não houver."""
+    coluna = COLUNAS_MAPEAMENTO_SAIDA.get(COL_CPF, COL_CPF)
+    return coluna if coluna in saida.columns else None
+
+
+class RegistroLeads:
+    """Registro de envios num arquivo SQLite; cada método abre a sua própria conexão."""
+    def __init__(self, caminho: str = ARQUIVO_REGISTRO_LEADS):
+        self.caminho = caminho
+        with self._conectar() as conexao:
+            conexao.executescript(_ESQUEMA)
+        # Último envio de cada CPF, ordenado por CPF, e a versão do registro lida junto
+        self._cpfs = None
+        self._enviado_em = None
+        self._versao_lida = None
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def _conectar(self):
+        with closing(sqlite3.connect(self.caminho, timeout=30, isolation_level=None)) as conexao:
+            conexao.execute('PRAGMA journal_mode=WAL')
+            # Com WAL, NORMAL ainda não corrompe o arquivo numa queda; só pode perder a última gravação
+            conexao.execute('PRAGMA synchronous=NORMAL')
+            yield conexao
+
+    def registrar(self, cpfs: np.ndarray, campanha: str, equipes: str = None, quando: float = None) -> int:
+        """
+        Grava os CPFs (inteiros, ver cpfs_como_inteiros) como enviados na campanha, em
+        `quando` (segundos desde a época; padrão: agora). Devolve quantos foram gravados.
+        """
+        # Em ordem crescente, as inserções na chave primária seguem a ordem da árvore
+        cpfs = np.unique(np.asarray(cpfs, dtype=np.int64))
+        cpfs = cpfs[cpfs >= 0].tolist()
+        quando = time.time() if quando is None else quando
+        with self._conectar() as conexao:
+            conexao.execute('BEGIN IMMEDIATE')
+            try:
+                anterior = conexao.execute("SELECT valor FROM versao WHERE id = 0").fetchone()[0]
+                conexao.executemany("INSERT INTO envios (cpf, campanha, equipes, enviado_em) VALUES (?, ?, ?, ?)",
+                                    zip(cpfs, repeat(campanha), repeat(equipes), repeat(quando)))
+                conexao.executemany(
+                    "INSERT INTO ultimo_envio (cpf, enviado_em) VALUES (?, ?) "
+                    "ON CONFLICT (cpf) DO UPDATE SET enviado_em = max(enviado_em, excluded.enviado_em)",
+                    zip(cpfs, repeat(quando)))
+                conexao.execute("UPDATE versao SET valor = valor + 1 WHERE id = 0")
+                conexao.execute('COMMIT')
+            except Exception:
+                conexao.execute('ROLLBACK')
+                raise
+        with self._lock:
+            # Com o vetor da versão anterior em memória, a gravação é mesclada nele, sem reler a tabela
+            if self._versao_lida is not None and self._versao_lida == anterior:
+                self._mesclar(np.asarray(cpfs, dtype=np.int64), quando)
+                self._versao_lida = anterior + 1
+                self._gravar_snapshot(self._versao_lida)
+        logger.info("%d CPFs registrados como enviados na campanha %s", len(cpfs), campanha)
+        return len(cpfs)
+
+    def _mesclar(self, cpfs: np.ndarray, quando: float):
+        """Aplica ao vetor em memória o envio de `cpfs` (únicos e em ordem) em `quando`."""
+        posicoes = np.minimum(np.searchsorted(self._cpfs, cpfs), max(len(self._cpfs) - 1, 0))
+        existe = self._cpfs[posicoes] == cpfs if len(self._cpfs) else np.zeros(len(cpfs), dtype=bool)
+        enviado_em = self._enviado_em.copy()
+        enviado_em[posicoes[existe]] = np.maximum(enviado_em[posicoes[existe]], quando)
+        novos = cpfs[~existe]
+        todos = np.concatenate((self._cpfs, novos))
+        ordem = np.argsort(todos, kind='stable')
+        self._cpfs = todos[ordem]
+        self._enviado_em = np.concatenate((enviado_em, np.full(len(novos), quando)))[ordem]
+
+    def registrar_saida(self, saida: pd.DataFrame, campanha: str, equipes: str = None) -> int:
+        """Registra os CPFs de uma saída do filtro (ver coluna_cpf_da_saida)."""
+        coluna = coluna_cpf_da_saida(saida)
+        if coluna is None:
+            return 0
+        return self.registrar(cpfs_como_inteiros(saida[coluna]), campanha, equipes)
+
+    @property
+    def caminho_snapshot(self) -> str:
+        return f"{self.caminho}.ultimo_envio.npz"
+
+    def _ler_snapshot(self, versao: int) -> bool:
+        try:
+            with np.load(self.caminho_snapshot) as dados:
+                if int(dados['versao']) != versao:
+                    return False
+                self._cpfs, self._enviado_em = dados['cpfs'], dados['enviado_em']
+        except (OSError, ValueError, KeyError):
+            return False
+        return True
+
+    def _gravar_snapshot(self, versao: int):
+        # Grava ao lado e renomeia, para nunca deixar um snapshot pela metade
+        temporario = f"{self.caminho_snapshot}.{os.getpid()}.tmp.npz"
+        try:
+            np.savez(temporario, versao=versao, cpfs=self._cpfs, enviado_em=self._enviado_em)
+            os.replace(temporario, self.caminho_snapshot)
+        except OSError as e:
+            logger.warning("Não foi possível gravar o snapshot do registro de leads: %s", e)
+            if os.path.exists(temporario):
+                os.remove(temporario)
+
+    def _carregar(self):
+        """
+        Atualiza o vetor em memória se o registro mudou. Quem lê a tabela grava o vetor num
+        snapshot .npz ao lado do arquivo; os outros processos leem o snapshot da mesma versão.
+        """
+        with self._conectar() as conexao:
+            versao = conexao.execute("SELECT valor FROM versao WHERE id = 0").fetchone()[0]
+            if versao == self._versao_lida or self._ler_snapshot(versao):
+                self._versao_lida = versao
+                return
+            cursor = conexao.execute("SELECT cpf, enviado_em FROM ultimo_envio ORDER BY cpf")
+            # CPFs têm 11 dígitos, então cabem sem perda num float64 junto com as datas
+            dados = np.fromiter(chain.from_iterable(cursor), dtype=np.float64).reshape(-1, 2)
+        self._cpfs = dados[:, 0].astype(np.int64)
+        self._enviado_em = dados[:, 1].copy()
+        self._versao_lida = versao
+        self._gravar_snapshot(versao)
+
+    def _ultimos_envios(self):
+        with self._lock:
+            self._carregar()
+            return self._cpfs, self._enviado_em
+
+    def enviados_desde(self, dias: float, agora: float = None) -> np.ndarray:
+        """CPFs (inteiros, em ordem crescente) enviados nos últimos `dias` dias."""
+        corte = (time.time() if agora is None else agora) - dias * SEGUNDOS_POR_DIA
+        cpfs, enviado_em = self._ultimos_envios()
+        return cpfs[enviado_em >= corte]
+
+    def mascara_enviados(self, cpfs: np.ndarray, dias: float, agora: float = None) -> np.ndarray:
+        """True para os CPFs (inteiros) enviados nos últimos `dias` dias."""
+        corte = (time.time() if agora is None else agora) - dias * SEGUNDOS_POR_DIA
+        registrados, enviado_em = self._ultimos_envios()
+        if not len(registrados) or not len(cpfs):
+            return np.zeros(len(cpfs), dtype=bool)
+        # Busca binária no vetor inteiro, com os CPFs procurados em ordem (acessos à memória
+        # em sequência); a data só é conferida nos CPFs encontrados
+        ordem = np.argsort(cpfs)
+        procurados = np.asarray(cpfs)[ordem]
+        posicoes = np.minimum(np.searchsorted(registrados, procurados), len(registrados) - 1)
+        mascara = np.empty(len(cpfs), dtype=bool)
+        mascara[ordem] = (registrados[posicoes] == procurados) & (enviado_em[posicoes] >= corte)
+        return mascara
+
+    def esquecer_anteriores(self, dias: float, agora: float = None) -> int:
+        """Apaga os envios com mais de `dias` dias (histórico e último envio). Devolve quantos CPFs saíram."""
+        corte = (time.time() if agora is None else agora) - dias * SEGUNDOS_POR_DIA
+        with self._conectar() as conexao:
+            conexao.execute('BEGIN IMMEDIATE')
+            try:
+                conexao.execute("DELETE FROM envios WHERE enviado_em < ?", (corte,))
+                removidos = conexao.execute("DELETE FROM ultimo_envio WHERE enviado_em < ?", (corte,)).rowcount
+                conexao.execute("UPDATE versao SET valor = valor + 1 WHERE id = 0")
+                conexao.execute('COMMIT')
+            except Exception:
+                conexao.execute('ROLLBACK')
+                raise
+        return removidos
+
+
+_registros = {}
+_lock_registros = threading.Lock()
+
+
+def registro_leads(caminho: str = ARQUIVO_REGISTRO_LEADS) -> RegistroLeads:
+    """O RegistroLeads do arquivo, um por processo (o vetor de CPFs em memória é compartilhado)."""
+    with _lock_registros:
+        if caminho not in _registros:
+            _registros[caminho] = RegistroLeads(caminho)
+        return _registros[caminho]
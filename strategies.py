@@ -1,164 +1,293 @@
 # strategies.py
 import pandas as pd
 import numpy as np
-import re
 from abc import ABC, abstractmethod
-from config import AppConfig, BancoConfig
+from config import AppConfig
 from constants import *
+from busca_textual import valores_distintos
+from perfil import Perfil
+from plano_campanha import GrupoBancos, compilar_plano
+
+def para_reais(margem: pd.Series) -> pd.Series:
+    """
+    Converte uma coluna de margem (float64 na base, ver ESQUEMA_ENTRADA) para float64
+    arredondado em centavos. Todo cálculo e comparação em dinheiro deve partir daqui.
+    """
+    return margem.astype('float64').round(2)
+
+def codigos_matricula(df: pd.DataFrame) -> np.ndarray:
+    """
+    Código inteiro de cada matrícula (a mesma matrícula tem sempre o mesmo código; a
+    matrícula nula também ganha o seu). Base para as marcações por matrícula.
+    """
+    return pd.factorize(df[COL_MATRICULA], use_na_sentinel=False)[0]
+
+def matriculas_marcadas(codigos: np.ndarray, linhas: np.ndarray) -> np.ndarray:
+    """
+    Marca, em cada linha, se a sua matrícula aparece em alguma das `linhas` (máscara
+    booleana). Um mapa de bits por código de matrícula substitui o `isin` sobre os textos.
+    """
+    marcados = np.zeros(int(codigos.max()) + 1 if len(codigos) else 0, dtype=bool)
+    marcados[codigos[linhas]] = True
+    return marcados[codigos]
+
+class MotorAtribuicao:
+    """
+    Resolve de uma só vez qual banco atende cada linha: o primeiro banco da lista cuja
+    condição a linha satisfaz vence. As condições de todos os bancos são empilhadas numa
+    matriz (bancos x linhas) e o vencedor é o argmax de cada coluna. Os bancos vêm do
+    plano da campanha, com os padrões das condições já compilados.
+    """
+    def __init__(self, df: pd.DataFrame, bancos: GrupoBancos, perfil: Perfil = None):
+        self.bancos = bancos
+        n = len(df)
+        if self.bancos and n:
+            # Bancos condicionados pela mesma coluna compartilham a fatoração dela
+            distintos = {}
+            for banco in self.bancos.bancos:
+                coluna = banco.coluna_condicional
+                if coluna is not None and coluna not in distintos:
+                    distintos[coluna] = valores_distintos(df[coluna])
+            perfil = perfil or Perfil()
+            condicoes = np.empty((len(self.bancos), n), dtype=bool)
+            for i, banco in enumerate(self.bancos.bancos):
+                with perfil.etapa(f"condição do banco {banco.banco}", banco=banco.banco) as detalhes:
+                    condicoes[i] = banco.mascara(df, distintos.get(banco.coluna_condicional))
+                    # Linhas da base (não só as selecionadas) que satisfazem a condição do banco
+                    detalhes['linhas_condicao'] = int(condicoes[i].sum())
+            primeiro = condicoes.argmax(axis=0)
+            self.atendida = condicoes[primeiro, np.arange(n)]
+            self.indice = np.where(self.atendida, primeiro, -1)
+        else:
+            self.atendida = np.zeros(n, dtype=bool)
+            self.indice = np.full(n, -1)
+
+    def por_banco(self, valores, padrao=np.nan, dtype=float) -> np.ndarray:
+        """
+        Espalha um valor por banco (na ordem de `bancos`) para as linhas atendidas.
+        Linhas sem banco recebem `padrao` (o índice -1 cai na última posição da tabela).
+        """
+        tabela = np.array(list(valores) + [padrao], dtype=dtype)
+        return tabela[self.indice]
 
 class FiltroStrategy(ABC):
-    """Classe base abstrata para todas as estratégias de filtro."""
-    def __init__(self, df: pd.DataFrame, app_config: AppConfig):
+    """
+    Classe base abstrata para todas as estratégias de filtro.
+
+    A estratégia não copia nem altera a base: os filtros só restringem o vetor booleano
+    `selecao` e as colunas calculadas são gravadas em `resultado`, um DataFrame posicional
+    com o mesmo número de linhas da base. Os cálculos são vetoriais sobre todas as
+    linhas; o que está fora da seleção simplesmente é descartado no pós-processamento.
+    Os filtros e as condições dos bancos são registrados em `perfil` (ver perfil.Perfil).
+
+    `app_config` pode ser um AppConfig ou o PlanoCampanha já compilado dele; as regras
+    leem o plano (`self.plano`).
+    """
+    # Coluna de `resultado` pela qual a saída é ordenada (decrescente)
+    coluna_ordenacao: str = None
+
+    def __init__(self, df: pd.DataFrame, app_config: AppConfig, selecao: np.ndarray = None, resultado: pd.DataFrame = None,
+                 perfil: Perfil = None, codigos_matricula: np.ndarray = None):
         self.df = df
-        self.config = app_config
+        self.plano = compilar_plano(app_config)
+        self.config = self.plano.config
+        self.selecao = np.ones(len(df), dtype=bool) if selecao is None else selecao.copy()
+        self.resultado = pd.DataFrame(index=pd.RangeIndex(len(df))) if resultado is None else resultado
+        self.perfil = perfil or Perfil(app_config.campanha)
+        # Códigos das matrículas (ver codigos_matricula); calculados na primeira vez que forem usados
+        self._codigos_matricula = codigos_matricula
 
     @abstractmethod
-    def aplicar_regras_especificas(self) -> pd.DataFrame:
-        """Aplica as regras de cálculo e filtro específicas da campanha."""
+    def aplicar_regras_especificas(self) -> np.ndarray:
+        """
+        Aplica as regras de cálculo e filtro específicas da campanha, gravando as colunas
+        calculadas em `resultado`. Devolve a seleção final de linhas.
+        """
         pass
 
-    def _get_mask(self, banco_cfg: BancoConfig, tratado_col: str):
-        """Cria a máscara de condição para aplicar as regras do banco."""
-        if banco_cfg.coluna_condicional != "Aplicar a toda a base":
-            safe_valor = re.escape(str(banco_cfg.valor_condicional))
-            return (self.df[banco_cfg.coluna_condicional].str.contains(safe_valor, na=False, case=False)) & (~self.df[tratado_col])
-        else:
-            return ~self.df[tratado_col]
+    def _etapa(self, nome: str, **detalhes):
+        """Etapa do perfil contando as linhas da seleção da estratégia."""
+        return self.perfil.etapa(nome, contar=lambda: int(np.count_nonzero(self.selecao)), **detalhes)
+
+    def _motor(self, bancos: GrupoBancos) -> MotorAtribuicao:
+        return MotorAtribuicao(self.df, bancos, self.perfil)
+
+    def _margem(self, coluna: str) -> np.ndarray:
+        """Margem em reais (ver `para_reais`), já tratada pelo FiltroHandler se for o caso."""
+        serie = self.resultado[coluna] if coluna in self.resultado.columns else self.df[coluna]
+        return para_reais(serie).to_numpy()
+
+    def _usou_margem(self, col_disp: str, col_total: str) -> np.ndarray:
+        """
+        Linhas cuja matrícula tem alguma linha selecionada que já usou parte da margem
+        (total - disponível > 0).
+        """
+        if self._codigos_matricula is None:
+            self._codigos_matricula = codigos_matricula(self.df)
+        margem_usada = (self.df[col_total] - self.df[col_disp]).to_numpy()
+        return matriculas_marcadas(self._codigos_matricula, self.selecao & (margem_usada > 0))
+
+    def _margem_livre(self, col_disp: str, col_total: str) -> np.ndarray:
+        """Linhas em que a margem está toda disponível."""
+        return (self.df[col_disp] == self.df[col_total]).to_numpy()
+
+    @staticmethod
+    def _identificacao_banco(motor: MotorAtribuicao):
+        """Colunas de banco e prazo (texto) de cada linha, nulas onde nenhum banco atende."""
+        banco = motor.por_banco(motor.bancos.codigos, dtype=object)
+        prazo = motor.por_banco(motor.bancos.prazos, dtype=object)
+        return banco, prazo
+
+    @staticmethod
+    def _valor_parcela(motor: MotorAtribuicao, valor_liberado: np.ndarray) -> np.ndarray:
+        """Parcela = valor liberado / coeficiente da parcela; 0 para bancos sem coeficiente."""
+        coef_parcela = motor.por_banco(motor.bancos.coeficientes_parcela)
+        tem_coef = motor.por_banco(motor.bancos.tem_coeficiente_parcela, padrao=False, dtype=bool)
+        parcela = np.where(tem_coef, np.round(valor_liberado / coef_parcela, 2), 0.0)
+        return np.where(motor.atendida, parcela, np.nan)
 
 class NovoStrategy(FiltroStrategy):
-    def aplicar_regras_especificas(self) -> pd.DataFrame:
-        self.df['tratado'] = False
-        for config_banco in self.config.bancos_config:
-            mask = self._get_mask(config_banco, 'tratado')
-            
-            margem_a_usar = self.df.loc[mask, COL_MG_EMPRESTIMO_DISP].copy()
-            if config_banco.margem_seguranca:
-                 margem_a_usar *= config_banco.margem_seguranca
-
-            self.df.loc[mask, 'valor_liberado_emprestimo'] = (margem_a_usar * config_banco.coeficiente).round(2)
-            self.df.loc[mask, 'valor_parcela_emprestimo'] = margem_a_usar.round(2)
-            self.df.loc[mask, 'comissao_emprestimo'] = (self.df.loc[mask, 'valor_liberado_emprestimo'] * (config_banco.comissao / 100)).round(2)
-            self.df.loc[mask, 'banco_emprestimo'] = config_banco.banco
-            self.df.loc[mask, 'prazo_emprestimo'] = str(config_banco.parcelas)
-            self.df.loc[mask, 'tratado'] = True
-
-        self.df = self.df.loc[self.df['comissao_emprestimo'] >= self.config.comissao_minima]
-        self.df = self.df.sort_values(by='valor_liberado_emprestimo', ascending=False)
-        return self.df
+    coluna_ordenacao = 'valor_liberado_emprestimo'
+
+    def aplicar_regras_especificas(self) -> np.ndarray:
+        bancos = self.plano.bancos
+        motor = self._motor(bancos)
+
+        margem_a_usar = self._margem(COL_MG_EMPRESTIMO_DISP)
+        margem_a_usar = margem_a_usar * motor.por_banco(bancos.fatores_seguranca)
+        valor_liberado = np.round(margem_a_usar * motor.por_banco(bancos.coeficientes), 2)
+        comissao = np.round(valor_liberado * motor.por_banco(bancos.comissoes), 2)
+
+        self.resultado['valor_liberado_emprestimo'] = valor_liberado
+        self.resultado['valor_parcela_emprestimo'] = np.round(margem_a_usar, 2)
+        self.resultado['comissao_emprestimo'] = comissao
+        self.resultado['banco_emprestimo'], self.resultado['prazo_emprestimo'] = self._identificacao_banco(motor)
+
+        with self._etapa("comissão mínima"):
+            self.selecao &= comissao >= self.plano.comissao_minima
+        return self.selecao
 
 class BeneficioStrategy(FiltroStrategy):
-    def aplicar_regras_especificas(self) -> pd.DataFrame:
-        usou_beneficio = pd.Series(dtype='object')
-        
+    coluna_ordenacao = 'valor_liberado_beneficio'
+
+    def aplicar_regras_especificas(self) -> np.ndarray:
+        usou_beneficio = None
+
         # <<< LÓGICA GOVSP REINTRODUZIDA >>>
-        if self.config.convenio == 'govsp':
-            self.df['margem_beneficio_usado'] = self.df[COL_MG_BENEFICIO_SAQUE_TOTAL] - self.df[COL_MG_BENEFICIO_SAQUE_DISP]
-            usou_beneficio = self.df.loc[self.df['margem_beneficio_usado'] > 0]
-            self.df = self.df.loc[self.df[COL_MG_BENEFICIO_SAQUE_DISP] == self.df[COL_MG_BENEFICIO_SAQUE_TOTAL]]
-
-        conv_excluidos = ['prefrj', 'govpi', 'goval', 'govce']
-        if self.config.convenio not in conv_excluidos and self.config.convenio != 'govsp':
-            self.df = self.df.loc[self.df[COL_MG_BENEFICIO_SAQUE_DISP] == self.df[COL_MG_BENEFICIO_SAQUE_TOTAL]]
-
-        self.df['tratado'] = False
-        
-        for config_banco in self.config.bancos_config:
-            mask = self._get_mask(config_banco, 'tratado')
-            
-            eff_coef = config_banco.coeficiente * (config_banco.margem_seguranca or 1.0)
-            
-            self.df.loc[mask, 'valor_liberado_beneficio'] = (self.df.loc[mask, COL_MG_BENEFICIO_SAQUE_DISP] * eff_coef).round(2)
-            
-            # <<< VALIDAÇÃO GOVSP REINTRODUZIDA >>>
-            if self.config.convenio == 'govsp' and not usou_beneficio.empty:
-                self.df.loc[(self.df['valor_liberado_beneficio'] > 0) & (self.df[COL_MATRICULA].isin(usou_beneficio[COL_MATRICULA])), 'valor_liberado_beneficio'] = 0
-
-            self.df.loc[mask, 'valor_parcela_beneficio'] = (self.df['valor_liberado_beneficio'] / config_banco.coeficiente_parcela).round(2) if config_banco.coeficiente_parcela else 0
-            self.df.loc[mask, 'comissao_beneficio'] = (self.df['valor_liberado_beneficio'] * (config_banco.comissao / 100)).round(2)
-            self.df.loc[mask, 'banco_beneficio'] = config_banco.banco
-            self.df.loc[mask, 'prazo_beneficio'] = str(config_banco.parcelas)
-            self.df.loc[mask, 'tratado'] = True
-
-        self.df = self.df.loc[self.df['comissao_beneficio'] >= self.config.comissao_minima]
-        self.df = self.df.sort_values(by='valor_liberado_beneficio', ascending=False)
-        return self.df
+        if self.plano.govsp:
+            usou_beneficio = self._usou_margem(COL_MG_BENEFICIO_SAQUE_DISP, COL_MG_BENEFICIO_SAQUE_TOTAL)
+
+        # Fora dos convênios de CONVENIOS_SEM_MARGEM_BENEFICIO_LIVRE (o GOVSP incluso)
+        if self.plano.margem_beneficio_livre:
+            with self._etapa("margem de benefício livre"):
+                self.selecao &= self._margem_livre(COL_MG_BENEFICIO_SAQUE_DISP, COL_MG_BENEFICIO_SAQUE_TOTAL)
+
+        bancos = self.plano.bancos
+        motor = self._motor(bancos)
+
+        eff_coef = motor.por_banco(bancos.coeficientes_efetivos)
+        valor_liberado = np.round(self._margem(COL_MG_BENEFICIO_SAQUE_DISP) * eff_coef, 2)
+
+        # <<< VALIDAÇÃO GOVSP REINTRODUZIDA >>>
+        if usou_beneficio is not None:
+            valor_liberado[(valor_liberado > 0) & usou_beneficio] = 0
+        comissao = np.round(valor_liberado * motor.por_banco(bancos.comissoes), 2)
+
+        self.resultado['valor_liberado_beneficio'] = valor_liberado
+        self.resultado['valor_parcela_beneficio'] = self._valor_parcela(motor, valor_liberado)
+        self.resultado['comissao_beneficio'] = comissao
+        self.resultado['banco_beneficio'], self.resultado['prazo_beneficio'] = self._identificacao_banco(motor)
+
+        with self._etapa("comissão mínima"):
+            self.selecao &= comissao >= self.plano.comissao_minima
+        return self.selecao
 
 
 class CartaoStrategy(FiltroStrategy):
-    def aplicar_regras_especificas(self) -> pd.DataFrame:
-        usou_cartao = pd.Series(dtype='object')
+    coluna_ordenacao = 'valor_liberado_cartao'
+
+    def aplicar_regras_especificas(self) -> np.ndarray:
+        usou_cartao = None
 
         # <<< LÓGICA GOVSP REINTRODUZIDA >>>
-        if self.config.convenio == 'govsp':
-            self.df['margem_cartao_usada'] = self.df[COL_MG_CARTAO_TOTAL] - self.df[COL_MG_CARTAO_DISP]
-            usou_cartao = self.df.loc[self.df['margem_cartao_usada'] > 0]
-        
-        self.df = self.df.loc[self.df[COL_MG_CARTAO_DISP] == self.df[COL_MG_CARTAO_TOTAL]]
-
-        self.df['tratado'] = False
-        for config_banco in self.config.bancos_config:
-            mask = self._get_mask(config_banco, 'tratado')
-            self.df.loc[mask, 'valor_liberado_cartao'] = (self.df.loc[mask, COL_MG_CARTAO_DISP] * config_banco.coeficiente).round(2)
-
-            # <<< VALIDAÇÃO GOVSP REINTRODUZIDA >>>
-            if self.config.convenio == 'govsp' and not usou_cartao.empty:
-                self.df.loc[(self.df['valor_liberado_cartao'] > 0) & (self.df[COL_MATRICULA].isin(usou_cartao[COL_MATRICULA])), 'valor_liberado_cartao'] = 0
-
-            self.df.loc[mask, 'valor_parcela_cartao'] = (self.df['valor_liberado_cartao'] / config_banco.coeficiente_parcela).round(2) if config_banco.coeficiente_parcela else 0
-            self.df.loc[mask, 'comissao_cartao'] = (self.df['valor_liberado_cartao'] * (config_banco.comissao / 100)).round(2)
-            self.df.loc[mask, 'banco_cartao'] = config_banco.banco
-            self.df.loc[mask, 'prazo_cartao'] = str(config_banco.parcelas)
-            self.df.loc[mask, 'tratado'] = True
-            
-        self.df = self.df.loc[self.df['comissao_cartao'] >= self.config.comissao_minima]
-        self.df = self.df.sort_values(by='valor_liberado_cartao', ascending=False)
-        return self.df
+        if self.plano.govsp:
+            usou_cartao = self._usou_margem(COL_MG_CARTAO_DISP, COL_MG_CARTAO_TOTAL)
+
+        with self._etapa("margem de cartão livre"):
+            self.selecao &= self._margem_livre(COL_MG_CARTAO_DISP, COL_MG_CARTAO_TOTAL)
+
+        bancos = self.plano.bancos
+        motor = self._motor(bancos)
+
+        valor_liberado = np.round(self._margem(COL_MG_CARTAO_DISP) * motor.por_banco(bancos.coeficientes), 2)
+
+        # <<< VALIDAÇÃO GOVSP REINTRODUZIDA >>>
+        if usou_cartao is not None:
+            valor_liberado[(valor_liberado > 0) & usou_cartao] = 0
+        comissao = np.round(valor_liberado * motor.por_banco(bancos.comissoes), 2)
+
+        self.resultado['valor_liberado_cartao'] = valor_liberado
+        self.resultado['valor_parcela_cartao'] = self._valor_parcela(motor, valor_liberado)
+        self.resultado['comissao_cartao'] = comissao
+        self.resultado['banco_cartao'], self.resultado['prazo_cartao'] = self._identificacao_banco(motor)
+
+        with self._etapa("comissão mínima"):
+            self.selecao &= comissao >= self.plano.comissao_minima
+        return self.selecao
 
 class BeneficioECartaoStrategy(FiltroStrategy):
-    def aplicar_regras_especificas(self) -> pd.DataFrame:
-        usou_beneficio = pd.Series(dtype='object')
-        usou_cartao = pd.Series(dtype='object')
+    coluna_ordenacao = 'comissao_total'
+
+    def aplicar_regras_especificas(self) -> np.ndarray:
+        usou_beneficio = None
+        usou_cartao = None
 
         # <<< LÓGICA GOVSP REINTRODUZIDA >>>
-        if self.config.convenio == 'govsp':
-            self.df['margem_beneficio_usado'] = self.df[COL_MG_BENEFICIO_SAQUE_TOTAL] - self.df[COL_MG_BENEFICIO_SAQUE_DISP]
-            usou_beneficio = self.df.loc[self.df['margem_beneficio_usado'] > 0]
-            
-            self.df['margem_cartao_usada'] = self.df[COL_MG_CARTAO_TOTAL] - self.df[COL_MG_CARTAO_DISP]
-            usou_cartao = self.df.loc[self.df['margem_cartao_usada'] > 0]
-
-        self.df['tratado_beneficio'] = False
-        self.df['tratado_cartao'] = False
-        self.df['valor_liberado_beneficio'] = 0.0
-        self.df['valor_liberado_cartao'] = 0.0
-        self.df['comissao_beneficio'] = 0.0
-        self.df['comissao_cartao'] = 0.0
-        
-        for config_banco in self.config.bancos_config:
-            if config_banco.cartao_escolhido == 'Benefício':
-                mask = self._get_mask(config_banco, 'tratado_beneficio')
-                # Adicionar lógica de cálculo para benefício aqui
-                self.df.loc[mask & (self.df[COL_MG_BENEFICIO_SAQUE_DISP] == self.df[COL_MG_BENEFICIO_SAQUE_TOTAL]), 'valor_liberado_beneficio'] = (self.df[COL_MG_BENEFICIO_SAQUE_DISP] * config_banco.coeficiente).round(2)
-                
-                # <<< VALIDAÇÃO GOVSP REINTRODUZIDA >>>
-                if self.config.convenio == 'govsp' and not usou_beneficio.empty:
-                    self.df.loc[self.df[COL_MATRICULA].isin(usou_beneficio[COL_MATRICULA]), 'valor_liberado_beneficio'] = 0
-
-                self.df.loc[mask, 'comissao_beneficio'] = (self.df['valor_liberado_beneficio'] * (config_banco.comissao / 100)).round(2)
-                self.df.loc[mask, 'tratado_beneficio'] = True
-
-            elif config_banco.cartao_escolhido == 'Consignado':
-                mask = self._get_mask(config_banc, 'tratado_cartao')
-                self.df.loc[mask & (self.df[COL_MG_CARTAO_DISP] == self.df[COL_MG_CARTAO_TOTAL]), 'valor_liberado_cartao'] = (self.df[COL_MG_CARTAO_DISP] * config_banco.coeficiente).round(2)
-                
-                # <<< VALIDAÇÃO GOVSP REINTRODUZIDA >>>
-                if self.config.convenio == 'govsp' and not usou_cartao.empty:
-                    self.df.loc[self.df[COL_MATRICULA].isin(usou_cartao[COL_MATRICULA]), 'valor_liberado_cartao'] = 0
-                
-                self.df.loc[mask, 'comissao_cartao'] = (self.df['valor_liberado_cartao'] * (config_banco.comissao / 100)).round(2)
-                self.df.loc[mask, 'tratado_cartao'] = True
-        
-        self.df['comissao_total'] = self.df['comissao_beneficio'] + self.df['comissao_cartao']
-        self.df = self.df.loc[self.df['comissao_total'] >= self.config.comissao_minima]
-        self.df = self.df.sort_values(by='comissao_total', ascending=False)
-        return self.df
+        if self.plano.govsp:
+            usou_beneficio = self._usou_margem(COL_MG_BENEFICIO_SAQUE_DISP, COL_MG_BENEFICIO_SAQUE_TOTAL)
+            usou_cartao = self._usou_margem(COL_MG_CARTAO_DISP, COL_MG_CARTAO_TOTAL)
+
+        valor_beneficio, comissao_beneficio = self._produto(
+            'Benefício', COL_MG_BENEFICIO_SAQUE_DISP, COL_MG_BENEFICIO_SAQUE_TOTAL, usou_beneficio)
+        valor_cartao, comissao_cartao = self._produto(
+            'Consignado', COL_MG_CARTAO_DISP, COL_MG_CARTAO_TOTAL, usou_cartao)
+        comissao_total = comissao_beneficio + comissao_cartao
+
+        self.resultado['valor_liberado_beneficio'] = valor_beneficio
+        self.resultado['valor_liberado_cartao'] = valor_cartao
+        self.resultado['comissao_beneficio'] = comissao_beneficio
+        self.resultado['comissao_cartao'] = comissao_cartao
+        self.resultado['comissao_total'] = comissao_total
+
+        with self._etapa("comissão mínima"):
+            self.selecao &= comissao_total >= self.plano.comissao_minima
+        return self.selecao
+
+    def _produto(self, cartao_escolhido: str, col_disp: str, col_total: str, usou: np.ndarray = None):
+        """
+        Valor liberado e comissão de um dos cartões, considerando só os bancos configurados
+        para ele. Só libera valor quando a margem está toda disponível; linhas sem banco ficam com 0.
+        """
+        bancos = self.plano.bancos_do_cartao(cartao_escolhido)
+        motor = self._motor(bancos)
+
+        valor_liberado = np.where(
+            motor.atendida & self._margem_livre(col_disp, col_total),
+            np.round(self._margem(col_disp) * motor.por_banco(bancos.coeficientes), 2),
+            0.0,
+        )
+
+        # <<< VALIDAÇÃO GOVSP REINTRODUZIDA >>>
+        if bancos and usou is not None:
+            valor_liberado[usou] = 0
+
+        comissao = np.where(motor.atendida, np.round(valor_liberado * motor.por_banco(bancos.comissoes), 2), 0.0)
+        return valor_liberado, comissao
+
+# Mapeamento de estratégias para o tipo de campanha
+STRATEGY_MAPEAMENTO = {
+    'Novo': NovoStrategy,
+    'Benefício': BeneficioStrategy,
+    'Cartão': CartaoStrategy,
+    'Benefício & Cartão': BeneficioECartaoStrategy,
+}
@@ -0,0 +1,53 @@
+# tests/conftest.py
+import dataclasses
+import datetime
+import os
+import sys
+
+import pytest
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+sys.path.insert(0, os.path.join(RAIZ, 'benchmarks'))
+
+from config import AppConfig, BancoConfig  # noqa: E402
+from gerar_base_sintetica import gerar_csv  # noqa: E402
+from juntar_bases import juntar_bases  # noqa: E402
+
+
+def configuracao(campanha: str, convenio: str) -> AppConfig:
+    """Configuração fixa dos testes: dois bancos (um condicional ao vínculo), idade e exclusões ligadas."""
+    bancos = [
+        BancoConfig(banco='318', coeficiente=20.5, comissao=10.0, parcelas=96,
+                    coluna_condicional='Vinculo_Servidor', valor_condicional='EFETIVO',
+                    coeficiente_parcela=0.045, cartao_escolhido='Benefício'),
+        BancoConfig(banco='33', coeficiente=18.0, comissao=7.5, parcelas=84,
+                    coluna_condicional='Aplicar a toda a base', valor_condicional=None,
+                    margem_seguranca=0.95, cartao_escolhido='Consignado'),
+    ]
+    return AppConfig(
+        campanha=campanha, convenio=convenio, comissao_minima=10.0, margem_emprestimo_limite=0.0,
+        data_limite=datetime.date(1953, 1, 1), selecao_lotacao=['LOTACAO 00'], selecao_vinculos=['TEMPORARIO'],
+        selecao_secretaria=[], equipes='outbound', convai=10.0, bancos_config=bancos,
+    )
+
+
+def variacoes(config: AppConfig) -> dict:
+    """A configuração e variações que ligam ou desligam cada filtro global."""
+    return {
+        'padrão': config,
+        'sem idade e exclusões': dataclasses.replace(config, data_limite=None, selecao_lotacao=[], selecao_vinculos=[]),
+        'margem mínima e secretaria': dataclasses.replace(config, margem_emprestimo_limite=150.0,
+                                                          selecao_secretaria=['SECRETARIA 1']),
+    }
+
+
+@pytest.fixture
+def arquivo_base(tmp_path):
+    """CSV sintético pequeno do GOVSP, no formato de entrada do app."""
+    return gerar_csv(str(tmp_path / 'base.csv'), 3_000, 'govsp', taxa_cpf_duplicado=0.05)
+
+
+@pytest.fixture
+def base(arquivo_base):
+    return juntar_bases([arquivo_base])
@@ -0,0 +1,49 @@
+# tests/test_cache_bases.py
+import os
+
+import pytest
+
+from cache_bases import limpar_cache
+from juntar_bases import juntar_bases
+
+listdir = os.listdir
+remove = os.remove
+
+
+@pytest.fixture
+def diretorio_cache(tmp_path):
+    diretorio = tmp_path / 'cache'
+    diretorio.mkdir()
+    # Do mais antigo para o mais novo, 100 bytes cada
+    for i, nome in enumerate(['a', 'b', 'c']):
+        caminho = diretorio / f'{nome}.feather'
+        caminho.write_bytes(b'x' * 100)
+        os.utime(caminho, (1_000 + i, 1_000 + i))
+    return diretorio
+
+
+def test_arquivo_removido_por_outro_processo_antes_do_stat(diretorio_cache, monkeypatch):
+    monkeypatch.setattr(os, 'listdir', lambda diretorio: listdir(diretorio) + ['sumiu.feather'])
+    limpar_cache(str(diretorio_cache), limite_bytes=150)
+    assert listdir(diretorio_cache) == ['c.feather']
+
+
+def test_arquivo_removido_por_outro_processo_antes_do_remove(diretorio_cache, monkeypatch):
+    def remover_antes(caminho):
+        # Outro processo chega primeiro ao arquivo mais antigo
+        remove(caminho)
+        if caminho.endswith('a.feather'):
+            raise FileNotFoundError(caminho)
+
+    monkeypatch.setattr(os, 'remove', remover_antes)
+    limpar_cache(str(diretorio_cache), limite_bytes=150)
+    # O espaço do arquivo removido pelo outro processo conta: só mais um sai
+    assert sorted(listdir(diretorio_cache)) == ['c.feather']
+
+
+def test_leitura_nao_falha_com_limpeza_concorrente(arquivo_base, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(os, 'listdir', lambda diretorio: listdir(diretorio) + ['sumiu.feather'])
+    avisos = []
+    base = juntar_bases([arquivo_base], usar_cache=True, notificar=lambda nivel, mensagem: avisos.append(mensagem))
+    assert not avisos and len(base) == 3_000
@@ -0,0 +1,95 @@
+# tests/test_cache_etapas.py
+import dataclasses
+import datetime
+import gc
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from constants import ATTR_CARGA_BASE
+from filter_handler import FiltroHandler, limpar_cache_etapas
+from juntar_bases import carga_da_base, marcar_carga
+from strategies import NovoStrategy
+
+from conftest import configuracao
+
+
+@pytest.fixture
+def base_marcada(base):
+    limpar_cache_etapas()
+    yield marcar_carga(base)
+    limpar_cache_etapas()
+
+
+def _rodar(base, config, memorizar=True):
+    handler = FiltroHandler(base, config, NovoStrategy, memorizar=memorizar)
+    saida = handler.processar()
+    do_cache = any(registro.get('cache') for registro in handler.relatorio)
+    return saida, do_cache
+
+
+def _com_coeficiente(config, coeficiente):
+    primeiro = dataclasses.replace(config.bancos_config[0], coeficiente=coeficiente)
+    return dataclasses.replace(config, bancos_config=[primeiro] + config.bancos_config[1:])
+
+
+def test_so_os_bancos_mudam_reaproveita_o_pre_processamento(base_marcada):
+    config = configuracao('Novo', 'govsp')
+    _, do_cache = _rodar(base_marcada, config)
+    assert not do_cache
+
+    outra = _com_coeficiente(config, 25.0)
+    saida, do_cache = _rodar(base_marcada, outra)
+    assert do_cache
+    pd.testing.assert_frame_equal(saida, _rodar(base_marcada, outra, memorizar=False)[0])
+
+
+@pytest.mark.parametrize('mudanca', [
+    {'selecao_lotacao': ['LOTACAO 01']},
+    {'selecao_vinculos': []},
+    {'selecao_secretaria': ['SECRETARIA 02']},
+    {'data_limite': datetime.date(1970, 1, 1)},
+    {'margem_emprestimo_limite': 100.0},
+])
+def test_filtros_globais_mudam_e_o_cache_nao_vale(base_marcada, mudanca):
+    config = configuracao('Novo', 'govsp')
+    _rodar(base_marcada, config)
+
+    outra = dataclasses.replace(config, **mudanca)
+    saida, do_cache = _rodar(base_marcada, outra)
+    assert not do_cache
+    pd.testing.assert_frame_equal(saida, _rodar(base_marcada, outra, memorizar=False)[0])
+
+
+def test_bases_derivadas_nao_usam_o_cache_da_original(base_marcada):
+    config = configuracao('Novo', 'govsp')
+    _rodar(base_marcada, config)
+    carga = carga_da_base(base_marcada)
+
+    # Mesmo attrs e mesmo número de linhas, mas outras linhas em cada posição
+    invertida = base_marcada.iloc[::-1].reset_index(drop=True)
+    saida, do_cache = _rodar(invertida, config)
+    assert not do_cache and ATTR_CARGA_BASE not in invertida.attrs
+    pd.testing.assert_frame_equal(saida, _rodar(invertida, config, memorizar=False)[0])
+
+    # A original continua marcada e com as etapas no cache
+    assert carga_da_base(base_marcada) == carga
+    assert _rodar(base_marcada, config)[1]
+
+
+def test_carga_de_base_liberada_nao_e_reaproveitada(base):
+    limpar_cache_etapas()
+    config = configuracao('Novo', 'govsp')
+    original = marcar_carga(base.copy())
+    _rodar(original, config)
+
+    # Uma cópia com o attrs da original, depois que ela foi liberada (o id pode ser reaproveitado)
+    copia = original.copy()
+    copia['MG_Emprestimo_Disponivel'] = np.float64(0.0)
+    del original
+    gc.collect()
+    saida, do_cache = _rodar(copia, config)
+    assert not do_cache and carga_da_base(copia) is None
+    pd.testing.assert_frame_equal(saida, _rodar(copia, config, memorizar=False)[0])
+    limpar_cache_etapas()
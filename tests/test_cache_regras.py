@@ -0,0 +1,81 @@
+# tests/test_cache_regras.py
+import pytest
+
+from db_utils import CacheRegras, carregar_regras_da_bd, chave_produto
+
+mongomock = pytest.importorskip('mongomock')
+
+
+class Relogio:
+    """Relógio controlado pelo teste, no lugar de time.monotonic."""
+    def __init__(self):
+        self.agora = 0.0
+
+    def __call__(self):
+        return self.agora
+
+
+class ColecaoFora:
+    """Coleção de um servidor inacessível: toda leitura falha."""
+    def find(self, *args, **kwargs):
+        raise ConnectionError("servidor fora do ar")
+
+
+@pytest.fixture
+def colecao():
+    colecao = mongomock.MongoClient().growth.covenant_restrictions
+    colecao.insert_many([
+        {'convenio': 'govsp', 'produto': 'novo', 'lotacoes': ['ALESP'], 'vinculos': [], 'secretarias': []},
+        {'convenio': 'govsp', 'produto': 'benefício_cartão', 'lotacoes': [], 'vinculos': ['TEMPORARIO'],
+         'secretarias': []},
+        {'convenio': 'govmt', 'produto': 'novo', 'lotacoes': ['LOTACAO 001'], 'vinculos': [], 'secretarias': []},
+    ])
+    return colecao
+
+
+def test_snapshot_atende_sem_conexao(colecao, tmp_path):
+    snapshot = str(tmp_path / 'regras.json')
+    conectado = CacheRegras(colecao, caminho_snapshot=snapshot)
+    regra = conectado.obter('govsp', 'novo')
+    assert conectado.origem == 'mongodb' and regra['lotacoes'] == ['ALESP']
+
+    # Ainda sem coleção (conectando) e com a leitura falhando, vale a cópia local
+    for fonte in (None, ColecaoFora()):
+        desconectado = CacheRegras(fonte, caminho_snapshot=snapshot)
+        assert desconectado.obter('govsp', 'novo') == regra
+        assert desconectado.origem == 'snapshot'
+
+    # Sem snapshot nem conexão, não há regras
+    vazio = CacheRegras(caminho_snapshot=str(tmp_path / 'inexistente.json'))
+    assert vazio.obter('govsp', 'novo') == {} and vazio.origem is None
+
+
+def test_ttl_vencido_rele_a_colecao(colecao):
+    relogio = Relogio()
+    cache = CacheRegras(colecao, ttl=60, relogio=relogio)
+    assert cache.obter('govsp', 'novo')['lotacoes'] == ['ALESP']
+
+    colecao.update_one({'convenio': 'govsp', 'produto': 'novo'}, {'$set': {'lotacoes': ['LOTACAO 002']}})
+    relogio.agora = 59
+    assert cache.obter('govsp', 'novo')['lotacoes'] == ['ALESP']
+    relogio.agora = 60
+    assert cache.obter('govsp', 'novo')['lotacoes'] == ['LOTACAO 002']
+
+
+def test_regra_devolvida_e_uma_copia(colecao):
+    cache = CacheRegras(colecao)
+    cache.obter('govsp', 'novo')['lotacoes'] = []
+    assert cache.obter('govsp', 'novo')['lotacoes'] == ['ALESP']
+
+
+def test_chaves_separadas_por_convenio_e_produto(colecao):
+    assert chave_produto('Novo') == 'novo'
+    assert chave_produto('Benefício & Cartão') == 'benefício_cartão'
+
+    cache = CacheRegras(colecao)
+    assert carregar_regras_da_bd(cache, 'govsp', 'Novo')['lotacoes'] == ['ALESP']
+    assert carregar_regras_da_bd(cache, 'govmt', 'Novo')['lotacoes'] == ['LOTACAO 001']
+    assert carregar_regras_da_bd(cache, 'govsp', 'Benefício & Cartão')['vinculos'] == ['TEMPORARIO']
+    # Produto sem regra no convênio (ou convênio sem regras): nada é herdado de outra chave
+    assert carregar_regras_da_bd(cache, 'govmt', 'Benefício & Cartão') == {}
+    assert carregar_regras_da_bd(cache, 'prefsp', 'Novo') == {}
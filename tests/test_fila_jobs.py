@@ -0,0 +1,75 @@
+# tests/test_fila_jobs.py
+import multiprocessing
+import os
+import time
+
+import pandas as pd
+import pytest
+
+from constants import ATTR_CHAVES_ARQUIVOS, DIRETORIO_CACHE_BASES
+from fila_jobs import CONCLUIDO, ERRO, FilaJobs, _executar_job, iniciar_trabalhadores
+from filter_handler import FiltroHandler
+from juntar_bases import juntar_bases
+from strategies import NovoStrategy
+
+from conftest import configuracao
+
+
+@pytest.fixture
+def no_diretorio_temporario(tmp_path, monkeypatch):
+    # O cache de bases fica no diretório de trabalho
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+def _arquivos_no_cache():
+    return sorted(os.listdir(DIRETORIO_CACHE_BASES)) if os.path.isdir(DIRETORIO_CACHE_BASES) else []
+
+
+def test_envio_nao_grava_outra_copia_da_base(no_diretorio_temporario, arquivo_base):
+    base = juntar_bases([arquivo_base], usar_cache=True)
+    no_cache = _arquivos_no_cache()
+    assert len(no_cache) == 1 and base.attrs[ATTR_CHAVES_ARQUIVOS]
+
+    fila = FilaJobs(str(no_diretorio_temporario / 'fila.sqlite3'))
+    config = configuracao('Novo', 'govsp')
+    id_job = fila.enviar(base, config, 'CSV', 'saida')
+    assert _arquivos_no_cache() == no_cache
+
+    # O trabalhador remonta a base dos arquivos no cache e chega à mesma saída
+    _executar_job(fila, fila.pegar_proximo(), {})
+    job = fila.status(id_job)
+    assert job['estado'] == CONCLUIDO
+    esperada = FiltroHandler(base, config, NovoStrategy, memorizar=False).processar()
+    assert job['linhas'] == len(esperada)
+    previa = pd.read_parquet(job['previa'])
+    assert previa['CPF'].tolist() == esperada['CPF'].head(len(previa)).tolist()
+
+
+def test_base_sem_cache_e_gravada_uma_vez(no_diretorio_temporario, base):
+    fila = FilaJobs(str(no_diretorio_temporario / 'fila.sqlite3'))
+    config = configuracao('Novo', 'govsp')
+    fila.enviar(base, config, 'CSV', 'a')
+    fila.enviar(base, config, 'CSV', 'b')
+    assert len(_arquivos_no_cache()) == 1
+
+
+def test_trabalhador_criado_com_spawn_conclui_o_job(no_diretorio_temporario, arquivo_base):
+    base = juntar_bases([arquivo_base], usar_cache=True)
+    fila = FilaJobs(str(no_diretorio_temporario / 'fila.sqlite3'))
+    id_job = fila.enviar(base, configuracao('Novo', 'govsp'), 'CSV', 'saida')
+
+    processos = iniciar_trabalhadores(fila, 1)
+    try:
+        # Sem fork: o trabalhador não herda as threads (nem os locks) do servidor
+        assert all(isinstance(p, multiprocessing.get_context('spawn').Process) for p in processos)
+        limite = time.monotonic() + 120
+        while fila.status(id_job)['estado'] not in (CONCLUIDO, ERRO) and time.monotonic() < limite:
+            time.sleep(0.2)
+        job = fila.status(id_job)
+        assert job['estado'] == CONCLUIDO, job.get('erro')
+        assert os.path.exists(job['arquivo'])
+    finally:
+        for processo in processos:
+            processo.terminate()
+            processo.join()
@@ -0,0 +1,39 @@
+# tests/test_margens.py
+import numpy as np
+import pandas as pd
+
+from filter_handler import FiltroHandler
+from gerar_base_sintetica import gerar_base
+from juntar_bases import juntar_bases
+from strategies import NovoStrategy, para_reais
+
+from conftest import configuracao
+
+
+def test_para_reais_mantem_centavos_de_margens_altas():
+    margens = pd.Series([150000.37, 131072.01, 9_999_999.99, 0.01])
+    assert para_reais(margens).tolist() == [150000.37, 131072.01, 9_999_999.99, 0.01]
+
+
+def test_margens_altas_chegam_exatas_na_saida(tmp_path):
+    dados = gerar_base(200, 'govsp', seed=7)
+    dados['MG_Emprestimo_Total'] = 200000.0
+    dados['MG_Emprestimo_Disponivel'] = 150000.37
+    caminho = tmp_path / 'base.csv'
+    dados.to_csv(caminho, index=False)
+
+    base = juntar_bases([str(caminho)])
+    assert base['MG_Emprestimo_Disponivel'].dtype == np.float64
+    assert (base['MG_Emprestimo_Disponivel'] == 150000.37).all()
+
+    # A saída é a mesma de uma leitura sem o esquema compacto (margens em float64)
+    referencia = pd.read_csv(caminho, dtype={coluna: str for coluna in dados.columns if not coluna.startswith('MG_')})
+    config = configuracao('Novo', 'govsp')
+    saida = FiltroHandler(base, config, NovoStrategy, memorizar=False).processar()
+    esperada = FiltroHandler(referencia, config, NovoStrategy, memorizar=False).processar()
+    assert len(saida) > 0
+    assert (pd.to_numeric(saida['Mg_Emprestimo_Disponivel']) == 150000.37).all()
+    colunas_dinheiro = [c for c in saida.columns if c.startswith(('valor_liberado_', 'comissao_'))]
+    assert colunas_dinheiro
+    pd.testing.assert_frame_equal(saida[colunas_dinheiro].reset_index(drop=True),
+                                  esperada[colunas_dinheiro].reset_index(drop=True))
@@ -0,0 +1,51 @@
+# tests/test_normalizacao.py
+import logging
+
+import numpy as np
+import pandas as pd
+
+from filter_handler import FiltroHandler
+from juntar_bases import juntar_bases
+from normalizacao import converter_datas
+from strategies import NovoStrategy
+
+from conftest import configuracao
+
+
+def _datas(*textos) -> list:
+    serie = pd.Series(textos, dtype='string[pyarrow]')
+    return [None if np.isnat(data) else str(data)[:10] for data in converter_datas(serie)]
+
+
+def test_formatos_aceitos_e_misturados():
+    assert _datas('03/05/1960', '1960-05-03', None, '', '31/02/1960', '3/5/1960') == \
+        ['1960-05-03', '1960-05-03', None, None, None, '1960-05-03']
+
+
+def test_outros_formatos_caem_para_o_parser_do_pandas():
+    # Os mesmos valores que o pd.to_datetime(dayfirst=True) de antes convertia
+    assert _datas('1960-05-03 00:00:00', '03-05-1960', '03.05.1960', '03/05/1960 10:30') == \
+        ['1960-05-03'] * 4
+    assert _datas('03/05/60') == [str(pd.to_datetime('03/05/60', dayfirst=True).date())]
+
+
+def test_aviso_com_muitas_datas_invalidas(caplog):
+    with caplog.at_level(logging.WARNING, logger='normalizacao'):
+        _datas(*(['03/05/1960'] * 99 + ['sem data']))
+    assert not caplog.records
+    with caplog.at_level(logging.WARNING, logger='normalizacao'):
+        _datas(*(['03/05/1960'] * 90 + ['sem data'] * 10 + [''] * 50))
+    assert len(caplog.records) == 1 and "10 de" in caplog.text and "'sem data'" in caplog.text
+
+
+def test_filtro_de_idade_com_outro_layout_de_data(arquivo_base, base, tmp_path):
+    dados = pd.read_csv(arquivo_base, dtype=str)
+    datas = pd.to_datetime(dados['Data_Nascimento'], format='%d/%m/%Y')
+    dados['Data_Nascimento'] = datas.dt.strftime('%d-%m-%Y')
+    outra = tmp_path / 'outro_layout.csv'
+    dados.to_csv(outra, index=False)
+
+    config = configuracao('Novo', 'govsp')
+    esperada = FiltroHandler(base, config, NovoStrategy, memorizar=False).processar()
+    saida = FiltroHandler(juntar_bases([str(outra)]), config, NovoStrategy, memorizar=False).processar()
+    assert len(esperada) and saida['CPF'].tolist() == esperada['CPF'].tolist()
@@ -0,0 +1,43 @@
+# tests/test_paralelo.py
+"""
+A execução particionada em vários processos dá exatamente a mesma saída que a serial,
+para cada estratégia e variação da configuração (ver benchmarks/bench_paralelo.py, que
+mede também o tempo).
+"""
+import pandas as pd
+import pytest
+
+import filter_handler
+from filter_handler import FiltroHandler
+from gerar_base_sintetica import gerar_base
+from juntar_bases import juntar_bases
+from strategies import STRATEGY_MAPEAMENTO
+
+from conftest import configuracao, variacoes
+
+
+@pytest.fixture(scope='module', params=['govsp', 'prefsp'])
+def base_do_convenio(request, tmp_path_factory):
+    # Poucas matrículas: várias linhas por matrícula, que precisam ficar na mesma partição
+    dados = gerar_base(4_000, request.param, taxa_cpf_duplicado=0.05, faixa_matriculas=2_500)
+    caminho = tmp_path_factory.mktemp(request.param) / 'base.csv'
+    dados.to_csv(caminho, index=False)
+    return request.param, juntar_bases([str(caminho)])
+
+
+@pytest.fixture
+def paralelismo_em_qualquer_tamanho(monkeypatch):
+    monkeypatch.setattr(filter_handler, 'LINHAS_MINIMAS_PARALELISMO', 0)
+
+
+@pytest.mark.parametrize('campanha', list(STRATEGY_MAPEAMENTO))
+def test_paralelo_igual_ao_serial(base_do_convenio, campanha, paralelismo_em_qualquer_tamanho):
+    convenio, base = base_do_convenio
+    estrategia = STRATEGY_MAPEAMENTO[campanha]
+    for nome, config in variacoes(configuracao(campanha, convenio)).items():
+        serial = FiltroHandler(base, config, estrategia, memorizar=False).processar()
+        paralelo = FiltroHandler(base, config, estrategia, num_processos=3, memorizar=False)
+        saida = paralelo.processar()
+        assert any(etapa['etapa'] == 'passos 1 a 3 em partições' for etapa in paralelo.relatorio), nome
+        assert len(serial) > 0, nome
+        pd.testing.assert_frame_equal(saida, serial, check_exact=True, obj=nome)
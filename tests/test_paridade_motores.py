@@ -0,0 +1,41 @@
+# tests/test_paridade_motores.py
+"""
+Os motores de filtro (MOTORES_FILTRO) dão exatamente a mesma saída que o motor pandas,
+para cada estratégia e cada variação da configuração que liga ou desliga um filtro
+global (ver benchmarks/paridade_motores.py, que mede também o tempo).
+"""
+import pandas as pd
+import pytest
+
+from constants import MOTORES_FILTRO
+from filter_handler import FiltroHandler
+from gerar_base_sintetica import gerar_base
+from juntar_bases import juntar_bases
+from strategies import STRATEGY_MAPEAMENTO
+
+from conftest import configuracao, variacoes
+
+CONVENIOS = ['govsp', 'govmt', 'prefsp']
+
+
+@pytest.fixture(scope='module', params=CONVENIOS)
+def base_do_convenio(request, tmp_path_factory):
+    dados = gerar_base(5_000, request.param, taxa_cpf_duplicado=0.05)
+    # Empates exatos com as margens mínimas das variações, onde `>` e `>=` divergiriam
+    dados.loc[::7, 'MG_Emprestimo_Disponivel'] = 150.0
+    dados.loc[3::11, 'MG_Emprestimo_Disponivel'] = 0.0
+    caminho = tmp_path_factory.mktemp(request.param) / 'base.csv'
+    dados.to_csv(caminho, index=False)
+    return request.param, juntar_bases([str(caminho)])
+
+
+@pytest.mark.parametrize('motor', MOTORES_FILTRO[1:])
+@pytest.mark.parametrize('campanha', list(STRATEGY_MAPEAMENTO))
+def test_motores_dao_a_mesma_saida(base_do_convenio, campanha, motor):
+    convenio, base = base_do_convenio
+    estrategia = STRATEGY_MAPEAMENTO[campanha]
+    for nome, config in variacoes(configuracao(campanha, convenio)).items():
+        referencia = FiltroHandler(base, config, estrategia, memorizar=False, motor=MOTORES_FILTRO[0]).processar()
+        saida = FiltroHandler(base, config, estrategia, memorizar=False, motor=motor).processar()
+        assert len(referencia) > 0, nome
+        pd.testing.assert_frame_equal(saida, referencia, check_exact=True, obj=f"{campanha} / {nome}")
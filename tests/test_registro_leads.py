@@ -0,0 +1,158 @@
+# tests/test_registro_leads.py
+import dataclasses
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import registro_leads
+from filter_handler import FiltroHandler
+from processamento_em_disco import FiltroEmDisco, espalhar_em_disco
+from registro_leads import SEGUNDOS_POR_DIA, RegistroLeads, cpfs_como_inteiros
+from strategies import CartaoStrategy, NovoStrategy
+
+from conftest import configuracao
+
+DIA = SEGUNDOS_POR_DIA
+INICIO = 1_700_000_000.0
+
+
+class Relogio:
+    """Substitui o módulo `time` do registro_leads, com a hora controlada pelo teste."""
+    def __init__(self, agora: float):
+        self.agora = agora
+
+    def time(self):
+        return self.agora
+
+
+@pytest.fixture
+def relogio(monkeypatch):
+    relogio = Relogio(INICIO)
+    monkeypatch.setattr(registro_leads, 'time', relogio)
+    return relogio
+
+
+@pytest.fixture
+def registro(tmp_path):
+    return RegistroLeads(str(tmp_path / 'registro.sqlite3'))
+
+
+def _cpfs(saida: pd.DataFrame) -> set:
+    return set(cpfs_como_inteiros(saida['CPF']).tolist())
+
+
+def test_registrar_e_pertinencia(registro):
+    assert registro.registrar(np.array([30, 10, 20, 10, -1]), 'Novo', 'outbound', quando=INICIO) == 3
+    registro.registrar(np.array([20, 40]), 'Cartão', quando=INICIO + 5 * DIA)
+
+    assert registro.enviados_desde(7, agora=INICIO + 6 * DIA).tolist() == [10, 20, 30, 40]
+    # Vale o envio mais recente de cada CPF
+    assert registro.enviados_desde(7, agora=INICIO + 10 * DIA).tolist() == [20, 40]
+
+    procurados = np.array([40, 5, 30, 20, 99, 10, -1])
+    assert registro.mascara_enviados(procurados, 7, agora=INICIO + 6 * DIA).tolist() == \
+        [True, False, True, True, False, True, False]
+    assert registro.mascara_enviados(procurados, 7, agora=INICIO + 10 * DIA).tolist() == \
+        [True, False, False, True, False, False, False]
+    assert registro.mascara_enviados(np.array([], dtype=np.int64), 7).tolist() == []
+
+    assert registro.esquecer_anteriores(7, agora=INICIO + 10 * DIA) == 2
+    assert registro.enviados_desde(30, agora=INICIO + 10 * DIA).tolist() == [20, 40]
+
+
+def test_cpfs_como_inteiros():
+    cpfs = pd.Series(['123.456.789-01', '98765432100', 'sem cpf', None])
+    assert cpfs_como_inteiros(cpfs).tolist() == [12345678901, 98765432100, -1, -1]
+
+
+def test_snapshot_e_busca_binaria(registro):
+    rng = np.random.default_rng(0)
+    cpfs = rng.integers(0, 99_999_999_999, 20_000)
+    datas = INICIO + rng.integers(0, 30, len(cpfs)) * DIA
+    for dia in np.unique(datas):
+        registro.registrar(cpfs[datas == dia], 'Novo', quando=float(dia))
+
+    agora = INICIO + 30 * DIA
+    procurados = np.concatenate((cpfs[::3], rng.integers(0, 99_999_999_999, 5_000)))
+    mascara = registro.mascara_enviados(procurados, 10, agora=agora)
+    assert os.path.exists(registro.caminho_snapshot)
+
+    # Referência sem o índice: o último envio de cada CPF, direto dos dados gravados
+    ultimo = pd.Series(datas).groupby(cpfs).max()
+    esperada = pd.Series(procurados).map(ultimo).ge(agora - 10 * DIA).to_numpy()
+    assert mascara.tolist() == esperada.tolist()
+
+    # Outra instância (outro processo) carrega o snapshot da mesma versão, sem ler a tabela
+    outra = RegistroLeads(registro.caminho)
+    assert outra._ler_snapshot(registro._versao_lida)
+    assert outra.mascara_enviados(procurados, 10, agora=agora).tolist() == esperada.tolist()
+
+    # Um envio mesclado no vetor em memória dá o mesmo que reler a tabela sem snapshot
+    novos = rng.integers(0, 99_999_999_999, 1_000)
+    outra.registrar(np.concatenate((novos, cpfs[:500])), 'Cartão', quando=agora)
+    mesclado = outra.enviados_desde(10, agora=agora)
+    os.remove(registro.caminho_snapshot)
+    relido = RegistroLeads(registro.caminho).enviados_desde(10, agora=agora)
+    assert mesclado.tolist() == relido.tolist()
+
+    # A primeira instância percebe a gravação da outra pela versão do registro
+    assert registro.enviados_desde(10, agora=agora).tolist() == relido.tolist()
+
+    # Gravando depois de outra instância, o vetor desatualizado não é mesclado: é relido
+    outra.registrar(np.array([1, 2]), 'Novo', quando=agora)
+    registro.registrar(np.array([3]), 'Novo', quando=agora)
+    assert registro.enviados_desde(10, agora=agora)[:3].tolist() == [1, 2, 3]
+
+
+def _sem_reenvio(config, dias=7):
+    return dataclasses.replace(config, dias_sem_reenvio=dias)
+
+
+def test_filtro_handler_exclui_enviados_na_janela(base, registro, relogio):
+    enviada = FiltroHandler(base, configuracao('Cartão', 'govsp'), CartaoStrategy, memorizar=False).processar()
+    registro.registrar_saida(enviada, 'Cartão', 'outbound')
+
+    config = configuracao('Novo', 'govsp')
+    sem_registro = FiltroHandler(base, config, NovoStrategy, memorizar=False).processar()
+    enviados = _cpfs(enviada)
+    assert 0 < len(_cpfs(sem_registro) & enviados) < len(sem_registro)
+
+    # Dentro da janela, os CPFs da primeira campanha ficam de fora
+    relogio.agora = INICIO + 3 * DIA
+    dentro = FiltroHandler(base, _sem_reenvio(config), NovoStrategy, memorizar=False, registro=registro).processar()
+    assert not _cpfs(dentro) & enviados
+    assert _cpfs(dentro) == _cpfs(sem_registro) - enviados
+    assert len(dentro) == len(_cpfs(dentro))
+
+    # Fora da janela, voltam todos
+    relogio.agora = INICIO + 8 * DIA
+    fora = FiltroHandler(base, _sem_reenvio(config), NovoStrategy, memorizar=False, registro=registro).processar()
+    pd.testing.assert_frame_equal(fora, sem_registro)
+
+
+def test_filtro_em_disco_registra_e_exclui(arquivo_base, tmp_path, registro, relogio):
+    def processar(config, strategy_class, nome):
+        caminho = str(tmp_path / f'{nome}.parquet')
+        with espalhar_em_disco([arquivo_base], diretorio=str(tmp_path / nome)) as base:
+            FiltroEmDisco(base, config, strategy_class, registro=registro).processar(caminho, 'Parquet')
+        return pd.read_parquet(caminho)
+
+    config_cartao = dataclasses.replace(configuracao('Cartão', 'govsp'), registrar_envio=True)
+    enviada = processar(config_cartao, CartaoStrategy, 'cartao')
+    enviados = _cpfs(enviada)
+    assert registro.enviados_desde(7).tolist() == sorted(enviados)
+
+    config = configuracao('Novo', 'govsp')
+    sem_registro = processar(config, NovoStrategy, 'novo')
+    assert 0 < len(_cpfs(sem_registro) & enviados) < len(sem_registro)
+
+    relogio.agora = INICIO + 3 * DIA
+    dentro = processar(_sem_reenvio(config), NovoStrategy, 'novo_dentro')
+    assert not _cpfs(dentro) & enviados
+    assert _cpfs(dentro) == _cpfs(sem_registro) - enviados
+
+    relogio.agora = INICIO + 8 * DIA
+    fora = processar(_sem_reenvio(config), NovoStrategy, 'novo_fora')
+    pd.testing.assert_frame_equal(fora, sem_registro)
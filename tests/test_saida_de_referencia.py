@@ -0,0 +1,49 @@
+# tests/test_saida_de_referencia.py
+"""
+Saída de referência de cada estratégia e variação da configuração (conftest.variacoes),
+numa base sintética fixa (semente 42, com empates exatos nas margens mínimas). As
+referências (referencias_saida.json: número de linhas e sha256 do CSV da saída) foram
+tiradas do código anterior ao vetor de seleção e à atribuição vetorizada dos bancos;
+uma mudança que altere qualquer byte da saída falha aqui. Se a mudança for
+intencional, regrave as referências no mesmo commit.
+"""
+import hashlib
+import json
+import os
+
+import pytest
+
+from filter_handler import FiltroHandler
+from gerar_base_sintetica import gerar_base
+from juntar_bases import juntar_bases
+from strategies import STRATEGY_MAPEAMENTO
+
+from conftest import configuracao, variacoes
+
+with open(os.path.join(os.path.dirname(__file__), 'referencias_saida.json'), encoding='utf-8') as f:
+    REFERENCIAS = json.load(f)
+
+
+@pytest.fixture(scope='module', params=sorted(REFERENCIAS))
+def base_de_referencia(request, tmp_path_factory):
+    dados = gerar_base(2_000, request.param, seed=42, taxa_cpf_duplicado=0.05)
+    dados.loc[::7, 'MG_Emprestimo_Disponivel'] = 150.0
+    dados.loc[3::11, 'MG_Emprestimo_Disponivel'] = 0.0
+    caminho = tmp_path_factory.mktemp(request.param) / 'base.csv'
+    dados.to_csv(caminho, index=False)
+    return request.param, juntar_bases([str(caminho)])
+
+
+@pytest.mark.parametrize('campanha', list(STRATEGY_MAPEAMENTO))
+def test_saida_igual_a_referencia(base_de_referencia, campanha):
+    convenio, base = base_de_referencia
+    estrategia = STRATEGY_MAPEAMENTO[campanha]
+    referencias = REFERENCIAS[convenio][estrategia.__name__]
+    configs = variacoes(configuracao(campanha, convenio))
+    assert set(configs) == set(referencias)
+
+    for nome, config in configs.items():
+        saida = FiltroHandler(base, config, estrategia, memorizar=False).processar()
+        texto = saida.to_csv(index=False, sep=';')
+        assert len(saida) == referencias[nome]['linhas'], nome
+        assert hashlib.sha256(texto.encode()).hexdigest() == referencias[nome]['sha256'], nome